@@ -0,0 +1,103 @@
+"""Dialect-aware SQL expressions for grouped expense summaries."""
+from sqlalchemy import case, func
+
+import fx
+import money
+from models import db, Expense
+
+PERIODS = ('day', 'week', 'month')
+GROUP_KEYS = ('category',) + PERIODS
+
+
+def bucket_expression(period, column=Expense.date, dialect_name=None):
+    """Return a SQL expression labelling each row with its ``period`` bucket.
+
+    Buckets are strings: ``YYYY-MM-DD`` for days, the Monday that starts the
+    week for weeks, and ``YYYY-MM`` for months, identical on every backend.
+    """
+    dialect_name = dialect_name or db.engine.dialect.name
+    if dialect_name == 'sqlite':
+        if period == 'day':
+            return func.strftime('%Y-%m-%d', column)
+        if period == 'week':
+            return func.date(column, 'weekday 0', '-6 days')
+        if period == 'month':
+            return func.strftime('%Y-%m', column)
+    else:
+        if period == 'day':
+            return func.to_char(column, 'YYYY-MM-DD')
+        if period == 'week':
+            return func.to_char(func.date_trunc('week', column), 'YYYY-MM-DD')
+        if period == 'month':
+            return func.to_char(column, 'YYYY-MM')
+    raise ValueError(f'unknown period {period!r}')
+
+
+def group_columns(group_by, base_currency):
+    """Map group keys to labelled SQL expressions, in request order.
+
+    The currency and, for currencies other than ``base_currency``, the day
+    are appended: each (currency, day) group is converted once by
+    ``fold_currencies``.
+    """
+    columns = []
+    for key in group_by:
+        if key == 'category':
+            columns.append(Expense.category.label('category'))
+        else:
+            columns.append(bucket_expression(key).label(key))
+    fx_day = case((Expense.currency == base_currency, None), else_=bucket_expression('day'))
+    return columns + [Expense.currency.label('currency'), fx_day.label('fx_day')]
+
+
+def metric_columns():
+    return [
+        func.sum(Expense.amount_minor).label('total'),
+        func.count(Expense.id).label('count'),
+        func.min(Expense.amount_minor).label('min'),
+        func.max(Expense.amount_minor).label('max'),
+    ]
+
+
+def fold_currencies(rows, group_by, base_currency, rates):
+    """Convert per-currency rows (minor units) to ``base_currency`` and merge them by group.
+
+    Returns ``(groups, unconverted)``. ``groups`` has one dict per group, in
+    row order, with the ``group_by`` keys and total/count/min/max in major
+    units of ``base_currency``. Rows whose rate is unknown are left out of
+    them and kept per currency in ``unconverted``: the same keys plus
+    ``currency``, with amounts in major units of that currency.
+    """
+    groups, unconverted = {}, {}
+    for row in rows:
+        key = tuple(getattr(row, name) for name in group_by)
+        try:
+            factor = rates.factor(row.currency, base_currency, row.fx_day)
+            target, fields = groups, dict(zip(group_by, key))
+        except fx.MissingRate:
+            factor = 10.0 ** -money.exponent(row.currency)
+            key += (row.currency,)
+            target, fields = unconverted, dict(zip(group_by, key), currency=row.currency)
+        group = target.get(key)
+        if group is None:
+            group = target[key] = dict(fields, total=0, count=0, min=None, max=None)
+        group['total'] += row.total * factor
+        group['count'] += row.count
+        low, high = row.min * factor, row.max * factor
+        group['min'] = low if group['min'] is None else min(group['min'], low)
+        group['max'] = high if group['max'] is None else max(group['max'], high)
+    return list(groups.values()), list(unconverted.values())
+
+
+def combine(groups, base_currency):
+    """Fold per-group metrics into overall totals without touching the table again."""
+    digits = money.exponent(base_currency)
+    count = sum(group['count'] for group in groups)
+    total = sum(group['total'] for group in groups)
+    return {
+        'total': round(total, digits),
+        'count': count,
+        'min': min((group['min'] for group in groups), default=None),
+        'max': max((group['max'] for group in groups), default=None),
+        'avg': round(total / count, digits) if count else None,
+    }
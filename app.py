@@ -1,9 +1,22 @@
 from flask import Flask
 from flask_cors import CORS
 from models import db
+import models
+import click
 import os
+import database
+import migrations
+import rollups
+import changes
+import replicas
+import recurring
 from controllers.auth_controller import auth_bp
 from controllers.expense_controller import expense_bp
+from controllers.recurring_controller import recurring_bp
+from controllers.budget_controller import budget_bp
+from middlewares.metrics_middleware import init_metrics
+from middlewares.rate_limit_middleware import init_rate_limits
+from middlewares.compression_middleware import init_compression
 
 def create_app(config_class='config.Config'):
     app = Flask(__name__)
@@ -16,11 +29,84 @@ def create_app(config_class='config.Config'):
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(expense_bp)
+    app.register_blueprint(recurring_bp)
+    app.register_blueprint(budget_bp)
     
 
     with app.app_context():
-        db.create_all()
+        database.configure_engines(app)
+        if app.config.get('METRICS_ENABLED', True):
+            init_metrics(app)
+        init_rate_limits(app)
+        init_compression(app)
+        replicas.init_replicas(app)
+        if app.config.get('AUTO_MIGRATE', True):
+            migrations.upgrade()
+        recurring.init_recurring(app)
+
+    @app.cli.command('db-upgrade')
+    @click.option('--target', type=int, default=None, help='Stop after this schema version.')
+    def db_upgrade(target):
+        """Apply pending schema migrations."""
+        applied = migrations.upgrade(target=target)
+        click.echo(f'Applied migrations: {applied}' if applied else 'Schema is up to date.')
+
+    @app.cli.command('db-version')
+    def db_version():
+        """Show the current schema version."""
+        with db.engine.connect() as connection:
+            click.echo(migrations.current_version(connection))
     
+    @app.cli.command('rollups-rebuild')
+    @click.option('--user-id', type=int, default=None, help='Only rebuild this user.')
+    def rollups_rebuild(user_id):
+        """Recompute the expense rollup table from the expenses table."""
+        rollups.rebuild(db.session, user_id)
+        db.session.commit()
+        click.echo('Rollups rebuilt.')
+
+    @app.cli.command('rollups-verify')
+    @click.option('--user-id', type=int, default=None, help='Only verify this user.')
+    @click.option('--repair', is_flag=True, help='Recompute the buckets that drifted.')
+    def rollups_verify(user_id, repair):
+        """Compare the expense rollup table against the expenses table."""
+        drift = rollups.verify(db.session, user_id)
+        for entry in drift:
+            click.echo(f"drift user={entry['user_id']} category={entry['category']} month={entry['month']} "
+                       f"expected={entry['expected']} stored={entry['stored']}")
+        if drift and repair:
+            by_user = {}
+            for entry in drift:
+                category = models.CategoryEnum[entry['category']]
+                by_user.setdefault(entry['user_id'], []).append((category, entry['month']))
+            for drift_user, buckets in by_user.items():
+                rollups.refresh(db.session, drift_user, buckets)
+            db.session.commit()
+            click.echo(f'Repaired {len(drift)} bucket(s).')
+        elif not drift:
+            click.echo('Rollups are consistent.')
+        else:
+            raise SystemExit(1)
+
+    @app.cli.command('changes-compact')
+    def changes_compact():
+        """Remove change log entries superseded by a later change to the same expense."""
+        removed = changes.compact(db.session)
+        db.session.commit()
+        click.echo(f'Removed {removed} superseded change(s).')
+
+    @app.cli.command('recurring-run')
+    def recurring_run():
+        """Write every due recurring expense (for cron instead of the in-process scheduler)."""
+        written = recurring.run_all_due(db.session, limit=app.config['RECURRING_BATCH_SIZE'])
+        click.echo(f'Materialized {written} recurring expense(s).')
+
+    @app.cli.command('replica-sync')
+    def replica_sync():
+        """Copy a SQLite primary into the SQLite read replicas (local testing)."""
+        copied = replicas.sync_sqlite_replicas(app)
+        click.echo(f'Synced replicas: {copied}' if copied else 'No SQLite replicas configured.')
+
     @app.route('/')
     def index():
         return {
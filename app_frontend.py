@@ -1,17 +1,26 @@
 
 import streamlit as st
-import requests
 import pandas as pd
 from datetime import datetime, timedelta
+from frontend_client import client_for
 
 
 API_BASE_URL = "http://localhost:5555/api"
+PAGE_SIZE = 100
+CURRENCIES = ["USD", "EUR", "GBP", "JPY", "CHF", "CAD", "AUD", "SEK", "NOK", "DKK", "PLN", "INR"]
 
 
 if 'token' not in st.session_state:
     st.session_state.token = None
 if 'user' not in st.session_state:
     st.session_state.user = None
+if 'rows_shown' not in st.session_state:
+    st.session_state.rows_shown = PAGE_SIZE
+
+# One pooled HTTP session and response cache per browser session.
+api = client_for(st.session_state, API_BASE_URL)
+if api.token != st.session_state.token:
+    api.set_token(st.session_state.token)
 
 
 st.title("Expense Tracker")
@@ -27,19 +36,15 @@ if not st.session_state.token:
         
         if st.button("Login"):
             try:
-                response = requests.post(
-                    f"{API_BASE_URL}/auth/login",
-                    json={"username": username, "password": password}
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
+                status_code, data = api.post("/auth/login", json={"username": username, "password": password})
+
+                if status_code == 200:
                     st.session_state.token = data['token']
                     st.session_state.user = data['user']
                     st.success("Login successful!")
                     st.rerun()
                 else:
-                    st.error(f"Login failed: {response.json().get('message', 'Unknown error')}")
+                    st.error(f"Login failed: {data.get('message', 'Unknown error')}")
             except Exception as e:
                 st.error(f"Error: {str(e)}")
     
@@ -51,19 +56,19 @@ if not st.session_state.token:
         
         if st.button("Register"):
             try:
-                response = requests.post(
-                    f"{API_BASE_URL}/auth/register",
+                status_code, data = api.post(
+                    "/auth/register",
                     json={
                         "username": new_username,
                         "email": new_email,
                         "password": new_password
                     }
                 )
-                
-                if response.status_code == 201:
+
+                if status_code == 201:
                     st.success("Registration successful! You can now login.")
                 else:
-                    st.error(f"Registration failed: {response.json().get('message', 'Unknown error')}")
+                    st.error(f"Registration failed: {data.get('message', 'Unknown error')}")
             except Exception as e:
                 st.error(f"Error: {str(e)}")
 else:
@@ -77,27 +82,49 @@ else:
     
     with col1:
         st.write(f"Welcome, **{st.session_state.user['username']}**!")
+
+    base_currency = st.session_state.user.get('base_currency', 'USD')
+    with st.expander("Settings"):
+        new_base = st.selectbox(
+            "Report totals in", CURRENCIES,
+            index=CURRENCIES.index(base_currency) if base_currency in CURRENCIES else 0
+        )
+        if new_base != base_currency and st.button("Save settings"):
+            status_code, data = api.patch("/auth/me", json={"base_currency": new_base})
+            if status_code == 200:
+                st.session_state.user = data['user']
+                st.rerun()
+            else:
+                st.error(f"Failed to save settings: {data.get('message', 'Unknown error')}")
     
 
     tab1, tab2 = st.tabs(["View Expenses", "Add Expense"])
     
 
-    def get_expenses(filter_type='all', start_date=None, end_date=None):
-        headers = {"Authorization": f"Bearer {st.session_state.token}"}
+    def get_expense_pages(filter_type='all', start_date=None, end_date=None):
         params = {"filter": filter_type}
-        
+
         if filter_type == 'custom' and start_date and end_date:
             params["start_date"] = start_date.isoformat()
             params["end_date"] = end_date.isoformat()
-            
-        response = requests.get(f"{API_BASE_URL}/expenses/", headers=headers, params=params)
-        
-        if response.status_code == 200:
-            return response.json()['expenses']
-        else:
-            st.error(f"Failed to fetch expenses: {response.json().get('message', 'Unknown error')}")
-            return []
-    
+
+        # Pages already loaded for these filters are kept across reruns.
+        return api.expense_pages(params, page_size=PAGE_SIZE)
+
+    def get_summary(filter_type='all', start_date=None, end_date=None, group_by='category'):
+        params = {"filter": filter_type, "group_by": group_by}
+
+        if filter_type == 'custom' and start_date and end_date:
+            params["start_date"] = start_date.isoformat()
+            params["end_date"] = end_date.isoformat()
+
+        status_code, data = api.get("/expenses/summary", params)
+
+        if status_code == 200:
+            return data
+        st.error(f"Failed to fetch summary: {data.get('message', 'Unknown error')}")
+        return None
+
     with tab1:
         st.header("Your Expenses")
         
@@ -125,57 +152,82 @@ else:
             start_datetime = datetime.combine(start_date, datetime.min.time())
             end_datetime = datetime.combine(end_date, datetime.max.time())
             
-            expenses = get_expenses("custom", start_datetime, end_datetime)
+            pages = get_expense_pages("custom", start_datetime, end_datetime)
+            summary = get_summary("custom", start_datetime, end_datetime)
         else:
-            expenses = get_expenses(filter_map[filter_option])
-        
-        if expenses:
-    
-            df = pd.DataFrame(expenses)
+            pages = get_expense_pages(filter_map[filter_option])
+            summary = get_summary(filter_map[filter_option])
+
+        # Only the rows on screen are downloaded; totals come from the summary endpoint.
+        expenses_df = pages.ensure(st.session_state.rows_shown)
+        if pages.error:
+            st.error(f"Failed to fetch expenses: {pages.error}")
+
+        if not expenses_df.empty:
+            df = expenses_df[['title', 'amount', 'currency', 'category', 'date', 'description', 'id']]
+            df.columns = ['Title', 'Amount', 'Currency', 'Category', 'Date', 'Description', 'ID']
+
+            st.dataframe(df, use_container_width=True)
+            if not pages.exhausted and st.button(f"Load {PAGE_SIZE} more"):
+                st.session_state.rows_shown = len(expenses_df) + PAGE_SIZE
+                st.rerun()
+
+            if summary:
+                st.metric("Total Amount", f"{summary['totals']['total']:,} {summary['currency']}")
+                by_category = pd.DataFrame(summary['groups']).set_index('category')
+                st.bar_chart(by_category['total'])
             
-        
-            if not df.empty:
-                df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d %H:%M')
-                df = df[['title', 'amount', 'category', 'date', 'description', 'id']]
-                df.columns = ['Title', 'Amount', 'Category', 'Date', 'Description', 'ID']
-                
-                st.dataframe(df, use_container_width=True)
-                
-    
-                total = df['Amount'].sum()
-                st.metric("Total Amount", f"${total:.2f}")
-                
-    
-                col1, col2 = st.columns(2)
-                with col1:
-                    expense_id = st.number_input("Enter Expense ID to Edit/Delete", min_value=1, step=1)
-                
-                with col2:
-                    action = st.selectbox("Action", ["Edit", "Delete"])
-                
-                if action == "Edit" and st.button("Proceed with Edit"):
-                
-                    expense_to_edit = next((e for e in expenses if e['id'] == expense_id), None)
-                    if expense_to_edit:
-                        st.session_state.editing_expense = expense_to_edit
-                        st.session_state.editing = True
+
+            col1, col2 = st.columns(2)
+            with col1:
+                expense_id = st.number_input("Enter Expense ID to Edit/Delete", min_value=1, step=1)
+            
+            with col2:
+                action = st.selectbox("Action", ["Edit", "Delete"])
+            
+            if action == "Edit" and st.button("Proceed with Edit"):
+            
+                status_code, expense_to_edit = api.get(f"/expenses/{expense_id}")
+                if status_code == 200:
+                    st.session_state.editing_expense = expense_to_edit
+                    st.session_state.editing = True
+                    st.rerun()
+                else:
+                    st.error("Expense not found!")
+            
+            elif action == "Delete" and st.button("Proceed with Delete"):
+                try:
+                    status_code, data = api.delete(f"/expenses/{expense_id}")
+
+                    if status_code == 200:
+                        st.success("Expense deleted successfully!")
                         st.rerun()
                     else:
-                        st.error("Expense not found!")
-                
-                elif action == "Delete" and st.button("Proceed with Delete"):
+                        st.error(f"Failed to delete expense: {data.get('message', 'Unknown error')}")
+                except Exception as e:
+                    st.error(f"Error: {str(e)}")
+
+            # Many expenses at once: one request and one transaction on the server.
+            with st.expander("Bulk actions"):
+                selected_ids = st.multiselect("Expenses", df['ID'].tolist())
+                bulk_action = st.selectbox("Bulk action", ["Change category", "Delete"])
+                if bulk_action == "Change category":
+                    bulk_category = st.selectbox("New category", ["GROCERIES", "LEISURE", "ELECTRONICS", "UTILITIES", "CLOTHING", "HEALTH", "OTHERS"])
+                if st.button("Apply to selected") and selected_ids:
                     try:
-                        headers = {"Authorization": f"Bearer {st.session_state.token}"}
-                        response = requests.delete(
-                            f"{API_BASE_URL}/expenses/{expense_id}",
-                            headers=headers
-                        )
-                        
-                        if response.status_code == 200:
-                            st.success("Expense deleted successfully!")
+                        if bulk_action == "Delete":
+                            status_code, data = api.delete("/expenses/batch", json={"ids": [int(i) for i in selected_ids]})
+                        else:
+                            status_code, data = api.patch(
+                                "/expenses/batch",
+                                json={"ids": [int(i) for i in selected_ids], "set": {"category": bulk_category}}
+                            )
+
+                        if status_code == 200:
+                            st.success(data['message'])
                             st.rerun()
                         else:
-                            st.error(f"Failed to delete expense: {response.json().get('message', 'Unknown error')}")
+                            st.error(f"Bulk action failed: {data.get('message', 'Unknown error')}")
                     except Exception as e:
                         st.error(f"Error: {str(e)}")
         else:
@@ -188,6 +240,11 @@ else:
         
         title = st.text_input("Title", value=expense['title'])
         amount = st.number_input("Amount", value=float(expense['amount']), min_value=0.01, step=0.01)
+        currency = st.selectbox(
+            "Currency", CURRENCIES,
+            index=CURRENCIES.index(expense['currency']) if expense['currency'] in CURRENCIES else 0,
+            key="edit_currency"
+        )
         category = st.selectbox(
             "Category",
             ["GROCERIES", "LEISURE", "ELECTRONICS", "UTILITIES", "CLOTHING", "HEALTH", "OTHERS"],
@@ -200,29 +257,27 @@ else:
         with col1:
             if st.button("Update Expense"):
                 try:
-                    headers = {"Authorization": f"Bearer {st.session_state.token}"}
-    
                     original_time = pd.to_datetime(expense['date']).time()
                     updated_datetime = datetime.combine(date, original_time)
-                    
-                    response = requests.put(
-                        f"{API_BASE_URL}/expenses/{expense['id']}",
-                        headers=headers,
+
+                    status_code, data = api.put(
+                        f"/expenses/{expense['id']}",
                         json={
                             "title": title,
-                            "amount": amount,
+                            "amount": round(amount, 2),
+                            "currency": currency,
                             "category": category,
                             "date": updated_datetime.isoformat(),
                             "description": description
                         }
                     )
                     
-                    if response.status_code == 200:
+                    if status_code == 200:
                         st.success("Expense updated successfully!")
                         st.session_state.editing = False
                         st.rerun()
                     else:
-                        st.error(f"Failed to update expense: {response.json().get('message', 'Unknown error')}")
+                        st.error(f"Failed to update expense: {data.get('message', 'Unknown error')}")
                 except Exception as e:
                     st.error(f"Error: {str(e)}")
         
@@ -237,6 +292,7 @@ else:
 
         title = st.text_input("Title")
         amount = st.number_input("Amount", min_value=0.01, step=0.01)
+        currency = st.selectbox("Currency", CURRENCIES, index=CURRENCIES.index(base_currency) if base_currency in CURRENCIES else 0)
         category = st.selectbox("Category", ["GROCERIES", "LEISURE", "ELECTRONICS", "UTILITIES", "CLOTHING", "HEALTH", "OTHERS"])
         date = st.date_input("Date")
         time_input = st.time_input("Time")
@@ -247,20 +303,19 @@ else:
             
                 expense_datetime = datetime.combine(date, time_input)
                 
-                headers = {"Authorization": f"Bearer {st.session_state.token}"}
-                response = requests.post(
-                    f"{API_BASE_URL}/expenses/",
-                    headers=headers,
+                status_code, data = api.post(
+                    "/expenses/",
                     json={
                         "title": title,
-                        "amount": amount,
+                        "amount": round(amount, 2),
+                        "currency": currency,
                         "category": category,
                         "date": expense_datetime.isoformat(),
                         "description": description
                     }
                 )
                 
-                if response.status_code == 201:
+                if status_code == 201:
                     st.success("Expense added successfully!")
                 
                     st.text_input("Title", value="")
@@ -268,7 +323,7 @@ else:
                     st.text_area("Description", value="")
                     st.rerun()
                 else:
-                    st.error(f"Failed to add expense: {response.json().get('message', 'Unknown error')}")
+                    st.error(f"Failed to add expense: {data.get('message', 'Unknown error')}")
             except Exception as e:
                 st.error(f"Error: {str(e)}")
 
@@ -0,0 +1,12 @@
+"""ASGI entry point for the async serving mode (see asgi_app.py).
+
+    uvicorn asgi:app --workers 4
+    gunicorn -k uvicorn.workers.UvicornWorker -w 4 asgi:app
+
+``APP_CONFIG`` selects the configuration class (default ``config.ProductionConfig``).
+"""
+import os
+
+from asgi_app import create_asgi_app
+
+app = create_asgi_app(os.environ.get('APP_CONFIG', 'config.ProductionConfig'))
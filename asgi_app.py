@@ -0,0 +1,361 @@
+"""Async serving mode: the auth and expense routes on Starlette with an async driver.
+
+``create_asgi_app(config_class)`` builds the Flask app as usual (config,
+migrations, caches, hooks) and serves its hot routes with ``async def``
+handlers on an async engine: ``sqlite+aiosqlite`` or ``postgresql+asyncpg``,
+derived from ``SQLALCHEMY_DATABASE_URI`` unless ``ASYNC_DATABASE_URI`` is
+set. A request waiting on the database or on bcrypt no longer holds a
+thread, so one worker can keep many slow clients in flight.
+
+Each native handler runs inside a Flask request context built from the
+ASGI scope, with Flask's ``before_request``/``after_request`` hooks. Rate
+limits, compression, ETags, metrics and the request parsing helpers
+therefore behave exactly as in the WSGI app. The expense handlers reuse
+the sync functions in ``controllers/expense_controller.py``, reads and
+writes alike, through ``AsyncSession.run_sync``; only the export streams
+natively. Routes without a native handler (bulk import,
+``/metrics``, ``/``) are passed to the Flask app on a thread pool.
+
+Reads always use the primary: ``@read_replica`` routing is WSGI only.
+"""
+import io
+import sys
+from contextlib import asynccontextmanager
+from functools import wraps
+
+from a2wsgi import WSGIMiddleware
+from flask import current_app, g, jsonify, request
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import database
+import etags
+import password_pool
+from app import create_app
+from controllers.auth_controller import issue_token
+from controllers.expense_controller import (
+    EXPORT_FORMATS, ChunkWriter, apply_batch_update, apply_expense_update, export_encoder, export_headers,
+    list_changes, list_expenses, parse_export, read_expense, remove_batch, remove_expense, save_new_expense,
+    summarize_expenses,
+)
+from middlewares.auth_middleware import AuthUser, bearer_claims, get_auth_cache
+from middlewares.compression_middleware import response_encoding, stream_compressor
+from middlewares.metrics_middleware import instrument_engine, query_budget
+from models import User
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+
+def async_database_uri(uri):
+    """Map a sync database URI to the async driver for the same backend."""
+    url = make_url(uri)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f'no async driver configured for {url.get_backend_name()!r}')
+    return url.set(drivername=driver)
+
+
+def get_sessions():
+    return current_app.extensions['async_sessions']
+
+
+# --- Bridging ASGI requests into Flask request contexts ---------------------
+
+def wsgi_environ(scope, body):
+    """A WSGI environ for an HTTP ``scope`` whose body has already been read."""
+    server = scope.get('server') or ('localhost', 80)
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def to_asgi_response(response):
+    asgi_response = Response(response.get_data(), status_code=response.status_code)
+    asgi_response.raw_headers = [
+        (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()
+    ]
+    return asgi_response
+
+
+def native(view):
+    """Serve the ``async def`` ``view`` inside a Flask request context for the same URL.
+
+    ``view`` may return anything a Flask view can, or a Starlette response
+    (used for streaming, which skips the ``after_request`` hooks).
+    """
+    async def endpoint(asgi_request):
+        flask_app = asgi_request.app.state.flask_app
+        body = await asgi_request.body()
+        with flask_app.request_context(wsgi_environ(asgi_request.scope, body)):
+            try:
+                response = flask_app.preprocess_request()
+                if response is None:
+                    response = await view(**asgi_request.path_params)
+            except Exception as error:
+                # Blueprint error handlers (e.g. PoolSaturated -> 503); re-raises if none applies.
+                response = flask_app.handle_user_exception(error)
+            if isinstance(response, Response):
+                return response
+            response = flask_app.process_response(flask_app.make_response(response))
+            return to_asgi_response(response)
+    return endpoint
+
+
+# --- Auth --------------------------------------------------------------------
+
+async def load_user(session, claims):
+    if current_app.config['JWT_STATELESS_AUTH'] and 'username' in claims:
+        return AuthUser(claims['user_id'], claims['username'], claims.get('email'))
+
+    cache = get_auth_cache()
+    user = cache.users.get(claims['user_id'])
+    if user is None:
+        row = (await session.execute(
+            select(User.id, User.username, User.email, User.is_active).where(User.id == claims['user_id'])
+        )).first()
+        if not row or not row.is_active:
+            return None
+        user = AuthUser(row.id, row.username, row.email)
+        cache.users.set(user.id, user)
+    return user
+
+
+def token_required(view):
+    """Async ``@token_required``: calls ``view(session, current_user, ...)`` with an open session."""
+    @wraps(view)
+    async def decorated(**kwargs):
+        claims, error = bearer_claims()
+        if error:
+            return error
+
+        async with get_sessions()() as session:
+            current_user = await load_user(session, claims)
+            if not current_user:
+                return jsonify({'message': 'user not found'}), 401
+            g.current_user = current_user
+            return await view(session, current_user, **kwargs)
+    return decorated
+
+
+def conditional(view):
+    """Async ``etags.conditional``; goes below ``token_required``."""
+    @wraps(view)
+    async def decorated(session, current_user, **kwargs):
+        if not etags.taggable():
+            return await view(session, current_user, **kwargs)
+        version = await session.scalar(select(User.expenses_version).where(User.id == current_user.id))
+        etag = etags.make_etag(current_user.id, version or 0, request.full_path)
+        matched = etags.matching_etag(etag)
+        if matched:
+            response = current_app.response_class(status=304)
+            etag = matched
+        else:
+            response = current_app.make_response(await view(session, current_user, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return decorated
+
+
+async def register():
+    data = request.get_json()
+
+    if not data or not data.get('username') or not data.get('email') or not data.get('password'):
+        return jsonify({'message': 'Missing fields!'}), 400
+
+    async with get_sessions()() as session:
+        if await session.scalar(select(User.id).filter_by(username=data['username'])):
+            return jsonify({'message': 'Username already exists!'}), 409
+
+        if await session.scalar(select(User.id).filter_by(email=data['email'])):
+            return jsonify({'message': 'Email already exists!'}), 409
+
+        password_hash = await password_pool.hash_password_async(data['password'])
+        session.add(User(username=data['username'], email=data['email'], password_hash=password_hash))
+        await session.commit()
+
+    return jsonify({'message': 'User registered successfully!'}), 201
+
+
+async def login():
+    data = request.get_json()
+
+    if not data or not data.get('username') or not data.get('password'):
+        return jsonify({'message': 'Missing credentials!'}), 400
+
+    async with get_sessions()() as session:
+        user = (await session.execute(select(User).filter_by(username=data['username']))).scalar_one_or_none()
+
+        if (not user or not await password_pool.check_password_async(data['password'], user.password_hash)
+                or not user.is_active):
+            return jsonify({'message': 'Invalid credentials!'}), 401
+
+        return jsonify({
+            'message': 'Login successful!',
+            'token': issue_token(user),
+            'user': user.to_dict()
+        }), 200
+
+
+# --- Expenses ----------------------------------------------------------------
+
+@token_required
+@conditional
+async def get_expenses(session, current_user):
+    return await session.run_sync(list_expenses, current_user.id, request.args)
+
+
+@token_required
+@conditional
+async def get_summary(session, current_user):
+    return await session.run_sync(summarize_expenses, current_user.id, request.args)
+
+
+@token_required
+async def export_expenses(session, current_user):
+    export, error = parse_export(current_user.id, request.args)
+    if error:
+        return error
+
+    encoding = response_encoding()
+    writer = ChunkWriter(stream_compressor(encoding, current_app.config) if encoding else None)
+    header, encode = export_encoder(export.fields, export.format, export.layout)
+    sessions = get_sessions()
+
+    # Runs after the handler returned: no Flask context, and a session of its own.
+    async def body():
+        if header is not None:
+            writer.write(header)
+        async with sessions() as stream_session:
+            result = await stream_session.stream(export.query)
+            async for partition in result.partitions():
+                for row in partition:
+                    chunk = writer.write(encode(row))
+                    if chunk:
+                        yield chunk
+        chunk = writer.close()
+        if chunk:
+            yield chunk
+
+    return StreamingResponse(body(), media_type=EXPORT_FORMATS[export.format], headers=export_headers(export, encoding))
+
+
+@token_required
+async def get_changes(session, current_user):
+    return await session.run_sync(list_changes, current_user.id, request.args)
+
+
+@token_required
+@conditional
+async def get_expense(session, current_user, expense_id):
+    return await session.run_sync(read_expense, current_user.id, expense_id, request.args)
+
+
+@token_required
+async def create_expense(session, current_user):
+    payload, status = await session.run_sync(save_new_expense, current_user.id, request.get_json())
+    return jsonify(payload), status
+
+
+@token_required
+async def update_expense(session, current_user, expense_id):
+    payload, status = await session.run_sync(apply_expense_update, current_user.id, expense_id, request.get_json())
+    return jsonify(payload), status
+
+
+@token_required
+async def delete_expense(session, current_user, expense_id):
+    payload, status = await session.run_sync(remove_expense, current_user.id, expense_id)
+    return jsonify(payload), status
+
+
+@token_required
+@query_budget(None)  # two statements per touched rollup bucket
+async def batch_update_expenses(session, current_user):
+    payload, status = await session.run_sync(
+        apply_batch_update, current_user.id, request.get_json(silent=True), current_app.config['BATCH_MUTATION_MAX_ROWS']
+    )
+    return jsonify(payload), status
+
+
+@token_required
+@query_budget(None)  # two statements per touched rollup bucket
+async def batch_delete_expenses(session, current_user):
+    payload, status = await session.run_sync(
+        remove_batch, current_user.id, request.get_json(silent=True), current_app.config['BATCH_MUTATION_MAX_ROWS']
+    )
+    return jsonify(payload), status
+
+
+NATIVE_ROUTES = [
+    ('/api/auth/register', ['POST'], register),
+    ('/api/auth/login', ['POST'], login),
+    ('/api/expenses/', ['GET'], get_expenses),
+    ('/api/expenses/', ['POST'], create_expense),
+    ('/api/expenses/summary', ['GET'], get_summary),
+    ('/api/expenses/export', ['GET'], export_expenses),
+    ('/api/expenses/changes', ['GET'], get_changes),
+    ('/api/expenses/batch', ['PATCH'], batch_update_expenses),
+    ('/api/expenses/batch', ['DELETE'], batch_delete_expenses),
+    ('/api/expenses/{expense_id:int}', ['GET'], get_expense),
+    ('/api/expenses/{expense_id:int}', ['PUT'], update_expense),
+    ('/api/expenses/{expense_id:int}', ['DELETE'], delete_expense),
+]
+
+
+def create_asgi_app(config_class='config.Config'):
+    flask_app = create_app(config_class)
+    uri = flask_app.config.get('ASYNC_DATABASE_URI') or async_database_uri(flask_app.config['SQLALCHEMY_DATABASE_URI'])
+    engine = create_async_engine(uri, **flask_app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    database.configure_engine(flask_app, engine.sync_engine)
+    instrument_engine(flask_app, engine.sync_engine)
+    flask_app.extensions['async_sessions'] = async_sessionmaker(engine, expire_on_commit=False)
+
+    flask_asgi = WSGIMiddleware(flask_app)
+    routes = [Route(path, native(view), methods=methods) for path, methods, view in NATIVE_ROUTES]
+    # CORS preflights and unported routes (bulk import, /metrics, /) are answered by Flask.
+    routes += [Route(path, flask_asgi, methods=['OPTIONS']) for path in dict.fromkeys(p for p, _, _ in NATIVE_ROUTES)]
+    routes.append(Mount('/', flask_asgi))
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await engine.dispose()
+
+    app = Starlette(routes=routes, lifespan=lifespan)
+    app.state.flask_app = flask_app
+    return app
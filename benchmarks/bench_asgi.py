@@ -0,0 +1,152 @@
+"""Throughput at high connection counts: WSGI (gunicorn gthread) vs ASGI (uvicorn).
+
+    python -m benchmarks.bench_asgi --connections 10,100,500 --duration 10
+
+Seeds one SQLite database, then serves it with one worker per mode:
+``gunicorn -c gunicorn.conf.py wsgi:app`` (``GUNICORN_THREADS`` threads) and
+``uvicorn asgi:app``. For each connection count, an asyncio client keeps
+that many requests in flight (list, summary and detail reads, plus
+``--write-ratio`` creates) and reports requests/sec, latency percentiles
+and errors. Needs gunicorn, uvicorn and httpx.
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.common import bench_config, percentile
+from benchmarks.suite import PASSWORD, seed
+from app import create_app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def server_command(mode, port, threads):
+    if mode == 'wsgi':
+        return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-w', '1', '--threads', str(threads),
+                '-b', f'127.0.0.1:{port}', 'wsgi:app']
+    return [sys.executable, '-m', 'uvicorn', '--workers', '1', '--port', str(port), '--log-level', 'warning',
+            '--no-access-log', 'asgi:app']
+
+
+async def wait_until_up(base, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(f'{base}/')
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f'server at {base} did not start')
+
+
+async def drive(base, tokens, connections, duration, write_ratio, expense_ids):
+    latencies, errors = [], []
+    stop = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+        async def worker(seed_value):
+            rng = random.Random(seed_value)
+            headers = {'Authorization': f'Bearer {tokens[seed_value % len(tokens)]}'}
+            user_ids = expense_ids[seed_value % len(tokens)]
+            while time.monotonic() < stop:
+                roll = rng.random()
+                start = time.perf_counter()
+                try:
+                    if roll < write_ratio:
+                        response = await client.post('/api/expenses/', headers=headers, json={
+                            'title': 'bench', 'amount': rng.randint(1, 100), 'category': 'OTHERS'})
+                    elif roll < 0.6:
+                        response = await client.get('/api/expenses/?limit=50&include_count=false', headers=headers)
+                    elif roll < 0.8:
+                        response = await client.get('/api/expenses/summary?group_by=week&filter=three_months',
+                                                    headers=headers)
+                    else:
+                        response = await client.get(f'/api/expenses/{rng.choice(user_ids)}', headers=headers)
+                    status = response.status_code
+                except httpx.HTTPError as error:
+                    status = type(error).__name__
+                latencies.append((time.perf_counter() - start) * 1000)
+                if status not in (200, 201):
+                    errors.append(status)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(connections)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+async def login_all(base, users):
+    async with httpx.AsyncClient(base_url=base, timeout=60) as client:
+        tokens, expense_ids = [], []
+        for user_id in range(1, users + 1):
+            response = await client.post('/api/auth/login', json={'username': f'user{user_id}', 'password': PASSWORD})
+            token = response.json()['token']
+            page = await client.get('/api/expenses/?limit=50&fields=id', headers={'Authorization': f'Bearer {token}'})
+            tokens.append(token)
+            expense_ids.append([row['id'] for row in page.json()['expenses']] or [0])
+    return tokens, expense_ids
+
+
+def run_mode(mode, database_path, args):
+    port = args.port + (0 if mode == 'wsgi' else 1)
+    env = {
+        **os.environ,
+        'APP_CONFIG': 'config.ProductionConfig',
+        'DATABASE_URL': f'sqlite:///{database_path}',
+        'JWT_SECRET_KEY': 'bench-secret-key-that-is-long-enough-for-hs256',
+        'BCRYPT_ROUNDS': '4',
+        'RATELIMIT_ENABLED': 'false',
+        'METRICS_ENABLED': 'false',
+        'GUNICORN_THREADS': str(args.threads),
+    }
+    server = subprocess.Popen(server_command(mode, port, args.threads), cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base = f'http://127.0.0.1:{port}'
+    try:
+        asyncio.run(wait_until_up(base))
+        tokens, expense_ids = asyncio.run(login_all(base, args.users))
+        for connections in args.connections:
+            latencies, errors, elapsed = asyncio.run(
+                drive(base, tokens, connections, args.duration, args.write_ratio, expense_ids))
+            print(f'{mode:<5} connections={connections:<5} {len(latencies) / elapsed:>8.1f} req/s '
+                  f'p50={percentile(latencies, 50):>8.1f}ms p95={percentile(latencies, 95):>8.1f}ms '
+                  f'p99={percentile(latencies, 99):>8.1f}ms errors={len(errors)}'
+                  + (f' ({sorted(set(map(str, errors)))[:3]})' if errors else ''))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--expenses', type=int, default=200_000)
+    parser.add_argument('--connections', type=lambda value: [int(n) for n in value.split(',')],
+                        default=[10, 100, 500])
+    parser.add_argument('--duration', type=float, default=10, help='seconds per connection count')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads for the WSGI worker')
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    parser.add_argument('--modes', default='wsgi,asgi')
+    parser.add_argument('--port', type=int, default=8600)
+    args = parser.parse_args()
+
+    database_path = os.path.join(tempfile.mkdtemp(), 'bench_asgi.db')
+    app = create_app(bench_config(f'sqlite:///{database_path}'))
+    print(f'Seeding {args.expenses} expenses for {args.users} users ...')
+    seed(app, args.users, args.expenses, random.Random(42))
+
+    for mode in args.modes.split(','):
+        run_mode(mode, database_path, args)
+
+
+if __name__ == '__main__':
+    main()
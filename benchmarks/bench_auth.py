@@ -0,0 +1,45 @@
+"""Per-request cost of ``token_required`` in each authentication mode.
+
+    python -m benchmarks.bench_auth --requests 5000
+
+* uncached  - decode the JWT and read the user row on every request (the old behaviour)
+* cached    - verified-token cache plus a TTL cache of user rows
+* stateless - verified-token cache, user built from the token claims
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.common import bench_config, format_row, summarize, time_call
+from app import create_app
+from middlewares.auth_middleware import token_required
+
+MODES = {
+    'uncached': {'AUTH_TOKEN_CACHE_SIZE': 0, 'AUTH_USER_CACHE_SIZE': 0, 'JWT_STATELESS_AUTH': False},
+    'cached': {'JWT_STATELESS_AUTH': False},
+    'stateless': {'JWT_STATELESS_AUTH': True},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_auth.db')
+    protected = token_required(lambda current_user: current_user.id)
+
+    for mode in MODES:
+        app = create_app(bench_config(database_url, **MODES[mode]))
+        client = app.test_client()
+        client.post('/api/auth/register', json={'username': 'bench', 'email': 'bench@example.com', 'password': 'pw'})
+        token = client.post('/api/auth/login', json={'username': 'bench', 'password': 'pw'}).get_json()['token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        with app.test_request_context(headers=headers):
+            samples = time_call(protected, args.requests)
+        print(format_row(f'token_required [{mode}]', summarize(samples)))
+
+
+if __name__ == '__main__':
+    main()
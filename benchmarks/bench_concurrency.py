@@ -0,0 +1,91 @@
+"""Mixed read/write throughput per database backend and profile.
+
+    python -m benchmarks.bench_concurrency --threads 16 --duration 10
+    python -m benchmarks.bench_concurrency --postgres-url postgresql://localhost/expenses_bench
+
+Each profile runs the app on a threaded local server. Worker threads each
+log in as their own user and issue a mix of list reads and expense creates
+(``--write-ratio``). Reports requests/sec, latency percentiles and server
+errors (e.g. "database is locked").
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmarks.common import bench_config, format_row, http_request, serve, summarize
+from app import create_app
+from config import ProductionConfig, _engine_options
+
+
+def run(label, database_url, overrides, args):
+    app = create_app(bench_config(database_url, BCRYPT_ROUNDS=4, **overrides))
+    server, base = serve(app)
+    base += '/api'
+
+    tokens = []
+    for i in range(args.threads):
+        credentials = {'username': f'{label}-{i}', 'password': 'pw'}
+        http_request(f'{base}/auth/register', {**credentials, 'email': f'{label}-{i}@example.com'})
+        tokens.append(json.loads(http_request(f'{base}/auth/login', credentials)[1])['token'])
+
+    stop = time.monotonic() + args.duration
+    reads, writes, errors = [], [], []
+    lock = threading.Lock()
+
+    def worker(token, seed):
+        rng = random.Random(seed)
+        headers = {'Authorization': f'Bearer {token}'}
+        while time.monotonic() < stop:
+            is_write = rng.random() < args.write_ratio
+            start = time.perf_counter()
+            if is_write:
+                status, _ = http_request(f'{base}/expenses/', {
+                    'title': 'bench', 'amount': rng.randint(1, 100), 'category': 'OTHERS'
+                }, headers)
+            else:
+                status, _ = http_request(f'{base}/expenses/?limit=20&include_count=false', headers=headers)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                (writes if is_write else reads).append(elapsed)
+                if status >= 500:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=worker, args=(token, i)) for i, token in enumerate(tokens)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    total = len(reads) + len(writes)
+    print(f'[{label}] {total / args.duration:.1f} req/s, {len(errors)} server errors')
+    print(format_row(f'[{label}] reads', summarize(reads)))
+    print(format_row(f'[{label}] writes', summarize(writes)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--postgres-url', default=None, help='also benchmark this PostgreSQL database')
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    def sqlite_url(name):
+        return 'sqlite:///' + os.path.join(tempfile.mkdtemp(), name)
+
+    run('sqlite-default', sqlite_url('default.db'), {}, args)
+    run('sqlite-production', sqlite_url('production.db'), {'SQLITE_PRAGMAS': ProductionConfig.SQLITE_PRAGMAS}, args)
+    if args.postgres_url:
+        run('postgresql-production', args.postgres_url,
+            {'SQLALCHEMY_ENGINE_OPTIONS': _engine_options(args.postgres_url)}, args)
+
+
+if __name__ == '__main__':
+    main()
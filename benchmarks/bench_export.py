@@ -0,0 +1,61 @@
+"""Throughput and memory of the streaming export.
+
+    python -m benchmarks.bench_export --rows 1000000
+
+Seeds one user with ``--rows`` expenses and streams
+``GET /api/expenses/export`` through the test client without buffering,
+reporting rows/sec, bytes and peak memory (tracemalloc and RSS) for each
+format, with and without gzip.
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.common import bench_config, seed_expenses
+from app import create_app
+from models import db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_export.db')
+    app = create_app(bench_config(database_url, BCRYPT_ROUNDS=4))
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': 'bench', 'email': 'bench@example.com', 'password': 'pw'})
+    token = client.post('/api/auth/login', json={'username': 'bench', 'password': 'pw'}).get_json()['token']
+    with app.app_context(), db.engine.connect() as connection:
+        seed_expenses(connection, [1], args.rows)
+
+    def stream(url, headers):
+        response = client.get(url, headers=headers, buffered=False)
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return size
+
+    for export_format in ('ndjson', 'csv'):
+        for encoding in ('identity', 'gzip'):
+            url = f'/api/expenses/export?format={export_format}'
+            headers = {'Authorization': f'Bearer {token}', 'Accept-Encoding': encoding}
+
+            start = time.perf_counter()
+            size = stream(url, headers)
+            elapsed = time.perf_counter() - start
+
+            # Second pass under tracemalloc, which is too slow to time.
+            tracemalloc.start()
+            stream(url, headers)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f'{export_format:<7} {encoding:<9} rows/s={args.rows / elapsed:>10.0f} '
+                  f'bytes={size:>12} peak_alloc={peak / 1e6:>7.2f}MB max_rss={rss_mb:>7.1f}MB')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Query plans and latencies for the expense queries before and after the indexes.
+
+    python -m benchmarks.bench_indexes --rows 2000000 --users 20
+
+Seeds a throwaway SQLite database at schema version 1 (no composite indexes),
+measures the list / filter / category queries, applies migration 2 and
+measures again.
+"""
+import argparse
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.common import format_row, seed_expenses, summarize, time_call
+import migrations
+
+QUERIES = {
+    'list newest page': (
+        'SELECT * FROM expenses WHERE user_id = :uid ORDER BY date DESC, id DESC LIMIT 50'
+    ),
+    'list filter=month page': (
+        'SELECT * FROM expenses WHERE user_id = :uid AND date >= :since ORDER BY date DESC, id DESC LIMIT 50'
+    ),
+    'count filter=three_months': (
+        'SELECT count(*) FROM expenses WHERE user_id = :uid AND date >= :since_90'
+    ),
+    'category totals': (
+        'SELECT category, sum(amount_minor), count(*) FROM expenses WHERE user_id = :uid GROUP BY category'
+    ),
+}
+
+
+def run_queries(engine, params, repeat):
+    with engine.connect() as connection:
+        for label, sql in QUERIES.items():
+            plan = connection.execute(text('EXPLAIN QUERY PLAN ' + sql), params).fetchall()
+            samples = time_call(lambda: connection.execute(text(sql), params).fetchall(), repeat)
+            print(format_row(label, summarize(samples)))
+            for row in plan:
+                print(f'    plan: {row[-1]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2_000_000, help='total expenses to seed')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--db', default=None, help='database file (default: temporary file)')
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench_indexes.db')
+    engine = create_engine(f'sqlite:///{path}')
+    migrations.upgrade(engine, target=1)
+    with engine.begin() as connection:
+        # Version 1 created the tables from the current models, indexes included;
+        # drop them to reproduce the pre-migration schema.
+        for index in ('ix_expenses_user_date_id', 'ix_expenses_user_category_date'):
+            connection.exec_driver_sql(f'DROP INDEX IF EXISTS {index}')
+        connection.execute(
+            text("INSERT INTO users (id, username, email, password_hash, created_at) "
+                 "VALUES (:id, :username, :email, '-', :created_at)"),
+            [{'id': i, 'username': f'bench{i}', 'email': f'bench{i}@example.com', 'created_at': datetime.utcnow()}
+             for i in range(1, args.users + 1)]
+        )
+
+    print(f'Seeding {args.rows} expenses for {args.users} users into {path} ...')
+    with engine.connect() as connection:
+        seed_expenses(connection, range(1, args.users + 1), args.rows // args.users)
+
+    now = datetime.utcnow()
+    params = {'uid': 1, 'since': now - timedelta(days=30), 'since_90': now - timedelta(days=90)}
+
+    print('\n== before (schema version 1) ==')
+    run_queries(engine, params, args.repeat)
+
+    migrations.upgrade(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql('ANALYZE')
+
+    print('\n== after (all migrations) ==')
+    run_queries(engine, params, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Login throughput and expense-read latency during a login storm, under gunicorn.
+
+    python -m benchmarks.bench_login_storm --duration 10 --login-threads 32
+
+Serves one SQLite database with ``gunicorn -c gunicorn.conf.py wsgi:app``
+(``--workers`` processes of ``--threads`` gthread threads, as in production)
+twice: with bcrypt inline on the request threads (``PASSWORD_POOL_WORKERS=0``)
+and on the bounded password pool at its default size for those settings.
+Login threads hammer ``/api/auth/login`` while reader threads time
+``GET /api/expenses/``. Needs gunicorn.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.common import bench_config, format_row, http_request, summarize
+from app import create_app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CREDENTIALS = {'username': 'storm', 'password': 'pw'}
+
+
+def seed(database_path, rounds):
+    app = create_app(bench_config(f'sqlite:///{database_path}', BCRYPT_ROUNDS=rounds, PASSWORD_POOL_WORKERS=0,
+                                  RECURRING_SCHEDULER_ENABLED=False))
+    client = app.test_client()
+    client.post('/api/auth/register', json={**CREDENTIALS, 'email': 'storm@example.com'})
+    token = client.post('/api/auth/login', json=CREDENTIALS).get_json()['token']
+    for i in range(20):
+        client.post('/api/expenses/', json={'title': f'e{i}', 'amount': 1, 'category': 'OTHERS'},
+                    headers={'Authorization': f'Bearer {token}'})
+
+
+def wait_until_up(base, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            http_request(f'{base}/')
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server at {base} did not start')
+
+
+def run(label, overrides, database_path, args):
+    env = {
+        **os.environ,
+        'APP_CONFIG': 'config.ProductionConfig',
+        'DATABASE_URL': f'sqlite:///{database_path}',
+        'JWT_SECRET_KEY': 'bench-secret-key-that-is-long-enough-for-hs256',
+        'BCRYPT_ROUNDS': str(args.rounds),
+        'RATELIMIT_ENABLED': 'false',
+        'RECURRING_SCHEDULER_ENABLED': 'false',
+        'WEB_CONCURRENCY': str(args.workers),
+        'GUNICORN_THREADS': str(args.threads),
+        **{key: str(value) for key, value in overrides.items()},
+    }
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{args.port}', 'wsgi:app']
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{args.port}'
+    try:
+        wait_until_up(base)
+        base += '/api'
+        token = json.loads(http_request(f'{base}/auth/login', CREDENTIALS)[1])['token']
+
+        stop = time.monotonic() + args.duration
+        statuses = {}
+        reads = []
+        lock = threading.Lock()
+
+        def login_loop():
+            while time.monotonic() < stop:
+                status, _ = http_request(f'{base}/auth/login', CREDENTIALS)
+                with lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+
+        def read_loop():
+            while time.monotonic() < stop:
+                start = time.perf_counter()
+                http_request(f'{base}/expenses/?limit=20', headers={'Authorization': f'Bearer {token}'})
+                with lock:
+                    reads.append((time.perf_counter() - start) * 1000)
+
+        threads = [threading.Thread(target=login_loop) for _ in range(args.login_threads)]
+        threads += [threading.Thread(target=read_loop) for _ in range(args.read_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    ok = statuses.get(200, 0)
+    rejected = statuses.get(503, 0)
+    print(f'[{label}] logins ok={ok} ({ok / args.duration:.1f}/s) rejected={rejected} other={statuses}')
+    print(format_row(f'[{label}] expense read', summarize(reads)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--login-threads', type=int, default=32)
+    parser.add_argument('--read-threads', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost factor')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--port', type=int, default=8700)
+    args = parser.parse_args()
+
+    database_path = os.path.join(tempfile.mkdtemp(), 'bench_login.db')
+    seed(database_path, args.rounds)
+    run('inline', {'PASSWORD_POOL_WORKERS': 0}, database_path, args)
+    run('pool', {}, database_path, args)
+
+
+if __name__ == '__main__':
+    main()
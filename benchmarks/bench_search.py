@@ -0,0 +1,107 @@
+"""Search latency: ``LIKE '%term%'`` scans vs the full-text index.
+
+    python -m benchmarks.bench_search --rows 1000000 --users 20
+
+Seeds a throwaway SQLite database at schema version 6 (no search index)
+with merchant-style titles and descriptions, measures substring scans for
+a few queries, applies migration 7 (timing the index build) and measures
+the ranked ``q=`` query the list endpoint runs. Also reports the cost the
+sync triggers add to bulk inserts.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, select, text
+
+from benchmarks.common import format_row, seed_expenses, summarize, time_call
+from models import Expense
+import migrations
+import search
+
+MERCHANTS = [
+    'Amazon', 'Starbucks', 'Uber', 'Lyft', 'Walmart', 'Target', 'Costco', 'Whole Foods', 'Trader Joe', 'Netflix',
+    'Spotify', 'Shell', 'Chevron', 'Home Depot', 'IKEA', 'Apple', 'Airbnb', 'Delta', 'CVS Pharmacy', 'Walgreens',
+]
+ITEMS = [
+    'order', 'groceries', 'coffee', 'ride', 'subscription', 'fuel', 'refund', 'lunch', 'dinner', 'tickets',
+    'furniture', 'prescription', 'gift', 'repair', 'rent', 'utilities', 'phone bill', 'books', 'snacks', 'parking',
+]
+NOTES = ['', '', '', 'split with friends', 'work trip', 'reimbursable', 'birthday', 'monthly', 'weekend']
+
+QUERIES = ['amazon', 'coffee', 'uber ride', 'whole foods groceries', 'reimb', 'birthday gift', 'ikea repair work']
+
+
+def merchant_titles(rng, i):
+    return f'{rng.choice(MERCHANTS)} {rng.choice(ITEMS)}', rng.choice(NOTES)
+
+
+def like_query(user_id, q):
+    query = select(Expense.id, Expense.title).filter(Expense.user_id == user_id)
+    for word in search.terms(q):
+        pattern = f'%{word}%'
+        query = query.filter(Expense.title.ilike(pattern) | Expense.description.ilike(pattern))
+    return query.order_by(Expense.date.desc(), Expense.id.desc()).limit(50)
+
+
+def fts_query(user_id, q):
+    query = select(Expense.id, Expense.title).filter(Expense.user_id == user_id)
+    query, rank = search.apply(query, q, dialect_name='sqlite')
+    return query.add_columns(rank).order_by(rank.desc(), Expense.id.desc()).limit(50)
+
+
+def run_queries(engine, build, repeat):
+    with engine.connect() as connection:
+        for q in QUERIES:
+            query = build(1, q)
+            samples = time_call(lambda: connection.execute(query).fetchall(), repeat)
+            print(format_row(f'q={q!r}', summarize(samples)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000, help='total expenses to seed')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench_search.db')
+    engine = create_engine(f'sqlite:///{path}')
+    migrations.upgrade(engine, target=6)
+    with engine.begin() as connection:
+        connection.execute(
+            text("INSERT INTO users (id, username, email, password_hash, created_at) "
+                 "VALUES (:id, :username, :email, '-', :created_at)"),
+            [{'id': i, 'username': f'bench{i}', 'email': f'bench{i}@example.com', 'created_at': datetime.utcnow()}
+             for i in range(1, args.users + 1)]
+        )
+
+    rows_per_user = args.rows // args.users
+    print(f'Seeding {args.rows} expenses for {args.users} users into {path} ...')
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        seed_expenses(connection, range(1, args.users + 1), rows_per_user, titles=merchant_titles)
+    print(f'bulk insert without index: {args.rows / (time.perf_counter() - started):,.0f} rows/s')
+
+    print(f'\n== LIKE scans ({rows_per_user} rows per user) ==')
+    run_queries(engine, like_query, args.repeat)
+
+    started = time.perf_counter()
+    migrations.upgrade(engine)
+    print(f'\nindex build (migration 7): {time.perf_counter() - started:.1f}s')
+
+    print('\n== full-text index, ranked ==')
+    run_queries(engine, fts_query, args.repeat)
+
+    # Same volume again, now through the sync triggers.
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        seed_expenses(connection, [args.users], rows_per_user, titles=merchant_titles, rng=random.Random(7))
+    print(f'\nbulk insert with index triggers: {rows_per_user / (time.perf_counter() - started):,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Rows/sec serialized by the ORM ``to_dict`` path and the lean tuple path.
+
+    python -m benchmarks.bench_serialization --rows 100000
+
+Each variant loads the same rows and encodes them to JSON bytes:
+
+* orm+to_dict+json     - ORM instances, ``Expense.to_dict``, ``json.dumps`` (the old list path)
+* tuples+json          - column tuples, ``row_serializer``, standard library JSON
+* tuples+orjson        - column tuples, ``row_serializer``, orjson (if installed)
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import select
+
+from benchmarks.common import bench_config, seed_expenses
+from app import create_app
+from models import db, Expense
+import serializers
+
+
+def measure(label, rows, fn):
+    start = time.perf_counter()
+    size = len(fn())
+    elapsed = time.perf_counter() - start
+    print(f'{label:<22} rows/s={rows / elapsed:>10.0f} bytes={size:>11} elapsed={elapsed * 1000:>8.1f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_serialization.db')
+    app = create_app(bench_config(database_url))
+    with app.app_context():
+        db.session.execute(db.text(
+            "INSERT INTO users (id, username, email, password_hash, created_at) "
+            "VALUES (1, 'bench', 'bench@example.com', '-', CURRENT_TIMESTAMP)"
+        ))
+        db.session.commit()
+        with db.engine.connect() as connection:
+            seed_expenses(connection, [1], args.rows)
+
+        fields = serializers.DEFAULT_FIELDS
+        query = select(*serializers.expense_columns(fields)).where(Expense.user_id == 1)
+
+        def orm_path():
+            db.session.expunge_all()
+            expenses = Expense.query.filter_by(user_id=1).all()
+            return json.dumps({'expenses': [expense.to_dict() for expense in expenses]}).encode('utf-8')
+
+        def tuple_path(encode):
+            def run():
+                serialize = serializers.row_serializer(fields, encode_datetimes=encode is not serializers.orjson)
+                rows = db.session.execute(query).all()
+                return encode_payload(encode, {'expenses': [serialize(row) for row in rows]})
+            return run
+
+        def encode_payload(encode, payload):
+            if encode is json:
+                return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+            return encode.dumps(payload)
+
+        measure('orm+to_dict+json', args.rows, orm_path)
+        measure('tuples+json', args.rows, tuple_path(json))
+        if serializers.orjson is not None:
+            measure('tuples+orjson', args.rows, tuple_path(serializers.orjson))
+        else:
+            print('tuples+orjson          skipped: orjson is not installed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Process start-up time against a budget.
+
+    python -m benchmarks.bench_startup --repeat 10
+
+* cold     - a new interpreter imports the app and runs ``create_app`` on an
+             empty database (first deploy, or a test run on a fresh file)
+* warm     - a new interpreter on a database that is already current
+             (a worker restart); the schema is checked, not rebuilt
+* test app - ``testing.create_test_app`` in an already warm interpreter
+* rollback - entering and leaving ``testing.rolled_back`` once per test
+
+Wall times include interpreter start-up. Exits non-zero when the p50 of
+``cold`` or ``warm`` exceeds its budget. ``python -X importtime -c "import app"``
+shows where the import time goes.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import format_row, summarize, time_call
+from testing import create_test_app, rolled_back
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+print(json.dumps({'import': (imported - start) * 1000, 'create_app': (time.perf_counter() - imported) * 1000}))
+'''
+
+
+def start_process(database_path):
+    """Start the app in a new interpreter; returns wall, import and create_app milliseconds."""
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database_path}', RECURRING_SCHEDULER_ENABLED='false')
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    wall = (time.perf_counter() - start) * 1000
+    phases = json.loads(result.stdout.strip().splitlines()[-1])
+    return wall, phases['import'], phases['create_app']
+
+
+def measure(label, runs):
+    walls, imports, creates = zip(*runs)
+    print(format_row(f'{label} [wall]', summarize(walls)))
+    print(format_row(f'{label} [import]', summarize(imports)))
+    print(format_row(f'{label} [create_app]', summarize(creates)))
+    return summarize(walls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--cold-budget-ms', type=float, default=1500)
+    parser.add_argument('--warm-budget-ms', type=float, default=1200)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    cold_runs = []
+    for index in range(args.repeat):
+        cold_runs.append(start_process(os.path.join(directory, f'cold_{index}.db')))
+    warm_path = os.path.join(directory, 'warm.db')
+    start_process(warm_path)
+    warm_runs = [start_process(warm_path) for _ in range(args.repeat)]
+
+    budgets = {
+        'cold': (measure('cold', cold_runs), args.cold_budget_ms),
+        'warm': (measure('warm', warm_runs), args.warm_budget_ms),
+    }
+
+    print(format_row('test app [create_test_app]', summarize(time_call(create_test_app, args.repeat))))
+    app = create_test_app()
+
+    def enter_and_leave():
+        with rolled_back(app):
+            pass
+    print(format_row('test app [rolled_back]', summarize(time_call(enter_and_leave, args.repeat * 10))))
+
+    over = []
+    for label, (stats, budget) in budgets.items():
+        verdict = 'ok' if stats['p50_ms'] <= budget else 'OVER BUDGET'
+        print(f'{label:<6} p50 {stats["p50_ms"]:.0f}ms / budget {budget:.0f}ms  {verdict}')
+        if stats['p50_ms'] > budget:
+            over.append(label)
+    if over:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Shared helpers for the benchmark scripts.
+
+Run the scripts from the repository root, e.g. ``python -m benchmarks.bench_indexes``.
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from models import CategoryEnum  # noqa: E402
+
+CATEGORIES = [category.name for category in CategoryEnum]
+# Skewed towards everyday spending, like real statements.
+CATEGORY_WEIGHTS = [35, 15, 5, 15, 10, 8, 12]
+
+
+def bench_config(database_url, **overrides):
+    """Return a ``Config`` subclass pointing at ``database_url``."""
+    attrs = {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'JWT_SECRET_KEY': 'bench-secret-key-that-is-long-enough-for-hs256',
+        # Load generators come from one address and would trip the limits.
+        'RATELIMIT_ENABLED': False,
+    }
+    attrs.update(overrides)
+    return type('BenchConfig', (Config,), attrs)
+
+
+def seed_expenses(connection, user_ids, rows_per_user, years=3, chunk_size=50_000, rng=None, titles=None):
+    """Bulk insert synthetic expenses through a DBAPI-level executemany.
+
+    Dates are skewed towards the recent past so the time filters have
+    realistic selectivity. ``titles`` is a callable ``(rng, i) -> (title,
+    description)``; the default is ``('Expense {i}', '')``.
+    """
+    rng = rng or random.Random(42)
+    now = datetime.utcnow()
+    span = years * 365 * 24 * 3600
+    sql = (
+        'INSERT INTO expenses (title, amount_minor, category, date, description, user_id, created_at, updated_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+    )
+    raw = connection.connection.driver_connection
+    batch = []
+    for user_id in user_ids:
+        for i in range(rows_per_user):
+            when = now - timedelta(seconds=int(span * rng.random() ** 2))
+            stamp = when.strftime('%Y-%m-%d %H:%M:%S.%f')
+            title, description = titles(rng, i) if titles else (f'Expense {i}', '')
+            batch.append((
+                title,
+                round(rng.uniform(1, 500) * 100),  # cents; currency defaults to USD
+                rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+                stamp,
+                description,
+                user_id,
+                stamp,
+                stamp,
+            ))
+            if len(batch) >= chunk_size:
+                raw.executemany(sql, batch)
+                batch.clear()
+    if batch:
+        raw.executemany(sql, batch)
+    raw.commit()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def time_call(fn, repeat=20):
+    """Call ``fn`` ``repeat`` times and return per-call latencies in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples):
+    return {
+        'n': len(samples),
+        'mean_ms': round(statistics.fmean(samples), 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+    }
+
+
+def format_row(label, stats):
+    return (f"{label:<40} n={stats['n']:<5} mean={stats['mean_ms']:>9.3f}ms "
+            f"p50={stats['p50_ms']:>9.3f}ms p95={stats['p95_ms']:>9.3f}ms p99={stats['p99_ms']:>9.3f}ms")
+
+
+def http_request(url, data=None, headers=None, method=None):
+    """Send a JSON request with urllib; returns ``(status, body_bytes)``."""
+    body = json.dumps(data).encode() if data is not None else None
+    req = urllib.request.Request(url, data=body, method=method,
+                                 headers={'Content-Type': 'application/json', **(headers or {})})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.read()
+
+
+def serve(app):
+    """Serve ``app`` on a threaded local werkzeug server; returns ``(server, base_url)``."""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
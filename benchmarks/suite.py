@@ -0,0 +1,288 @@
+"""End-to-end benchmark suite with saved baselines.
+
+    python -m benchmarks.suite --users 200 --expenses 1000000 --save benchmarks/baseline.json
+    python -m benchmarks.suite --users 200 --expenses 1000000 --compare benchmarks/baseline.json
+
+Seeds a local SQLite database and drives the real app from ``create_app``
+through the test client. Expense counts per user follow a Zipf-like skew,
+so a few heavy users hold most rows. Dates lean towards the recent past
+and categories towards everyday spending. Each scenario reports
+throughput, p50/p95/p99 latency and peak Python allocations.
+``--compare`` prints the change against a saved run and exits non-zero
+when any p95 regresses by more than ``--threshold`` percent.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from benchmarks.common import bench_config, percentile, seed_expenses
+from app import create_app
+from middlewares.compression_middleware import available_encodings
+from models import db
+import changes
+import password_pool
+import rollups
+
+PASSWORD = 'bench-password'
+
+
+def seed(app, users, expenses, rng):
+    """Insert users and skewed expense volumes, then rebuild the derived tables."""
+    password_hash = password_pool._hash(PASSWORD.encode('utf-8'), 4)
+    weights = [1 / (rank + 1) for rank in range(users)]
+    scale = expenses / sum(weights)
+    counts = [max(1, int(weight * scale)) for weight in weights]
+
+    with app.app_context():
+        now = datetime.utcnow()
+        db.session.execute(
+            text("INSERT INTO users (id, username, email, password_hash, is_active, expenses_version, created_at) "
+                 "VALUES (:id, :username, :email, :password_hash, 1, 0, :created_at)"),
+            [{'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com',
+              'password_hash': password_hash, 'created_at': now} for i in range(1, users + 1)]
+        )
+        db.session.commit()
+        with db.engine.connect() as connection:
+            for user_id, count in enumerate(counts, start=1):
+                seed_expenses(connection, [user_id], count, rng=rng)
+        rollups.rebuild(db.session)
+        db.session.commit()
+        with db.engine.begin() as connection:
+            changes.backfill(connection)
+    return counts
+
+
+class Runner:
+    def __init__(self, client, iterations):
+        self.client = client
+        self.iterations = iterations
+        self.results = {}
+
+    def scenario(self, name, fn, iterations=None):
+        iterations = iterations or self.iterations
+        samples = []
+        size = None
+        tracemalloc.start()
+        start = time.perf_counter()
+        for i in range(iterations):
+            begin = time.perf_counter()
+            result = fn(i)
+            samples.append((time.perf_counter() - begin) * 1000)
+            if hasattr(result, 'content_length'):
+                size = len(result.get_data())
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.results[name] = {
+            'iterations': iterations,
+            'throughput_per_s': round(iterations / elapsed, 1),
+            'p50_ms': round(percentile(samples, 50), 3),
+            'p95_ms': round(percentile(samples, 95), 3),
+            'p99_ms': round(percentile(samples, 99), 3),
+            'peak_alloc_mb': round(peak / 1e6, 2),
+        }
+        if size is not None:
+            self.results[name]['response_bytes'] = size
+        row = self.results[name]
+        print(f"{name:<28} {row['throughput_per_s']:>9.1f}/s p50={row['p50_ms']:>8.2f}ms "
+              f"p95={row['p95_ms']:>8.2f}ms p99={row['p99_ms']:>8.2f}ms peak={row['peak_alloc_mb']:>6.2f}MB")
+
+
+def check(response, *statuses):
+    if response.status_code not in statuses:
+        raise RuntimeError(f'unexpected {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    return response
+
+
+def run_scenarios(app, counts, args):
+    client = app.test_client()
+    runner = Runner(client, args.iterations)
+    users = len(counts)
+
+    def login(user_id):
+        response = check(client.post('/api/auth/login', json={'username': f'user{user_id}', 'password': PASSWORD}), 200)
+        return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+    run = int(time.time())  # keeps registrations unique when --db is reused
+    runner.scenario('register', lambda i: check(client.post('/api/auth/register', json={
+        'username': f'new{run}_{i}', 'email': f'new{run}_{i}@example.com', 'password': PASSWORD}), 201),
+        iterations=max(1, args.iterations // 10))
+    runner.scenario('login', lambda i: login(i % users + 1), iterations=max(1, args.iterations // 10))
+
+    # The heaviest user is user 1; the median user sits in the middle of the skew.
+    heavy = login(1)
+    median = login(users // 2 + 1)
+    end = datetime.utcnow()
+    custom = {'start_date': (end - timedelta(days=180)).isoformat(), 'end_date': end.isoformat()}
+
+    for label, headers in (('heavy', heavy), ('median', median)):
+        for filter_type in ('all', 'week', 'month', 'three_months', 'custom'):
+            params = {'filter': filter_type, **(custom if filter_type == 'custom' else {})}
+            runner.scenario(f'list {filter_type} [{label}]', lambda i, params=params, headers=headers: check(
+                client.get('/api/expenses/', query_string=params, headers=headers), 200))
+
+    def follow_pages(i):
+        cursor = None
+        for _ in range(10):
+            params = {'limit': 100, 'include_count': 'false', **({'cursor': cursor} if cursor else {})}
+            cursor = check(client.get('/api/expenses/', query_string=params, headers=heavy), 200).get_json()['next_cursor']
+            if not cursor:
+                break
+    runner.scenario('paginate 10 pages [heavy]', follow_pages, iterations=max(1, args.iterations // 5))
+
+    runner.scenario('summary category,month [heavy]', lambda i: check(
+        client.get('/api/expenses/summary?group_by=category,month', headers=heavy), 200))
+    runner.scenario('summary week, filter=month', lambda i: check(
+        client.get('/api/expenses/summary?group_by=week&filter=month', headers=heavy), 200))
+
+    etag = check(client.get('/api/expenses/', headers=heavy), 200).headers['ETag']
+    payloads = {
+        'json': ({}, {}),
+        'json+gzip': ({}, {'Accept-Encoding': 'gzip'}),
+        'json+br': ({}, {'Accept-Encoding': 'br'}),
+        'columnar': ({'layout': 'columnar'}, {}),
+        'columnar+gzip': ({'layout': 'columnar'}, {'Accept-Encoding': 'gzip'}),
+        'columnar+br': ({'layout': 'columnar'}, {'Accept-Encoding': 'br'}),
+    }
+    if 'br' not in available_encodings():
+        payloads = {label: value for label, value in payloads.items() if not label.endswith('+br')}
+    for label, (params, extra) in payloads.items():
+        runner.scenario(f'list 500 rows {label}', lambda i, params=params, extra=extra: check(client.get(
+            '/api/expenses/', query_string={'limit': 500, **params}, headers={**heavy, **extra}), 200))
+
+    runner.scenario('list 304 revalidation', lambda i: check(
+        client.get('/api/expenses/', headers={**heavy, 'If-None-Match': etag}), 304))
+
+    def export(i):
+        response = client.get('/api/expenses/export?filter=month', headers=median, buffered=False)
+        for _ in response.response:
+            pass
+        response.close()
+    runner.scenario('export month [median]', export, iterations=max(1, args.iterations // 5))
+
+    created = []
+
+    def create(i):
+        response = check(client.post('/api/expenses/', json={
+            'title': f'bench {i}', 'amount': 12.5, 'category': 'GROCERIES'}, headers=median), 201)
+        created.append(response.get_json()['expense']['id'])
+    runner.scenario('create', create)
+    runner.scenario('get by id', lambda i: check(client.get(f'/api/expenses/{created[i % len(created)]}', headers=median), 200))
+    runner.scenario('update', lambda i: check(client.put(f'/api/expenses/{created[i % len(created)]}', json={
+        'amount': 20, 'category': 'LEISURE'}, headers=median), 200))
+    runner.scenario('delete', lambda i: check(client.delete(f'/api/expenses/{created[i]}', headers=median), 200),
+                    iterations=len(created))
+
+    rows = ''.join(f'bulk {n},{n % 90 + 1},OTHERS,2024-01-{n % 28 + 1:02d}T12:00:00,\n' for n in range(args.bulk_rows))
+    body = 'title,amount,category,date,description\n' + rows
+    runner.scenario(f'bulk import {args.bulk_rows} rows', lambda i: check(client.post(
+        '/api/expenses/bulk', data=body, headers={**median, 'Content-Type': 'text/csv'}), 201),
+        iterations=max(1, args.iterations // 20))
+
+    print_payload_savings(runner.results, args.link_mbps)
+    return runner.results
+
+
+def print_payload_savings(results, link_mbps):
+    """Bytes on the wire per payload mode, with the transfer time on a ``link_mbps`` link added."""
+    base = results.get('list 500 rows json')
+    if not base:
+        return
+    base_total = base['p50_ms'] + base['response_bytes'] * 8 / (link_mbps * 1000)
+    print(f'\nPayload savings for a 500-row page (server p50 + transfer at {link_mbps} Mbit/s):')
+    for name, row in results.items():
+        if not name.startswith('list 500 rows ') or 'response_bytes' not in row:
+            continue
+        total = row['p50_ms'] + row['response_bytes'] * 8 / (link_mbps * 1000)
+        print(f"{name[len('list 500 rows '):]:<16} {row['response_bytes']:>9} bytes "
+              f"({row['response_bytes'] / base['response_bytes']:6.1%})  ~{total:8.1f}ms "
+              f"({(total - base_total) / base_total:+6.1%})")
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)
+    print(f"\nCompared with {baseline_path} ({baseline.get('revision')}):")
+    regressions = []
+    for name, row in results.items():
+        before = baseline['scenarios'].get(name)
+        if not before or not before['p95_ms']:
+            continue
+        change = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        marker = '  REGRESSION' if change > threshold else ''
+        print(f"{name:<28} p95 {before['p95_ms']:>8.2f}ms -> {row['p95_ms']:>8.2f}ms ({change:+6.1f}%){marker}")
+        if marker:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--expenses', type=int, default=1_000_000, help='total seeded expenses')
+    parser.add_argument('--iterations', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--bulk-rows', type=int, default=5000)
+    parser.add_argument('--link-mbps', type=float, default=5, help='link speed for the payload savings estimate')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', default=None, help='reuse/keep this SQLite file instead of a temporary one')
+    parser.add_argument('--save', default=None, help='write results to this JSON file')
+    parser.add_argument('--compare', default=None, help='compare with a JSON file written by --save')
+    parser.add_argument('--threshold', type=float, default=20, help='allowed p95 regression in percent')
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench_suite.db')
+    reuse = args.db and os.path.exists(path)
+    app = create_app(bench_config(f'sqlite:///{path}', BCRYPT_ROUNDS=4, MAX_QUERIES_PER_REQUEST=None))
+
+    rng = random.Random(args.seed)
+    if reuse:
+        with app.app_context():
+            count = db.session.execute(text("SELECT count(*) FROM users WHERE username LIKE 'user%'")).scalar()
+        counts = [0] * count
+        print(f'Reusing {path} ({count} users)')
+    else:
+        print(f'Seeding {args.expenses} expenses for {args.users} users into {path} ...')
+        start = time.perf_counter()
+        counts = seed(app, args.users, args.expenses, rng)
+        print(f'Seeded in {time.perf_counter() - start:.1f}s (heaviest user: {counts[0]} expenses)\n')
+
+    results = run_scenarios(app, counts, args)
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'\nmax RSS: {rss_mb:.1f}MB')
+
+    report = {
+        'revision': git_revision(),
+        'recorded_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'parameters': {'users': args.users, 'expenses': args.expenses, 'iterations': args.iterations},
+        'max_rss_mb': round(rss_mb, 1),
+        'scenarios': results,
+    }
+    if args.save:
+        with open(args.save, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        print(f'Saved results to {args.save}')
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
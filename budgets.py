@@ -0,0 +1,250 @@
+"""Monthly budgets per category, checked against the rollup table.
+
+``expense_rollups`` already holds every user's running total per
+(category, month) and is updated in each write transaction. A budget check
+after a write is therefore one indexed join of ``budgets`` with the touched
+rollup buckets, and the status endpoint reads one row per category.
+``expenses`` is never summed.
+
+Each budget has a currency. Spend recorded in other currencies is
+converted at the rate of the month's last day, or of today for the current
+month (see ``fx.py``). Spend in a currency without a rate is not counted
+towards the budget; the status lists it per currency under ``unconverted``.
+
+Write paths that can raise spend call ``check`` after updating the rollups
+and before committing. Each threshold in ``BUDGET_ALERT_THRESHOLDS`` that a
+month's spend has reached is stored as a ``budget_alerts`` row, once per
+category, month and threshold. New alerts are POSTed to
+``BUDGET_WEBHOOK_URL`` after the transaction commits. Delivery runs on a
+background thread, so a slow receiver never holds up a write.
+"""
+import json
+import logging
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import and_, event, insert, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import fx
+import money
+import rollups as rollup_buckets
+from models import Budget, BudgetAlert, ExpenseRollup
+
+logger = logging.getLogger(__name__)
+
+_INSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+DEFAULT_THRESHOLDS = (0.8, 1.0)
+
+_webhook_pool = None
+
+
+def _config(key, default):
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def _rates():
+    return fx.get_rates() if has_app_context() else fx.RateTable(None)
+
+
+def rate_day(month, today=None):
+    """The day whose exchange rates convert ``month``'s spend."""
+    today = today or datetime.utcnow().date()
+    last_day = (rollup_buckets.month_bounds(month)[1] - timedelta(days=1)).date()
+    return min(last_day, today)
+
+
+def _spend(rows, rates, month=None):
+    """Sum rollup rows joined to their budget into ``{(category, month): spend}``.
+
+    Each spend is a dict with the budget and the spent total in major units
+    of the budget currency, plus the expense count. Spend that cannot be
+    converted goes to ``unconverted``, ``{currency: major units}``, instead.
+    ``month`` is for rows of one month, which may have no rollup row.
+    """
+    spend = {}
+    for row in rows:
+        key = (row.category, month or row.month)
+        entry = spend.get(key)
+        if entry is None:
+            entry = spend[key] = {
+                'budget': money.to_major(row.amount_minor, row.currency),
+                'currency': row.currency,
+                'spent': 0.0,
+                'count': 0,
+                'unconverted': {},
+            }
+        if row.total:
+            try:
+                factor = rates.factor(row.spent_currency, row.currency, rate_day(key[1]))
+            except fx.MissingRate:
+                unconverted = entry['unconverted']
+                unconverted[row.spent_currency] = (unconverted.get(row.spent_currency, 0)
+                                                   + money.to_major(row.total, row.spent_currency))
+                continue
+            entry['spent'] += row.total * factor
+            entry['count'] += row.count
+    for entry in spend.values():
+        entry['spent'] = round(entry['spent'], money.exponent(entry['currency']))
+    return spend
+
+
+def _budget_rows(budgets, rollups):
+    return select(
+        budgets.c.category,
+        budgets.c.amount_minor,
+        budgets.c.currency,
+        rollups.c.month,
+        rollups.c.currency.label('spent_currency'),
+        rollups.c.total,
+        rollups.c.count,
+    )
+
+
+def check(session, user_id, buckets):
+    """Store an alert for every threshold the ``(category, month)`` buckets have reached.
+
+    Returns the alerts created by this call (dicts). They are delivered to
+    the webhook once the session commits.
+    """
+    buckets = set(buckets)
+    if not buckets:
+        return []
+    budgets, rollups = Budget.__table__, ExpenseRollup.__table__
+    rows = session.execute(
+        _budget_rows(budgets, rollups)
+        .join(rollups, and_(rollups.c.user_id == budgets.c.user_id, rollups.c.category == budgets.c.category))
+        .where(
+            budgets.c.user_id == user_id,
+            or_(*(and_(rollups.c.category == category, rollups.c.month == month) for category, month in buckets)),
+        )
+    ).all()
+    spend = _spend(rows, _rates())
+
+    thresholds = _config('BUDGET_ALERT_THRESHOLDS', DEFAULT_THRESHOLDS)
+    now = datetime.utcnow()
+    crossed = [
+        {
+            'user_id': user_id,
+            'category': category,
+            'month': month,
+            'threshold': threshold,
+            'spent': entry['spent'],
+            'budget': entry['budget'],
+            'currency': entry['currency'],
+            'created_at': now,
+        }
+        for (category, month), entry in spend.items() if entry['budget'] > 0
+        for threshold in thresholds if entry['spent'] >= entry['budget'] * threshold
+    ]
+    if not crossed:
+        return []
+
+    new = _insert_new_alerts(session, crossed)
+    if new:
+        session.info.setdefault('budget_alerts', []).extend(new)
+    return new
+
+
+def _insert_new_alerts(session, crossed):
+    table = BudgetAlert.__table__
+    make_insert = _INSERT_DIALECTS.get(session.get_bind().dialect.name)
+    if make_insert is not None:
+        stmt = make_insert(table).on_conflict_do_nothing(
+            index_elements=['user_id', 'category', 'month', 'threshold']
+        ).returning(table.c.id)
+        # One statement per alert: RETURNING tells which ones were new.
+        return [
+            alert_payload(alert, alert_id)
+            for alert in crossed
+            for alert_id in session.execute(stmt, alert).scalars()
+        ]
+
+    existing = {
+        (row.category, row.month, row.threshold)
+        for row in session.execute(
+            select(table.c.category, table.c.month, table.c.threshold)
+            .where(table.c.user_id == crossed[0]['user_id'], table.c.month.in_({a['month'] for a in crossed}))
+        )
+    }
+    new = [alert for alert in crossed if (alert['category'], alert['month'], alert['threshold']) not in existing]
+    return [alert_payload(alert, session.execute(insert(table), alert).inserted_primary_key[0]) for alert in new]
+
+
+def alert_payload(alert, alert_id):
+    return {
+        'id': alert_id,
+        'user_id': alert['user_id'],
+        'category': alert['category'].name,
+        'month': alert['month'],
+        'threshold': alert['threshold'],
+        'spent': alert['spent'],
+        'budget': alert['budget'],
+        'currency': alert['currency'],
+    }
+
+
+def status(session, user_id, month):
+    """Spend against every budget of ``user_id`` in ``month`` (YYYY-MM), from the rollups."""
+    budgets, rollups = Budget.__table__, ExpenseRollup.__table__
+    rows = session.execute(
+        _budget_rows(budgets, rollups)
+        .outerjoin(rollups, and_(
+            rollups.c.user_id == budgets.c.user_id,
+            rollups.c.category == budgets.c.category,
+            rollups.c.month == month,
+        ))
+        .where(budgets.c.user_id == user_id)
+        .order_by(budgets.c.category)
+    ).all()
+    spend = _spend(rows, _rates(), month)
+    return [
+        {
+            'category': category.name,
+            'budget': entry['budget'],
+            'currency': entry['currency'],
+            'spent': entry['spent'],
+            'count': entry['count'],
+            'remaining': round(entry['budget'] - entry['spent'], money.exponent(entry['currency'])),
+            'used': entry['spent'] / entry['budget'] if entry['budget'] else None,
+            'over': entry['spent'] > entry['budget'],
+            **({'unconverted': {
+                currency: round(amount, money.exponent(currency)) for currency, amount in entry['unconverted'].items()
+            }} if entry['unconverted'] else {}),
+        }
+        for (category, _), entry in spend.items()
+    ]
+
+
+def deliver(url, alerts, timeout):
+    body = json.dumps({'alerts': alerts}).encode('utf-8')
+    webhook_request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(webhook_request, timeout=timeout) as response:
+            response.read()
+    except OSError:
+        logger.warning('budget alert webhook %s failed', url, exc_info=True)
+
+
+def _submit(url, alerts, timeout):
+    global _webhook_pool
+    if _webhook_pool is None:
+        _webhook_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='budget-webhook')
+    _webhook_pool.submit(deliver, url, alerts, timeout)
+
+
+@event.listens_for(Session, 'after_commit')
+def _send_alerts(session):
+    alerts = session.info.pop('budget_alerts', None)
+    url = _config('BUDGET_WEBHOOK_URL', None)
+    if alerts and url:
+        _submit(url, alerts, _config('BUDGET_WEBHOOK_TIMEOUT', 5))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_alerts(session):
+    session.info.pop('budget_alerts', None)
@@ -0,0 +1,86 @@
+"""Change log behind ``GET /api/expenses/changes``.
+
+Every expense write appends one ``expense_changes`` row per touched
+expense; deletes are appended as tombstones. Clients keep the ``seq`` of the
+last entry they saw as an opaque watermark and ask for what came after it.
+
+``record`` must be called after ``etags.bump`` in the same transaction. The
+bump locks the user's row until commit, so one user's sequence numbers are
+handed out in commit order and a client never skips past an entry that has
+not committed yet.
+"""
+import base64
+from datetime import datetime
+
+from sqlalchemy import delete, false, func, insert, select
+
+from models import Expense, ExpenseChange
+
+
+def record(session, user_id, expense_ids, deleted=False):
+    now = datetime.utcnow()
+    rows = [
+        {'user_id': user_id, 'expense_id': expense_id, 'deleted': deleted, 'changed_at': now}
+        for expense_id in expense_ids
+    ]
+    if rows:
+        session.execute(insert(ExpenseChange.__table__), rows)
+
+
+def encode_watermark(seq):
+    return base64.urlsafe_b64encode(f'v1:{seq}'.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_watermark(token):
+    """Return the sequence number in ``token`` (0 when empty); raises ``ValueError``."""
+    if not token:
+        return 0
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        version, seq = base64.urlsafe_b64decode(padded.encode('ascii')).decode('ascii').split(':')
+    except (TypeError, ValueError) as exc:
+        raise ValueError('invalid watermark') from exc
+    if version != 'v1':
+        raise ValueError('invalid watermark')
+    return int(seq)
+
+
+def changes_since(session, user_id, since, limit):
+    """Return ``(entries, last_seq, has_more)`` for up to ``limit`` log entries after ``since``.
+
+    ``entries`` maps each expense id to whether its latest change in the
+    page is a delete.
+    """
+    table = ExpenseChange.__table__
+    rows = session.execute(
+        select(table.c.seq, table.c.expense_id, table.c.deleted)
+        .where(table.c.user_id == user_id, table.c.seq > since)
+        .order_by(table.c.seq)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    entries = {}
+    for seq, expense_id, deleted in rows:
+        entries[expense_id] = deleted
+    last_seq = rows[-1].seq if rows else since
+    return entries, last_seq, has_more
+
+
+def backfill(connection):
+    """Log every existing expense once so a first sync (since=0) sees all of them."""
+    connection.execute(insert(ExpenseChange.__table__).from_select(
+        ['user_id', 'expense_id', 'deleted', 'changed_at'],
+        select(Expense.user_id, Expense.id, false(), func.coalesce(Expense.updated_at, datetime.utcnow()))
+        .order_by(Expense.id)
+    ))
+
+
+def compact(session):
+    """Drop entries superseded by a later entry for the same expense; returns the count."""
+    table = ExpenseChange.__table__
+    # Grouped by user too: SQLite may hand a deleted expense's id to someone else.
+    latest = select(func.max(table.c.seq)).group_by(table.c.user_id, table.c.expense_id)
+    result = session.execute(delete(table).where(table.c.seq.not_in(latest)))
+    return result.rowcount
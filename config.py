@@ -1,6 +1,20 @@
 import os
 from datetime import datetime, timedelta
 
+
+def _password_pool_sizes():
+    """Default ``(workers, max_queue)`` of the password pool in one gunicorn worker.
+
+    Reads the same WEB_CONCURRENCY and GUNICORN_THREADS as gunicorn.conf.py.
+    """
+    cpus = os.cpu_count() or 1
+    processes = max(1, int(os.environ.get('WEB_CONCURRENCY', cpus * 2 + 1)))
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+    admitted = max(1, threads - int(os.environ.get('PASSWORD_POOL_RESERVED_THREADS', 1)))
+    workers = int(os.environ.get('PASSWORD_POOL_WORKERS', max(1, min(cpus // processes, admitted))))
+    return workers, max(0, admitted - max(workers, 1))
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev_sevret_key' # This key is not in use .
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///data.db' #you can change the name of the .db file
@@ -8,4 +22,148 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt_secret_key' #You can change the secret key
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
 
-    
+    # Authentication: verified tokens and user rows are cached per process.
+    # In stateless mode the user is built from the token claims alone and
+    # the users table is not read on protected requests.
+    JWT_STATELESS_AUTH = os.environ.get('JWT_STATELESS_AUTH', 'false').lower() in ('1', 'true', 'yes')
+    AUTH_TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000))
+    AUTH_USER_CACHE_SIZE = int(os.environ.get('AUTH_USER_CACHE_SIZE', 10000))
+    AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 60))  # seconds
+    # Stateless mode: how often each process loads the token revocations
+    # (deleted or deactivated users) that other processes stored.
+    AUTH_REVOCATION_POLL_INTERVAL = float(os.environ.get('AUTH_REVOCATION_POLL_INTERVAL', 5))  # seconds
+
+    # Password hashing: bcrypt cost factor and the bounded pool it runs on.
+    # PASSWORD_POOL_WORKERS=0 hashes inline on the request thread. By default a
+    # worker process gets bcrypt threads for its share of the CPUs, and admits
+    # at most GUNICORN_THREADS - PASSWORD_POOL_RESERVED_THREADS password calls
+    # (running plus queued), so the other request threads stay free for reads.
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+    PASSWORD_POOL_WORKERS, PASSWORD_POOL_MAX_QUEUE = _password_pool_sizes()
+    PASSWORD_POOL_MAX_QUEUE = int(os.environ.get('PASSWORD_POOL_MAX_QUEUE', PASSWORD_POOL_MAX_QUEUE))
+    PASSWORD_POOL_TIMEOUT = float(os.environ.get('PASSWORD_POOL_TIMEOUT', 5))  # seconds
+
+    # Bulk import: rows per executemany INSERT/commit, and how many row errors to report.
+    BULK_IMPORT_BATCH_SIZE = int(os.environ.get('BULK_IMPORT_BATCH_SIZE', 1000))
+    BULK_IMPORT_MAX_ERRORS = int(os.environ.get('BULK_IMPORT_MAX_ERRORS', 1000))
+
+    # Batch update/delete: the most expenses one request may touch.
+    BATCH_MUTATION_MAX_ROWS = int(os.environ.get('BATCH_MUTATION_MAX_ROWS', 5000))
+
+    # Streaming export: rows fetched from the database cursor per round trip.
+    EXPORT_YIELD_PER = int(os.environ.get('EXPORT_YIELD_PER', 1000))
+
+    # Run pending schema migrations in create_app. The production WSGI setup
+    # preloads the app so this happens once, in the master process.
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', 'true').lower() in ('1', 'true', 'yes')
+
+    # Instrumentation (see middlewares/metrics_middleware.py).
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+    # Requests issuing more SQL statements than this are logged (and fail under TESTING).
+    MAX_QUERIES_PER_REQUEST = int(os.environ.get('MAX_QUERIES_PER_REQUEST', 20))
+    QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', 'false').lower() in ('1', 'true', 'yes')
+    # Who may read /metrics: these client addresses, or anyone sending
+    # "Authorization: Bearer <METRICS_TOKEN>". Everyone else gets a 404.
+    METRICS_ALLOWED_IPS = [
+        ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()
+    ]
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+    # Rate limiting (see middlewares/rate_limit_middleware.py). Keys are blueprint
+    # names or endpoints; endpoint entries override their blueprint's per scope.
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')  # or redis://host:6379/0
+    RATELIMIT_PROXY_COUNT = int(os.environ.get('RATELIMIT_PROXY_COUNT', 0))  # trusted X-Forwarded-For hops
+    RATE_LIMITS = {
+        'auth.login': {'ip': '20/minute', 'login': '5/minute'},
+        'auth.register': {'ip': '10/hour'},
+        'expense': {'ip': '600/minute', 'user': '300/minute'},
+        'expense.export_expenses': {'user': '10/minute'},
+        'expense.bulk_import_expenses': {'user': '10/minute'},
+        'recurring': {'user': '60/minute'},
+        'budget': {'user': '120/minute'},
+    }
+
+    # Response compression (see middlewares/compression_middleware.py).
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # bytes
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+    COMPRESS_MIMETYPES = ['application/json', 'application/x-ndjson', 'text/csv', 'text/plain']
+
+    # Recurring expenses (see recurring.py): each worker process checks for due
+    # rules every RECURRING_INTERVAL seconds, RECURRING_BATCH_SIZE rules per transaction.
+    RECURRING_SCHEDULER_ENABLED = os.environ.get('RECURRING_SCHEDULER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    RECURRING_INTERVAL = float(os.environ.get('RECURRING_INTERVAL', 60))  # seconds
+    RECURRING_BATCH_SIZE = int(os.environ.get('RECURRING_BATCH_SIZE', 200))
+
+    # Budget alerts (see budgets.py): fractions of a monthly budget that alert once
+    # crossed, and an optional URL the new alerts are POSTed to.
+    BUDGET_ALERT_THRESHOLDS = [
+        float(value) for value in os.environ.get('BUDGET_ALERT_THRESHOLDS', '0.8,1.0').split(',') if value.strip()
+    ]
+    BUDGET_WEBHOOK_URL = os.environ.get('BUDGET_WEBHOOK_URL') or None
+    BUDGET_WEBHOOK_TIMEOUT = float(os.environ.get('BUDGET_WEBHOOK_TIMEOUT', 5))  # seconds
+
+    # Exchange rates (see fx.py): a date,currency,rate CSV of units per FX_PIVOT_CURRENCY,
+    # re-read when it changes (checked at most every FX_RELOAD_INTERVAL seconds).
+    FX_RATES_FILE = os.environ.get('FX_RATES_FILE') or None
+    FX_PIVOT_CURRENCY = os.environ.get('FX_PIVOT_CURRENCY', 'EUR')
+    FX_RELOAD_INTERVAL = float(os.environ.get('FX_RELOAD_INTERVAL', 60))  # seconds
+
+    # PRAGMAs issued on every new SQLite connection (see database.py).
+    SQLITE_PRAGMAS = {}
+    # Let SQLAlchemy emit BEGIN instead of pysqlite, so SAVEPOINTs nest (see testing.py).
+    SQLITE_EXPLICIT_BEGIN = False
+
+    # Read replicas (see replicas.py): comma separated URLs in DATABASE_REPLICA_URLS
+    # become the binds replica_0, replica_1, ...
+    SQLALCHEMY_BINDS = {
+        f'replica_{index}': url
+        for index, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')))
+    }
+    READ_REPLICA_BINDS = list(SQLALCHEMY_BINDS)
+    REPLICA_HEALTH_INTERVAL = float(os.environ.get('REPLICA_HEALTH_INTERVAL', 5))  # seconds
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+
+
+def _engine_options(database_uri):
+    if database_uri.startswith('sqlite'):
+        # Tuned through SQLITE_PRAGMAS instead.
+        return {}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # seconds
+        'pool_pre_ping': True,
+    }
+
+
+class ProductionConfig(Config):
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(Config.SQLALCHEMY_DATABASE_URI)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',  # readers no longer block the writer, and vice versa
+        'synchronous': 'NORMAL',  # fsync at checkpoints instead of every commit; safe with WAL
+        'busy_timeout': 5000,  # milliseconds to wait for a lock before "database is locked"
+        'mmap_size': 268435456,  # 256 MiB memory-mapped reads
+        'cache_size': -20000,  # ~20 MB page cache per connection
+        'temp_store': 'MEMORY',
+    }
+
+
+class TestingConfig(Config):
+    """A private in-memory database per app, for tests and benchmarks (see testing.py)."""
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'  # Flask-SQLAlchemy keeps it on one shared connection
+    SQLALCHEMY_BINDS = {}
+    READ_REPLICA_BINDS = []
+    SQLITE_EXPLICIT_BEGIN = True
+    JWT_SECRET_KEY = 'test-secret-key-that-is-long-enough-for-hs256'
+    BCRYPT_ROUNDS = 4
+    PASSWORD_POOL_WORKERS = 0
+    RATELIMIT_ENABLED = False
+    RECURRING_SCHEDULER_ENABLED = False
+    BUDGET_WEBHOOK_URL = None
+    FX_RATES_FILE = None
@@ -1,11 +1,36 @@
 from flask import Blueprint, request, jsonify, current_app
 from models import db, User
-import jwt
-from datetime import datetime, timedelta
-from dotenv import load_dotenv, set_key
+from password_pool import PoolSaturated
+from middlewares.auth_middleware import token_required
+import etags
+import money
+from datetime import datetime
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+@auth_bp.errorhandler(PoolSaturated)
+def password_pool_saturated(error):
+    response = jsonify({'message': 'Server is busy, please retry shortly.'})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+def issue_token(user):
+    import jwt
+
+    now = datetime.utcnow()
+    return jwt.encode(
+        {
+            'user_id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'iat': now,
+            'exp': now + current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+        },
+        current_app.config['JWT_SECRET_KEY'],
+        algorithm="HS256"
+    )
+
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -42,21 +67,43 @@ def login():
     
     user = User.query.filter_by(username=data['username']).first()
     
-    if not user or not user.verify_password(data['password']):
+    if not user or not user.verify_password(data['password']) or not user.is_active:
         return jsonify({'message': 'Invalid credentials!'}), 401
     
 
-    token = jwt.encode(
-        {
-            'user_id': user.id,
-            'exp': datetime.utcnow() + current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
-        },
-        current_app.config['JWT_SECRET_KEY'],
-        algorithm="HS256"
-    )
-
     return jsonify({
         'message': 'Login successful!',
-        'token': token,
+        'token': issue_token(user),
         'user': user.to_dict()
-    }), 200
\ No newline at end of file
+    }), 200
+
+
+@auth_bp.route('/me', methods=['GET'])
+@token_required
+def get_me(current_user):
+    user = db.session.get(User, current_user.id)
+    if user is None:
+        # Deleted after the token was issued (stateless mode never looked).
+        return jsonify({'message': 'user not found'}), 401
+    return jsonify({'user': user.to_dict()}), 200
+
+
+@auth_bp.route('/me', methods=['PATCH'])
+@token_required
+def update_me(current_user):
+    data = request.get_json(silent=True) or {}
+    user = db.session.get(User, current_user.id)
+    if user is None:
+        return jsonify({'message': 'user not found'}), 401
+
+    if 'base_currency' in data:
+        currency, message = money.parse_currency(data['base_currency'])
+        if message:
+            return jsonify({'message': message}), 400
+        if currency != user.base_currency:
+            user.base_currency = currency
+            # Cached summaries were reported in the old currency.
+            etags.bump(db.session, user.id)
+
+    db.session.commit()
+    return jsonify({'message': 'Profile updated successfully!', 'user': user.to_dict()}), 200
@@ -0,0 +1,121 @@
+from flask import Blueprint, request, jsonify
+from models import db, Budget, BudgetAlert, CategoryEnum
+from middlewares.auth_middleware import token_required
+from controllers.expense_controller import invalid_category_message, parse_amount, user_base_currency
+import budgets
+import money
+import rollups
+from datetime import datetime
+from sqlalchemy import select
+
+budget_bp = Blueprint('budget', __name__, url_prefix='/api/budgets')
+
+ALERTS_PAGE_SIZE = 50
+
+
+def parse_category(value):
+    try:
+        return CategoryEnum[value.upper()], None
+    except KeyError:
+        return None, invalid_category_message()
+
+
+@budget_bp.route('/', methods=['GET'])
+@token_required
+def get_budgets(current_user):
+    rows = db.session.execute(
+        select(Budget).filter_by(user_id=current_user.id).order_by(Budget.category)
+    ).scalars().all()
+    return jsonify({'budgets': [budget.to_dict() for budget in rows]}), 200
+
+
+@budget_bp.route('/<category>', methods=['PUT'])
+@token_required
+def set_budget(current_user, category):
+    category, message = parse_category(category)
+    if message:
+        return jsonify({'message': message}), 400
+
+    data = request.get_json(silent=True) or {}
+    if 'amount' not in data:
+        return jsonify({'message': 'Invalid amount!'}), 400
+
+    budget = db.session.get(Budget, (current_user.id, category))
+    # Defaults to the budget's current currency, then the user's base currency.
+    currency = data.get('currency') or (budget.currency if budget else user_base_currency(db.session, current_user.id))
+    currency, message = money.parse_currency(currency)
+    if message:
+        return jsonify({'message': message}), 400
+    amount_minor, message = parse_amount(data['amount'], currency)
+    if message:
+        return jsonify({'message': message}), 400
+    if amount_minor <= 0:
+        return jsonify({'message': 'The budget must be greater than zero!'}), 400
+
+    if budget is None:
+        budget = Budget(user_id=current_user.id, category=category, amount_minor=amount_minor, currency=currency)
+        db.session.add(budget)
+    else:
+        budget.amount_minor, budget.currency = amount_minor, currency
+    db.session.flush()
+    # A budget set below what was already spent this month alerts right away.
+    alerts = budgets.check(db.session, current_user.id, [rollups.bucket_of(category, datetime.utcnow())])
+    db.session.commit()
+
+    return jsonify({
+        'message': 'Budget saved successfully!',
+        'budget': budget.to_dict(),
+        'alerts': alerts
+    }), 200
+
+
+@budget_bp.route('/<category>', methods=['DELETE'])
+@token_required
+def delete_budget(current_user, category):
+    category, message = parse_category(category)
+    if message:
+        return jsonify({'message': message}), 400
+
+    budget = db.session.get(Budget, (current_user.id, category))
+    if budget is None:
+        return jsonify({'message': 'Budget not found!'}), 404
+
+    db.session.delete(budget)
+    db.session.commit()
+    return jsonify({'message': 'Budget deleted successfully!'}), 200
+
+
+@budget_bp.route('/status', methods=['GET'])
+@token_required
+def get_status(current_user):
+    month = request.args.get('month') or rollups.month_key(datetime.utcnow())
+    try:
+        datetime.strptime(month, '%Y-%m')
+    except ValueError:
+        return jsonify({'message': 'Invalid month! Use YYYY-MM'}), 400
+
+    return jsonify({'month': month, 'budgets': budgets.status(db.session, current_user.id, month)}), 200
+
+
+@budget_bp.route('/alerts', methods=['GET'])
+@token_required
+def get_alerts(current_user):
+    query = select(BudgetAlert).filter_by(user_id=current_user.id)
+    if request.args.get('unread', 'false').lower() in ('1', 'true', 'yes'):
+        query = query.filter(BudgetAlert.read_at.is_(None))
+    alerts = db.session.execute(query.order_by(BudgetAlert.id.desc()).limit(ALERTS_PAGE_SIZE)).scalars().all()
+    return jsonify({'alerts': [alert.to_dict() for alert in alerts]}), 200
+
+
+@budget_bp.route('/alerts/<int:alert_id>/read', methods=['POST'])
+@token_required
+def mark_alert_read(current_user, alert_id):
+    alert = db.session.execute(
+        select(BudgetAlert).filter_by(id=alert_id, user_id=current_user.id)
+    ).scalar_one_or_none()
+    if alert is None:
+        return jsonify({'message': 'Alert not found!'}), 404
+
+    alert.read_at = alert.read_at or datetime.utcnow()
+    db.session.commit()
+    return jsonify({'message': 'Alert marked as read.', 'alert': alert.to_dict()}), 200
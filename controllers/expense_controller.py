@@ -1,19 +1,45 @@
-from flask import Blueprint, request, jsonify
-from models import db, Expense, CategoryEnum
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from models import db, Expense, CategoryEnum, User
 from middlewares.auth_middleware import token_required
+from aggregations import GROUP_KEYS, group_columns, metric_columns, combine, fold_currencies
+import fx
+import money
+import rollups
+import budgets
+import changes
+import search
+import etags
+from etags import conditional
+from replicas import read_replica
+from middlewares.metrics_middleware import query_budget
+from middlewares.compression_middleware import response_encoding, stream_compressor
+from serializers import (COMPACT_FIELDS, DEFAULT_FIELDS, parse_fields, parse_layout, expense_columns,
+                         row_serializer, row_values, dumps, json_response)
 from datetime import datetime, timedelta
-from sqlalchemy import and_
+from sqlalchemy import and_, or_, case, func, delete, insert, select, update
+import base64
+from collections import namedtuple
+import csv
+import io
+import json
 
 expense_bp = Blueprint('expense', __name__, url_prefix='/api/expenses')
 
-@expense_bp.route('/', methods=['GET'])
-@token_required
-def get_expenses(current_user):
-    filter_type = request.args.get('filter', 'all')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+ROLLUP_KEYS = {'category', 'month'}
+BULK_CONTENT_TYPES = {'text/csv', 'application/x-ndjson', 'application/jsonl'}
+
+
+def apply_date_filter(query, args):
+    """Apply the ``filter`` query parameter to an expense query.
+
+    Returns ``(query, error_response)``; ``error_response`` is ``None`` unless
+    the custom date range could not be parsed.
+    """
+    filter_type = args.get('filter', 'all')
     today = datetime.utcnow()
-    
-    query = Expense.query.filter_by(user_id=current_user.id)
-    
+
     if filter_type == 'week':
         past_week = today - timedelta(days=7)
         query = query.filter(Expense.date >= past_week)
@@ -24,126 +50,932 @@ def get_expenses(current_user):
         past_three_months = today - timedelta(days=90)
         query = query.filter(Expense.date >= past_three_months)
     elif filter_type == 'custom':
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        
+        start_date = args.get('start_date')
+        end_date = args.get('end_date')
+
         if start_date and end_date:
             try:
                 start_date = datetime.fromisoformat(start_date)
                 end_date = datetime.fromisoformat(end_date)
                 query = query.filter(and_(Expense.date >= start_date, Expense.date <= end_date))
             except ValueError:
-                return jsonify({'message': 'Invalid date format! Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
-    
-    expenses = query.order_by(Expense.date.desc()).all()
-    
-    return jsonify({
-        'expenses': [expense.to_dict() for expense in expenses],
-        'count': len(expenses)
-    }), 200
+                return query, (jsonify({'message': 'Invalid date format! Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400)
 
-@expense_bp.route('/<int:expense_id>', methods=['GET'])
+    return query, None
+
+
+def encode_cursor(expense_date, expense_id):
+    payload = json.dumps({'d': expense_date.isoformat(), 'i': expense_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def encode_rank_cursor(rank, expense_id):
+    payload = json.dumps({'r': rank, 'i': expense_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the ``(date, id)`` or ``(rank, id)`` position encoded in ``cursor``; raises ``ValueError``."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if 'r' in payload:
+            return float(payload['r']), int(payload['i'])
+        return datetime.fromisoformat(payload['d']), int(payload['i'])
+    except (TypeError, KeyError, ValueError) as exc:
+        raise ValueError('invalid cursor') from exc
+
+
+def parse_page_args(args):
+    """Return ``(limit, position, error_response)`` for the pagination parameters."""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return None, None, (jsonify({'message': 'Invalid limit!'}), 400)
+    if limit < 1:
+        return None, None, (jsonify({'message': 'Invalid limit!'}), 400)
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    position = None
+    if args.get('cursor'):
+        try:
+            position = decode_cursor(args['cursor'])
+        except ValueError:
+            return None, None, (jsonify({'message': 'Invalid cursor!'}), 400)
+
+    return limit, position, None
+
+
+def after_position(query, position):
+    # Keyset condition for ORDER BY date DESC, id DESC: strictly "older" rows.
+    position_date, position_id = position
+    return query.filter(or_(
+        Expense.date < position_date,
+        and_(Expense.date == position_date, Expense.id < position_id)
+    ))
+
+
+# How a list is ordered and paged: the trailing columns selected for the
+# cursor (id, then the sort key), the ORDER BY, the keyset condition, the
+# cursor encoder and the type of sort key its cursors decode to.
+Keyset = namedtuple('Keyset', ['columns', 'order_by', 'after', 'encode', 'key_type'])
+
+DATE_KEYSET = Keyset(
+    [Expense.id, Expense.date], (Expense.date.desc(), Expense.id.desc()), after_position, encode_cursor, datetime
+)
+
+
+def apply_search(query, args):
+    """Apply the ``q`` parameter; returns ``(query, keyset, error_response)``.
+
+    Without ``q`` the list is ordered by date; with it, by relevance.
+    """
+    q = args.get('q', '').strip()
+    if not q:
+        return query, DATE_KEYSET, None
+    if not search.terms(q):
+        return query, None, (jsonify({'message': 'Invalid search query!'}), 400)
+
+    query, rank = search.apply(query, q)
+    keyset = Keyset(
+        [Expense.id, rank], (rank.desc(), Expense.id.desc()),
+        lambda query, position: search.after_position(query, rank, position), encode_rank_cursor, float
+    )
+    return query, keyset, None
+
+
+def page_payload(rows, fields, layout, limit, has_more, keyset=DATE_KEYSET):
+    """Build a list response from rows selected with ``expense_columns(fields) + keyset.columns``."""
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = keyset.encode(last[-1], last[-2])
+
+    if layout == 'columnar':
+        values = row_values(fields, encode_datetimes=None)
+        response = {'columns': fields, 'rows': [values(row) for row in rows]}
+    else:
+        serialize = row_serializer(fields)
+        response = {'expenses': [serialize(row) for row in rows]}
+    response.update({
+        'limit': limit,
+        'has_more': has_more,
+        'next_cursor': next_cursor
+    })
+    return response
+
+
+# The read paths below take the session and the query arguments explicitly,
+# like the write paths further down, so the ASGI app (asgi_app.py) serves
+# the same code through ``AsyncSession.run_sync``. Each returns a response.
+
+def list_expenses(session, user_id, args):
+    layout, message = parse_layout(args.get('layout'))
+    if message:
+        return jsonify({'message': message}), 400
+
+    fields, message = parse_fields(
+        args.get('fields'), default=COMPACT_FIELDS if layout == 'columnar' else DEFAULT_FIELDS
+    )
+    if message:
+        return jsonify({'message': message}), 400
+
+    query = select(*expense_columns(fields)).filter(Expense.user_id == user_id)
+    query, keyset, error = apply_search(query, args)
+    if error:
+        return error
+    # The keyset columns are always read: the cursor is built from them.
+    query = query.add_columns(*keyset.columns)
+
+    query, error = apply_date_filter(query, args)
+    if error:
+        return error
+
+    limit, position, error = parse_page_args(args)
+    if error:
+        return error
+    if position and not isinstance(position[0], keyset.key_type):
+        return jsonify({'message': 'Invalid cursor!'}), 400
+
+    include_count = args.get('include_count', 'true').lower() not in ('0', 'false', 'no')
+    if include_count:
+        total = session.execute(
+            select(func.count()).select_from(query.with_only_columns(Expense.id).subquery())
+        ).scalar()
+
+    if position:
+        query = keyset.after(query, position)
+
+    # Fetch one extra row to learn whether another page exists.
+    rows = session.execute(query.order_by(*keyset.order_by).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    response = page_payload(rows, fields, layout, limit, has_more, keyset)
+    if include_count:
+        response['count'] = total
+
+    return json_response(response, 200)
+
+
+@expense_bp.route('/', methods=['GET'])
 @token_required
-def get_expense(current_user, expense_id):
-    expense = Expense.query.filter_by(id=expense_id, user_id=current_user.id).first()
-    
-    if not expense:
+@read_replica
+@conditional
+def get_expenses(current_user):
+    return list_expenses(db.session, current_user.id, request.args)
+
+
+def summary_group(row, group_by, currency):
+    digits = money.exponent(currency)
+    group = {key: row[key] for key in group_by}
+    if 'category' in group:
+        group['category'] = group['category'].name
+    group.update({
+        'total': round(row['total'], digits),
+        'count': row['count'],
+        'min': round(row['min'], digits),
+        'max': round(row['max'], digits),
+        'avg': round(row['total'] / row['count'], digits),
+    })
+    return group
+
+
+def summary_payload(rows, group_by, layout, currency, unconverted=()):
+    """Build the summary response from ``fold_currencies`` output, in ``currency``.
+
+    Spend without an exchange rate to ``currency`` is not in the groups or
+    totals; it is listed per currency under ``unconverted``.
+    """
+    groups = [summary_group(row, group_by, currency) for row in rows]
+    response = {'group_by': group_by, 'currency': currency, 'totals': combine(groups, currency)}
+    if layout == 'columnar':
+        response['columns'] = group_by + ['total', 'count', 'min', 'max', 'avg']
+        response['rows'] = [list(group.values()) for group in groups]
+    else:
+        response['groups'] = groups
+    if unconverted:
+        response['unconverted'] = [
+            {**summary_group(row, group_by, row['currency']), 'currency': row['currency']} for row in unconverted
+        ]
+    return response
+
+
+def parse_group_by(value):
+    """Parse a ``?group_by=`` value; returns ``(group_by, error_message)``."""
+    group_by = [key.strip() for key in (value or 'category').split(',') if key.strip()]
+    if not group_by or any(key not in GROUP_KEYS for key in group_by) or len(set(group_by)) != len(group_by):
+        return None, f'Invalid group_by! Use a comma separated list of: {list(GROUP_KEYS)}'
+    return group_by, None
+
+
+def base_currency_query(user_id):
+    return select(User.base_currency).where(User.id == user_id)
+
+
+def summary_query(user_id, group_by, args, currency):
+    """Return ``(query, error_response)`` for a summary the rollup table cannot answer."""
+    columns = group_columns(group_by, currency)
+    query = select(*columns, *metric_columns()).filter(Expense.user_id == user_id)
+    query, error = apply_date_filter(query, args)
+    return query.group_by(*columns).order_by(*columns), error
+
+
+def uses_rollups(group_by, args):
+    # Whole-history category/month breakdowns come straight from the
+    # rollup table: O(buckets) instead of O(rows).
+    return args.get('filter', 'all') == 'all' and set(group_by) <= ROLLUP_KEYS
+
+
+def rollups_answer(rows, currency):
+    # Rollups are monthly, too coarse for daily exchange rates: they can only
+    # answer when nothing needs converting.
+    return all(row.currency == currency for row in rows)
+
+
+def fold_summary(rows, group_by, currency):
+    """Convert summary rows to ``currency``; returns ``(groups, unconverted)``."""
+    return fold_currencies(rows, group_by, currency, fx.get_rates())
+
+
+def summarize_expenses(session, user_id, args):
+    layout, message = parse_layout(args.get('layout'))
+    if message:
+        return jsonify({'message': message}), 400
+
+    group_by, message = parse_group_by(args.get('group_by'))
+    if message:
+        return jsonify({'message': message}), 400
+
+    # Reported in ``?currency=``, by default the user's base currency.
+    currency = args.get('currency') or session.execute(base_currency_query(user_id)).scalar()
+    currency, message = money.parse_currency(currency)
+    if message:
+        return jsonify({'message': message}), 400
+
+    rows = None
+    if uses_rollups(group_by, args):
+        rows = rollups.summarize(session, user_id, group_by)
+        if not rollups_answer(rows, currency):
+            rows = None
+    if rows is None:
+        query, error = summary_query(user_id, group_by, args, currency)
+        if error:
+            return error
+        rows = session.execute(query).all()
+
+    groups, unconverted = fold_summary(rows, group_by, currency)
+    return jsonify(summary_payload(groups, group_by, layout, currency, unconverted)), 200
+
+
+@expense_bp.route('/summary', methods=['GET'])
+@token_required
+@read_replica
+@conditional
+def get_summary(current_user):
+    return summarize_expenses(db.session, current_user.id, request.args)
+
+
+EXPORT_FIELDS = ['id', 'title', 'amount', 'currency', 'category', 'date', 'description', 'created_at', 'updated_at']
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def export_encoder(fields, export_format, layout='rows'):
+    """Return ``(header, encode)``: the first line (or ``None``) and a row-to-line function."""
+    if export_format == 'csv':
+        values = row_values(fields)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def encode_csv(line):
+            writer.writerow(line)
+            data = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return data
+        return encode_csv(fields), lambda row: encode_csv(values(row))
+    if layout == 'columnar':
+        # A header line naming the columns, then one JSON array per row.
+        values = row_values(fields, encode_datetimes=None)
+        return dumps(fields) + b'\n', lambda row: dumps(values(row)) + b'\n'
+    serialize = row_serializer(fields)
+    return None, lambda row: dumps(serialize(row)) + b'\n'
+
+
+def iter_export_lines(rows, fields, export_format, layout='rows'):
+    header, encode = export_encoder(fields, export_format, layout)
+    if header is not None:
+        yield header
+    for row in rows:
+        yield encode(row)
+
+
+class ChunkWriter:
+    """Collects lines into ~EXPORT_CHUNK_SIZE byte chunks, fed through ``compressor`` if given."""
+
+    def __init__(self, compressor=None):
+        self.compressor = compressor
+        self._pending = []
+        self._size = 0
+
+    def write(self, line):
+        """Add ``line``; returns a chunk to send, or ``b''`` while still buffering."""
+        data = line if isinstance(line, bytes) else line.encode('utf-8')
+        self._pending.append(data)
+        self._size += len(data)
+        if self._size < EXPORT_CHUNK_SIZE:
+            return b''
+        chunk = b''.join(self._pending)
+        self._pending, self._size = [], 0
+        return self.compressor.compress(chunk) if self.compressor else chunk
+
+    def close(self):
+        chunk = b''.join(self._pending)
+        self._pending, self._size = [], 0
+        if self.compressor:
+            chunk = self.compressor.compress(chunk) + self.compressor.flush()
+        return chunk
+
+
+def iter_chunks(lines, compressor=None):
+    writer = ChunkWriter(compressor)
+    for line in lines:
+        chunk = writer.write(line)
+        if chunk:
+            yield chunk
+    chunk = writer.close()
+    if chunk:
+        yield chunk
+
+
+# What an export request asks for: the query to stream, its fields, format and layout.
+Export = namedtuple('Export', ['query', 'fields', 'format', 'layout'])
+
+
+def parse_export(user_id, args):
+    """Return ``(export, error_response)`` for an export request's arguments."""
+    export_format = args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return None, (jsonify({'message': f'Invalid format! Use one of: {list(EXPORT_FORMATS)}'}), 400)
+
+    layout, message = parse_layout(args.get('layout'))
+    if message:
+        return None, (jsonify({'message': message}), 400)
+
+    fields, message = parse_fields(args.get('fields'), default=EXPORT_FIELDS)
+    if message:
+        return None, (jsonify({'message': message}), 400)
+
+    query = select(*expense_columns(fields)).filter(Expense.user_id == user_id)
+    query, error = apply_date_filter(query, args)
+    if error:
+        return None, error
+
+    # yield_per streams rows from the cursor in batches instead of loading them all.
+    query = query.order_by(Expense.date.desc(), Expense.id.desc()).execution_options(
+        yield_per=current_app.config['EXPORT_YIELD_PER']
+    )
+    return Export(query, fields, export_format, layout), None
+
+
+def export_headers(export, encoding):
+    headers = {'Content-Disposition': f'attachment; filename=expenses.{export.format}', 'Vary': 'Accept-Encoding'}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return headers
+
+
+@expense_bp.route('/export', methods=['GET'])
+@token_required
+@read_replica
+def export_expenses(current_user):
+    export, error = parse_export(current_user.id, request.args)
+    if error:
+        return error
+    rows = db.session.execute(export.query)
+
+    encoding = response_encoding()
+    compressor = stream_compressor(encoding, current_app.config) if encoding else None
+    lines = iter_export_lines(rows, export.fields, export.format, export.layout)
+    return Response(stream_with_context(iter_chunks(lines, compressor)), mimetype=EXPORT_FORMATS[export.format],
+                    headers=export_headers(export, encoding))
+
+def list_changes(session, user_id, args):
+    try:
+        since = changes.decode_watermark(args.get('since'))
+    except ValueError:
+        return jsonify({'message': 'Invalid since token!'}), 400
+
+    fields, message = parse_fields(args.get('fields'))
+    if message:
+        return jsonify({'message': message}), 400
+
+    limit, _, error = parse_page_args(args)
+    if error:
+        return error
+
+    entries, last_seq, has_more = changes.changes_since(session, user_id, since, limit)
+
+    changed_ids = [expense_id for expense_id, deleted in entries.items() if not deleted]
+    rows = []
+    if changed_ids:
+        columns = expense_columns(fields) + [Expense.id]
+        rows = session.execute(
+            select(*columns).filter(Expense.user_id == user_id, Expense.id.in_(changed_ids))
+        ).all()
+
+    # An expense logged as changed but gone now was deleted after this page.
+    found = {row[-1] for row in rows}
+    deleted_ids = [expense_id for expense_id, deleted in entries.items() if deleted or expense_id not in found]
+
+    serialize = row_serializer(fields)
+    return json_response({
+        'changed': [serialize(row) for row in rows],
+        'deleted': deleted_ids,
+        'next_since': changes.encode_watermark(last_seq),
+        'has_more': has_more
+    }, 200)
+
+
+@expense_bp.route('/changes', methods=['GET'])
+@token_required
+@read_replica
+def get_changes(current_user):
+    return list_changes(db.session, current_user.id, request.args)
+
+
+def read_expense(session, user_id, expense_id, args):
+    fields, message = parse_fields(args.get('fields'))
+    if message:
+        return jsonify({'message': message}), 400
+
+    row = session.execute(
+        select(*expense_columns(fields)).filter(Expense.id == expense_id, Expense.user_id == user_id)
+    ).first()
+
+    if not row:
         return jsonify({'message': 'Expense not found!'}), 404
-    
-    return jsonify(expense.to_dict()), 200
 
-@expense_bp.route('/', methods=['POST'])
+    return json_response(row_serializer(fields)(row), 200)
+
+
+@expense_bp.route('/<int:expense_id>', methods=['GET'])
 @token_required
-def create_expense(current_user):
-    data = request.get_json()
-    
-    # Validate input
+@read_replica
+@conditional
+def get_expense(current_user, expense_id):
+    return read_expense(db.session, current_user.id, expense_id, request.args)
+
+INVALID_DATE_MESSAGE = 'Invalid date format! Use ISO format (YYYY-MM-DDTHH:MM:SS)'
+
+
+def invalid_category_message():
+    valid_categories = [cat.name for cat in CategoryEnum]
+    return f'Invalid category! Valid categories are: {valid_categories}'
+
+
+def parse_amount(value, currency):
+    """Parse a major-unit amount into minor units; returns ``(amount_minor, message)``."""
+    try:
+        return money.to_minor(value, currency), None
+    except ValueError as exc:
+        return None, f'Invalid amount: {exc}!'
+
+
+def user_base_currency(session, user_id):
+    return session.execute(base_currency_query(user_id)).scalar()
+
+
+def validate_expense(data, default_currency):
+    """Validate a new expense payload.
+
+    ``currency`` is optional and defaults to ``default_currency``. Returns
+    ``(values, message)``: the column values for ``Expense`` and ``None``,
+    or ``None`` and the error message to report.
+    """
     if not data or not data.get('title') or not data.get('amount') or not data.get('category'):
-        return jsonify({'message': 'Missing required fields!'}), 400
-    
+        return None, 'Missing required fields!'
 
     try:
-        category = CategoryEnum[data['category'].upper()]
+        category = CategoryEnum[str(data['category']).upper()]
     except KeyError:
-        valid_categories = [cat.name for cat in CategoryEnum]
-        return jsonify({
-            'message': f'Invalid category! Valid categories are: {valid_categories}'
-        }), 400
-    
+        return None, invalid_category_message()
 
     try:
-        expense_date = datetime.fromisoformat(data.get('date')) if data.get('date') else datetime.utcnow()
-    except ValueError:
-        return jsonify({'message': 'Invalid date format! Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
-    
-    new_expense = Expense(
-        title=data['title'],
-        amount=float(data['amount']),
-        category=category,
-        date=expense_date,
-        description=data.get('description', ''),
-        user_id=current_user.id
-    )
-    
-    db.session.add(new_expense)
-    db.session.commit()
-    
-    return jsonify({
+        expense_date = datetime.fromisoformat(data['date']) if data.get('date') else datetime.utcnow()
+    except (TypeError, ValueError):
+        return None, INVALID_DATE_MESSAGE
+
+    currency, message = money.parse_currency(data.get('currency') or default_currency)
+    if message:
+        return None, message
+    amount_minor, message = parse_amount(data['amount'], currency)
+    if message:
+        return None, message
+
+    return {
+        'title': data['title'],
+        'amount_minor': amount_minor,
+        'currency': currency,
+        'category': category,
+        'date': expense_date,
+        'description': data.get('description', ''),
+    }, None
+
+# The write paths take the session explicitly so the ASGI app (asgi_app.py)
+# can run them through ``AsyncSession.run_sync``. Each returns
+# ``(payload, status)`` and commits on success.
+
+def save_new_expense(session, user_id, data):
+    default_currency = None
+    if isinstance(data, dict) and not data.get('currency'):
+        default_currency = user_base_currency(session, user_id)
+    values, message = validate_expense(data, default_currency)
+    if message:
+        return {'message': message}, 400
+
+    new_expense = Expense(user_id=user_id, **values)
+
+    session.add(new_expense)
+    session.flush()
+    rollups.add(session, user_id, new_expense.category, new_expense.date, new_expense.currency, new_expense.amount_minor)
+    budgets.check(session, user_id, [rollups.bucket_of(new_expense.category, new_expense.date)])
+    etags.bump(session, user_id)
+    changes.record(session, user_id, [new_expense.id])
+    session.commit()
+
+    return {
         'message': 'Expense created successfully!',
         'expense': new_expense.to_dict()
-    }), 201
+    }, 201
+
+
+def apply_expense_update(session, user_id, expense_id, data):
+    expense = session.execute(select(Expense).filter_by(id=expense_id, user_id=user_id)).scalar_one_or_none()
 
-@expense_bp.route('/<int:expense_id>', methods=['PUT'])
-@token_required
-def update_expense(current_user, expense_id):
-    expense = Expense.query.filter_by(id=expense_id, user_id=current_user.id).first()
-    
     if not expense:
-        return jsonify({'message': 'Expense not found!'}), 404
-    
-    data = request.get_json()
-    
+        return {'message': 'Expense not found!'}, 404
+
+    old_bucket = rollups.bucket_of(expense.category, expense.date)
 
     if data.get('title'):
         expense.title = data['title']
-    
-    if data.get('amount'):
-        expense.amount = float(data['amount'])
-    
+
+    if data.get('amount') or data.get('currency'):
+        # A new currency alone relabels the amount: 12.50 USD becomes 12.50 EUR.
+        currency, message = money.parse_currency(data.get('currency') or expense.currency)
+        if message:
+            session.rollback()
+            return {'message': message}, 400
+        amount = data['amount'] if data.get('amount') else money.to_major(expense.amount_minor, expense.currency)
+        amount_minor, message = parse_amount(amount, currency)
+        if message:
+            session.rollback()
+            return {'message': message}, 400
+        expense.amount_minor, expense.currency = amount_minor, currency
+
     if data.get('category'):
         try:
             expense.category = CategoryEnum[data['category'].upper()]
         except KeyError:
-            valid_categories = [cat.name for cat in CategoryEnum]
-            return jsonify({
-                'message': f'Invalid category! Valid categories are: {valid_categories}'
-            }), 400
-    
+            session.rollback()
+            return {'message': invalid_category_message()}, 400
+
     if data.get('date'):
         try:
             expense.date = datetime.fromisoformat(data['date'])
         except ValueError:
-            return jsonify({'message': 'Invalid date format! Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
-    
+            session.rollback()
+            return {'message': INVALID_DATE_MESSAGE}, 400
+
     if 'description' in data:
         expense.description = data['description']
-    
-    db.session.commit()
-    
-    return jsonify({
+
+    session.flush()
+    # Covers moves between categories and months: both buckets are recomputed.
+    new_bucket = rollups.bucket_of(expense.category, expense.date)
+    rollups.refresh(session, user_id, [old_bucket, new_bucket])
+    budgets.check(session, user_id, [new_bucket])
+    etags.bump(session, user_id)
+    changes.record(session, user_id, [expense.id])
+    session.commit()
+
+    return {
         'message': 'Expense updated successfully!',
         'expense': expense.to_dict()
-    }), 200
+    }, 200
+
+
+def remove_expense(session, user_id, expense_id):
+    expense = session.execute(select(Expense).filter_by(id=expense_id, user_id=user_id)).scalar_one_or_none()
+
+    if not expense:
+        return {'message': 'Expense not found!'}, 404
+
+    bucket = rollups.bucket_of(expense.category, expense.date)
+    session.delete(expense)
+    session.flush()
+    rollups.refresh(session, user_id, [bucket])
+    etags.bump(session, user_id)
+    changes.record(session, user_id, [expense_id], deleted=True)
+    session.commit()
+
+    return {'message': 'Expense deleted successfully!'}, 200
+
+
+BATCH_SET_FIELDS = {'title', 'amount', 'currency', 'category', 'date', 'description'}
+
+
+def parse_batch_changes(data):
+    """Validate the ``set`` object of a batch update; returns ``(values, message)``."""
+    requested = data.get('set') if isinstance(data, dict) else None
+    if not isinstance(requested, dict) or not requested:
+        return None, 'Provide the fields to change in "set"!'
+    unknown = sorted(set(requested) - BATCH_SET_FIELDS)
+    if unknown:
+        return None, f'Cannot set {unknown}! Settable fields are: {sorted(BATCH_SET_FIELDS)}'
+
+    values = {}
+    if 'title' in requested:
+        if not requested['title']:
+            return None, 'Missing required fields!'
+        values['title'] = requested['title']
+    if 'currency' in requested:
+        if 'amount' not in requested:
+            return None, 'Set "amount" together with "currency"!'
+        values['currency'], message = money.parse_currency(requested['currency'])
+        if message:
+            return None, message
+    if 'amount' in requested:
+        # Kept in major units: without a new currency, each row's own
+        # currency decides the minor units (see apply_batch_update).
+        try:
+            values['amount'] = money.parse_decimal(requested['amount'])
+        except ValueError as exc:
+            return None, f'Invalid amount: {exc}!'
+    if 'category' in requested:
+        try:
+            values['category'] = CategoryEnum[str(requested['category']).upper()]
+        except KeyError:
+            return None, invalid_category_message()
+    if 'date' in requested:
+        try:
+            values['date'] = datetime.fromisoformat(requested['date'])
+        except (TypeError, ValueError):
+            return None, INVALID_DATE_MESSAGE
+    if 'description' in requested:
+        values['description'] = requested['description']
+    return values, None
+
+
+def batch_target(user_id, data, max_rows):
+    """Return ``(conditions, requested_ids, message)`` for a batch request body.
+
+    The body names its expenses with ``ids`` (a list) or ``filter`` (an
+    object with ``category``, ``start_date`` and/or ``end_date``); the
+    conditions are always scoped to ``user_id``.
+    """
+    if not isinstance(data, dict) or ('ids' in data) == ('filter' in data):
+        return None, None, 'Provide either "ids" or "filter"!'
+
+    conditions = [Expense.user_id == user_id]
+    if 'ids' in data:
+        ids = data['ids']
+        if not isinstance(ids, list) or not ids or not all(isinstance(value, int) for value in ids):
+            return None, None, '"ids" must be a non-empty list of expense ids!'
+        if len(ids) > max_rows:
+            return None, None, f'At most {max_rows} ids per request!'
+        ids = list(dict.fromkeys(ids))
+        conditions.append(Expense.id.in_(ids))
+        return conditions, ids, None
+
+    criteria = data['filter']
+    if not isinstance(criteria, dict) or not criteria:
+        return None, None, '"filter" must name a category and/or a date range!'
+    unknown = sorted(set(criteria) - {'category', 'start_date', 'end_date'})
+    if unknown:
+        return None, None, f'Unknown filter keys {unknown}! Use category, start_date and end_date.'
+    if 'category' in criteria:
+        try:
+            conditions.append(Expense.category == CategoryEnum[str(criteria['category']).upper()])
+        except KeyError:
+            return None, None, invalid_category_message()
+    try:
+        if criteria.get('start_date'):
+            conditions.append(Expense.date >= datetime.fromisoformat(criteria['start_date']))
+        if criteria.get('end_date'):
+            conditions.append(Expense.date <= datetime.fromisoformat(criteria['end_date']))
+    except (TypeError, ValueError):
+        return None, None, INVALID_DATE_MESSAGE
+    return conditions, None, None
+
+
+def batch_results(requested_ids, done_ids, status):
+    """Per-id outcomes: ``status`` for the ids written, ``not_found`` for the rest."""
+    done = set(done_ids)
+    ids = requested_ids if requested_ids is not None else sorted(done)
+    return [{'id': expense_id, 'status': status if expense_id in done else 'not_found'} for expense_id in ids]
+
+
+def apply_batch_update(session, user_id, data, max_rows):
+    """One UPDATE for every targeted expense, then one rollup/ETag/change-log pass and one commit."""
+    values, message = parse_batch_changes(data)
+    if message:
+        return {'message': message}, 400
+    conditions, requested_ids, message = batch_target(user_id, data, max_rows)
+    if message:
+        return {'message': message}, 400
+
+    # The old buckets of the targeted rows; the UPDATE returns the new ones.
+    old_rows = session.execute(
+        select(Expense.id, Expense.category, Expense.date, Expense.currency).where(*conditions).limit(max_rows + 1)
+    ).all()
+    if len(old_rows) > max_rows:
+        session.rollback()
+        return {'message': f'The filter matches more than {max_rows} expenses; narrow it down!'}, 400
+
+    updated = []
+    table = Expense.__table__
+    if old_rows and 'amount' in values:
+        amount = values.pop('amount')
+        currencies = {values['currency']} if 'currency' in values else {row.currency for row in old_rows}
+        amount_minor = {}
+        for currency in currencies:
+            amount_minor[currency], message = parse_amount(amount, currency)
+            if message:
+                session.rollback()
+                return {'message': message}, 400
+        if 'currency' in values:
+            values['amount_minor'] = amount_minor[values['currency']]
+        else:
+            values['amount_minor'] = case(amount_minor, value=table.c.currency)
+    if old_rows:
+        values['updated_at'] = datetime.utcnow()
+        updated = session.execute(
+            update(table)
+            .where(table.c.user_id == user_id, table.c.id.in_([row.id for row in old_rows]))
+            .values(**values)
+            .returning(table.c.id, table.c.category, table.c.date)
+        ).all()
+    if updated:
+        new_buckets = {rollups.bucket_of(row.category, row.date) for row in updated}
+        rollups.refresh(session, user_id, new_buckets | {rollups.bucket_of(row.category, row.date) for row in old_rows})
+        budgets.check(session, user_id, new_buckets)
+        etags.bump(session, user_id)
+        changes.record(session, user_id, [row.id for row in updated])
+    session.commit()
+
+    return {
+        'message': f'Updated {len(updated)} expense(s).',
+        'updated': len(updated),
+        'results': batch_results(requested_ids, [row.id for row in updated], 'updated')
+    }, 200
+
+
+def remove_batch(session, user_id, data, max_rows):
+    """One DELETE for every targeted expense, then one rollup/ETag/change-log pass and one commit."""
+    conditions, requested_ids, message = batch_target(user_id, data, max_rows)
+    if message:
+        return {'message': message}, 400
+
+    count = session.execute(select(func.count()).select_from(Expense).where(*conditions)).scalar()
+    if count > max_rows:
+        session.rollback()
+        return {'message': f'The filter matches more than {max_rows} expenses; narrow it down!'}, 400
+
+    table = Expense.__table__
+    deleted = session.execute(
+        delete(table).where(*conditions).returning(table.c.id, table.c.category, table.c.date)
+    ).all()
+    if deleted:
+        rollups.refresh(session, user_id, {rollups.bucket_of(row.category, row.date) for row in deleted})
+        etags.bump(session, user_id)
+        changes.record(session, user_id, [row.id for row in deleted], deleted=True)
+    session.commit()
+
+    return {
+        'message': f'Deleted {len(deleted)} expense(s).',
+        'deleted': len(deleted),
+        'results': batch_results(requested_ids, [row.id for row in deleted], 'deleted')
+    }, 200
+
+
+@expense_bp.route('/', methods=['POST'])
+@token_required
+def create_expense(current_user):
+    payload, status = save_new_expense(db.session, current_user.id, request.get_json())
+    return jsonify(payload), status
+
+def iter_import_records(content_type, stream):
+    """Yield ``(row_number, record)`` pairs parsed incrementally from ``stream``.
+
+    ``record`` is a dict, or a string describing why the row could not be parsed.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if content_type == 'text/csv':
+        for number, record in enumerate(csv.DictReader(text), start=1):
+            yield number, record
+    else:
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield number, 'Invalid JSON!'
+                continue
+            yield number, record if isinstance(record, dict) else 'Each line must be a JSON object!'
+
+
+@expense_bp.route('/bulk', methods=['POST'])
+@token_required
+@query_budget(None)  # a few statements per batch, by design
+def bulk_import_expenses(current_user):
+    content_type = request.mimetype
+    if content_type not in BULK_CONTENT_TYPES:
+        return jsonify({
+            'message': f'Unsupported content type! Use one of: {sorted(BULK_CONTENT_TYPES)}'
+        }), 415
+
+    batch_size = current_app.config['BULK_IMPORT_BATCH_SIZE']
+    max_errors = current_app.config['BULK_IMPORT_MAX_ERRORS']
+    # Rows without a currency column (or with an empty one) are in the user's base currency.
+    base_currency = user_base_currency(db.session, current_user.id)
+    inserted = 0
+    failed = 0
+    errors = []
+    batch = []
+
+    def flush_batch():
+        # One executemany INSERT and one commit per batch.
+        new_ids = db.session.execute(insert(Expense).returning(Expense.id), batch).scalars().all()
+        rollups.add_many(db.session, current_user.id, [
+            (row['category'], row['date'], row['currency'], row['amount_minor']) for row in batch
+        ])
+        budgets.check(db.session, current_user.id, {rollups.bucket_of(row['category'], row['date']) for row in batch})
+        etags.bump(db.session, current_user.id)
+        changes.record(db.session, current_user.id, new_ids)
+        db.session.commit()
+
+    for number, record in iter_import_records(content_type, request.stream):
+        if isinstance(record, str):
+            values, message = None, record
+        else:
+            values, message = validate_expense(record, base_currency)
+
+        if message:
+            failed += 1
+            if len(errors) < max_errors:
+                errors.append({'row': number, 'message': message})
+            continue
+
+        values['user_id'] = current_user.id
+        batch.append(values)
+        if len(batch) >= batch_size:
+            flush_batch()
+            inserted += len(batch)
+            batch = []
+
+    if batch:
+        flush_batch()
+        inserted += len(batch)
+
+    status = 201 if inserted else (400 if failed else 200)
+    return jsonify({
+        'message': f'Imported {inserted} expense(s), {failed} row(s) rejected.',
+        'inserted': inserted,
+        'failed': failed,
+        'errors': errors,
+        'errors_truncated': failed > len(errors)
+    }), status
+
+@expense_bp.route('/batch', methods=['PATCH'])
+@token_required
+@query_budget(None)  # two statements per touched rollup bucket
+def batch_update_expenses(current_user):
+    payload, status = apply_batch_update(
+        db.session, current_user.id, request.get_json(silent=True), current_app.config['BATCH_MUTATION_MAX_ROWS']
+    )
+    return jsonify(payload), status
+
+@expense_bp.route('/batch', methods=['DELETE'])
+@token_required
+@query_budget(None)  # two statements per touched rollup bucket
+def batch_delete_expenses(current_user):
+    payload, status = remove_batch(
+        db.session, current_user.id, request.get_json(silent=True), current_app.config['BATCH_MUTATION_MAX_ROWS']
+    )
+    return jsonify(payload), status
+
+@expense_bp.route('/<int:expense_id>', methods=['PUT'])
+@token_required
+def update_expense(current_user, expense_id):
+    payload, status = apply_expense_update(db.session, current_user.id, expense_id, request.get_json())
+    return jsonify(payload), status
 
 @expense_bp.route('/<int:expense_id>', methods=['DELETE'])
 @token_required
 def delete_expense(current_user, expense_id):
-    expense = Expense.query.filter_by(id=expense_id, user_id=current_user.id).first()
-    
-    if not expense:
-        return jsonify({'message': 'Expense not found!'}), 404
-    
-    db.session.delete(expense)
-    db.session.commit()
-    
-    return jsonify({'message': 'Expense deleted successfully!'}), 200
\ No newline at end of file
+    payload, status = remove_expense(db.session, current_user.id, expense_id)
+    return jsonify(payload), status
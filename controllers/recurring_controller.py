@@ -0,0 +1,103 @@
+from flask import Blueprint, request, jsonify
+from models import db, Expense, RecurringRule
+from middlewares.auth_middleware import token_required
+from controllers.expense_controller import INVALID_DATE_MESSAGE, user_base_currency, validate_expense
+import changes
+import etags
+import recurring
+from datetime import datetime
+from sqlalchemy import select, update
+
+recurring_bp = Blueprint('recurring', __name__, url_prefix='/api/recurring')
+
+MAX_INTERVAL_MONTHS = 120
+
+
+def validate_rule(data, default_currency):
+    """Validate a new recurring rule payload; returns ``(values, message)``."""
+    data = data or {}
+    # The expense fields are validated like a new expense dated start_date.
+    values, message = validate_expense({**data, 'date': data.get('start_date')}, default_currency)
+    if message:
+        return None, message
+    values['start_date'] = values.pop('date')
+
+    try:
+        values['interval_months'] = int(data.get('interval_months', 1))
+        values['day_of_month'] = int(data.get('day_of_month', values['start_date'].day))
+    except (TypeError, ValueError):
+        return None, 'interval_months and day_of_month must be integers!'
+    if not 1 <= values['interval_months'] <= MAX_INTERVAL_MONTHS:
+        return None, f'interval_months must be between 1 and {MAX_INTERVAL_MONTHS}!'
+    if not 1 <= values['day_of_month'] <= 31:
+        return None, 'day_of_month must be between 1 and 31!'
+
+    try:
+        values['end_date'] = datetime.fromisoformat(data['end_date']) if data.get('end_date') else None
+    except (TypeError, ValueError):
+        return None, INVALID_DATE_MESSAGE
+    if values['end_date'] is not None and values['end_date'] < values['start_date']:
+        return None, 'end_date must not be before start_date!'
+
+    values['next_run'] = recurring.first_occurrence(
+        values['start_date'], values['day_of_month'], values['interval_months']
+    )
+    return values, None
+
+
+@recurring_bp.route('/', methods=['GET'])
+@token_required
+def get_rules(current_user):
+    rules = db.session.execute(
+        select(RecurringRule).filter_by(user_id=current_user.id).order_by(RecurringRule.id)
+    ).scalars().all()
+    return jsonify({'rules': [rule.to_dict() for rule in rules]}), 200
+
+
+@recurring_bp.route('/', methods=['POST'])
+@token_required
+def create_rule(current_user):
+    values, message = validate_rule(request.get_json(), user_base_currency(db.session, current_user.id))
+    if message:
+        return jsonify({'message': message}), 400
+
+    rule = RecurringRule(user_id=current_user.id, **values)
+    db.session.add(rule)
+    db.session.commit()
+
+    # A start date in the past is caught up right away rather than on the next scheduler pass.
+    _, written = recurring.run_due(db.session, rule_ids=[rule.id])
+    db.session.refresh(rule)
+
+    return jsonify({
+        'message': 'Recurring expense created successfully!',
+        'rule': rule.to_dict(),
+        'materialized': written
+    }), 201
+
+
+@recurring_bp.route('/<int:rule_id>', methods=['DELETE'])
+@token_required
+def delete_rule(current_user, rule_id):
+    rule = db.session.execute(select(RecurringRule).filter_by(id=rule_id, user_id=current_user.id)).scalar_one_or_none()
+
+    if not rule:
+        return jsonify({'message': 'Recurring expense not found!'}), 404
+
+    # Expenses already written from the rule are kept, but unlinked: a rule
+    # created later with the same id would collide with them on
+    # ux_expenses_recurring_rule_date and never be materialized.
+    expenses = Expense.__table__
+    expense_ids = db.session.execute(
+        select(expenses.c.id).where(expenses.c.recurring_rule_id == rule.id)
+    ).scalars().all()
+    if expense_ids:
+        db.session.execute(
+            update(expenses).where(expenses.c.recurring_rule_id == rule.id).values(recurring_rule_id=None)
+        )
+        etags.bump(db.session, current_user.id)
+        changes.record(db.session, current_user.id, expense_ids)
+    db.session.delete(rule)
+    db.session.commit()
+
+    return jsonify({'message': 'Recurring expense deleted successfully!'}), 200
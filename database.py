@@ -0,0 +1,50 @@
+"""Engine set-up that has to happen before the first connection is made."""
+from sqlalchemy import event
+
+from models import db
+
+
+def _apply_sqlite_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def _disable_pysqlite_begin(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+def _emit_begin(connection):
+    connection.exec_driver_sql('BEGIN')
+
+
+def configure_engine(app, engine):
+    """Install connect-time hooks on ``engine`` (a sync engine)."""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if pragmas:
+        event.listen(engine, 'connect', _apply_sqlite_pragmas(pragmas))
+    if app.config.get('SQLITE_EXPLICIT_BEGIN'):
+        # pysqlite opens transactions lazily and commits on its own before
+        # some statements, which breaks SAVEPOINT; take over BEGIN instead.
+        event.listen(engine, 'connect', _disable_pysqlite_begin)
+        event.listen(engine, 'begin', _emit_begin)
+
+
+def configure_engines(app):
+    """Install connect-time hooks on every engine of ``app``; call inside an app context."""
+    for engine in db.engines.values():
+        configure_engine(app, engine)
+
+
+def dispose_engines(app):
+    """Drop pooled connections inherited from a parent process (call after fork)."""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -0,0 +1,84 @@
+"""Strong ETags for expense reads, derived from a per-user version counter.
+
+``users.expenses_version`` is incremented in the same transaction as every
+expense write. A read's ETag is a hash of the user, that version, the exchange-rate table
+version (summaries convert with it) and the request path with its query
+string, so answering ``If-None-Match`` costs one primary-key lookup and no
+expense rows are read or serialized.
+
+Lists filtered by a window relative to now (``filter=week`` and the like)
+are not tagged: the window moves with the clock, so the same path and
+version can name different rows a moment later.
+"""
+import hashlib
+from functools import wraps
+
+from flask import current_app, make_response, request
+from sqlalchemy import select, update
+
+import fx
+from models import db, User
+
+RELATIVE_FILTERS = {'week', 'month', 'three_months'}
+
+
+def bump(session, user_id):
+    """Invalidate every ETag previously handed out for ``user_id``'s expenses."""
+    session.execute(
+        update(User.__table__)
+        .where(User.__table__.c.id == user_id)
+        .values(expenses_version=User.__table__.c.expenses_version + 1)
+    )
+
+
+def current_version(user_id):
+    return db.session.execute(select(User.expenses_version).where(User.id == user_id)).scalar() or 0
+
+
+def make_etag(user_id, version, path):
+    key = f'{user_id}:{version}:{fx.rates_version()}:{path}'
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def taggable():
+    """Whether this request's response is fully determined by the version and path."""
+    return request.args.get('filter') not in RELATIVE_FILTERS
+
+
+def encoded_etag(etag, encoding):
+    """The tag of ``etag``'s representation compressed with ``encoding``."""
+    return f'{etag}-{encoding}'
+
+
+def matching_etag(etag):
+    """The tag in ``If-None-Match`` naming ``etag`` in any encoding, or ``None``."""
+    for candidate in (etag, encoded_etag(etag, 'gzip'), encoded_etag(etag, 'br')):
+        if request.if_none_match.contains(candidate):
+            return candidate
+    return None
+
+
+def conditional(f):
+    """Answer ``If-None-Match`` with 304 and tag successful responses.
+
+    Goes below ``@token_required``: it needs ``current_user``.
+    """
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        if not taggable():
+            return f(current_user, *args, **kwargs)
+        etag = make_etag(current_user.id, current_version(current_user.id), request.full_path)
+        matched = matching_etag(etag)
+        if matched:
+            # Echo the tag the client holds: it names the encoding it cached.
+            response = current_app.response_class(status=304)
+            etag = matched
+        else:
+            response = make_response(f(current_user, *args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    return decorated
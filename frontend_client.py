@@ -0,0 +1,172 @@
+"""HTTP data layer for the Streamlit frontend (``app_frontend.py``).
+
+Streamlit reruns the whole script on every interaction, so anything that
+must survive a rerun lives in ``st.session_state``. ``client_for`` keeps one
+``ApiClient`` there, and with it:
+
+* one ``requests.Session`` with a connection pool, so reruns reuse
+  keep-alive connections instead of opening a new one per call;
+* a response cache for GETs. An entry younger than ``ttl`` seconds is
+  served without a request. An older one is revalidated with
+  ``If-None-Match`` and costs a ``304`` when nothing changed. Untagged
+  responses (lists over a window relative to now, like ``filter=week``)
+  are cached too, but refetched in full once older than ``ttl``. Any
+  successful write through the client clears the cache, so the user's own
+  changes show up on the next rerun;
+* ``ExpensePages`` feeds that fetch the expense list one cursor page at a
+  time and append each page to a DataFrame. Only the pages the user
+  asks for are downloaded. A feed is kept across reruns while its first
+  page is unchanged: still cached, revalidated with a ``304``, or refetched
+  with the same content. Writes from elsewhere reset it after at most
+  ``ttl`` seconds.
+"""
+import time
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TTL = 30  # seconds a cached GET is used without revalidation
+DEFAULT_PAGE_SIZE = 100
+POOL_SIZE = 10
+
+EXPENSE_COLUMNS = ['id', 'title', 'amount', 'currency', 'category', 'date', 'description']
+
+
+class ApiClient:
+    def __init__(self, base_url, ttl=DEFAULT_TTL, pool_size=POOL_SIZE):
+        self.base_url = base_url
+        self.ttl = ttl
+        self.token = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # (path, params) -> (etag or None, data, fetched_at)
+        self._cache = {}
+        # list params -> ExpensePages; dropped with the cache on every write.
+        self._feeds = {}
+
+    def _headers(self):
+        return {'Authorization': f'Bearer {self.token}'} if self.token else {}
+
+    def set_token(self, token):
+        self.token = token
+        self.invalidate()
+
+    def invalidate(self):
+        self._cache.clear()
+        self._feeds.clear()
+
+    def get(self, path, params=None):
+        """GET ``path`` through the cache; returns ``(status_code, json)``.
+
+        A ``304`` answer is returned as ``200`` with the cached body.
+        """
+        params = params or {}
+        key = (path, tuple(sorted(params.items())))
+        cached = self._cache.get(key)
+        if cached and time.monotonic() - cached[2] < self.ttl:
+            return 200, cached[1]
+
+        headers = self._headers()
+        if cached and cached[0]:
+            headers['If-None-Match'] = cached[0]
+        response = self.session.get(f'{self.base_url}{path}', headers=headers, params=params)
+        if response.status_code == 304 and cached:
+            self._cache[key] = (cached[0], cached[1], time.monotonic())
+            return 200, cached[1]
+
+        data = response.json()
+        if response.status_code == 200:
+            self._cache[key] = (response.headers.get('ETag'), data, time.monotonic())
+        return response.status_code, data
+
+    def request(self, method, path, **kwargs):
+        """Send a write (POST, PUT, PATCH, DELETE); returns ``(status_code, json)``.
+
+        A successful write clears every cached read.
+        """
+        response = self.session.request(method, f'{self.base_url}{path}', headers=self._headers(), **kwargs)
+        if response.ok:
+            self.invalidate()
+        return response.status_code, response.json()
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request('PATCH', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+    def expense_pages(self, params, page_size=DEFAULT_PAGE_SIZE):
+        """The ``ExpensePages`` feed for these list parameters, kept across reruns."""
+        key = tuple(sorted(params.items()))
+        feed = self._feeds.get(key)
+        if feed is None or not feed.current():
+            feed = self._feeds[key] = ExpensePages(self, params, page_size)
+        return feed
+
+
+class ExpensePages:
+    """The expense list for one set of filters, loaded a page at a time."""
+
+    def __init__(self, client, params, page_size):
+        self.client = client
+        self.params = dict(params, limit=page_size, include_count='false', layout='columnar',
+                           fields=','.join(EXPENSE_COLUMNS))
+        self.frame = pd.DataFrame(columns=EXPENSE_COLUMNS)
+        self.cursor = None
+        self.exhausted = False
+        self.error = None
+        self._first_page = None
+
+    def current(self):
+        """Whether the first page is unchanged on the server."""
+        if self._first_page is None:
+            return True
+        status_code, data = self.client.get('/expenses/', self.params)
+        # Cache hits and 304s return the same object; untagged lists are refetched.
+        return status_code == 200 and (data is self._first_page or data == self._first_page)
+
+    def load_more(self):
+        """Fetch the next page and append it to ``frame``; returns the number of new rows."""
+        if self.exhausted:
+            return 0
+        params = dict(self.params)
+        if self.cursor:
+            params['cursor'] = self.cursor
+        status_code, data = self.client.get('/expenses/', params)
+        if status_code != 200:
+            self.error = data.get('message', 'Unknown error')
+            return 0
+        if self.cursor is None:
+            self._first_page = data
+
+        page = pd.DataFrame(data['rows'], columns=data['columns'])
+        if not page.empty:
+            page['date'] = pd.to_datetime(page['date']).dt.strftime('%Y-%m-%d %H:%M')
+            self.frame = page if self.frame.empty else pd.concat([self.frame, page], ignore_index=True)
+        self.cursor = data.get('next_cursor')
+        self.exhausted = not self.cursor
+        return len(page)
+
+    def ensure(self, rows):
+        """Load pages until ``rows`` rows are loaded or the list ends."""
+        while len(self.frame) < rows and not self.exhausted and self.error is None:
+            if not self.load_more():
+                break
+        return self.frame
+
+
+def client_for(state, base_url):
+    """The ``ApiClient`` kept in ``state`` (``st.session_state``), created on first use."""
+    client = state.get('api_client')
+    if client is None:
+        client = state['api_client'] = ApiClient(base_url)
+    return client
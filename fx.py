@@ -0,0 +1,138 @@
+"""Exchange rates from a local file, cached in memory and indexed by date.
+
+``FX_RATES_FILE`` is a CSV file with a ``date,currency,rate`` header. Each
+``rate`` is the number of ``currency`` units per one unit of
+``FX_PIVOT_CURRENCY``, which is EUR by default, the layout of the ECB
+reference rates. A conversion on a day without a published rate, such as a
+weekend or holiday, uses the most recent earlier rate.
+
+Each process parses the file once into per-currency sorted date arrays,
+so a lookup is a binary search. The file is re-read when its modification
+time changes, checked at most every ``FX_RELOAD_INTERVAL`` seconds. The
+table's ``version`` is a hash of the file's content, so every worker and
+host serving the same file agrees on it (it is part of the expense ETags).
+Summaries convert once per (currency, day) group rather than per row; see
+``aggregations.fold_currencies``.
+"""
+import csv
+import hashlib
+import io
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import date
+
+from flask import current_app
+
+import money
+
+
+class MissingRate(LookupError):
+    """No rate is known for a currency on or before the requested day."""
+
+
+class RateTable:
+    def __init__(self, pivot, rates=None):
+        self.pivot = pivot
+        # currency -> (sorted day ordinals, rates)
+        self._rates = rates or {}
+
+    @classmethod
+    def from_csv(cls, path, pivot):
+        with open(path, newline='', encoding='utf-8') as rates_file:
+            return cls.parse(rates_file, pivot)
+
+    @classmethod
+    def parse(cls, lines, pivot):
+        """Build a table from the lines of a ``date,currency,rate`` CSV file."""
+        by_currency = {}
+        for row in csv.DictReader(lines):
+            currency = row['currency'].strip().upper()
+            day = date.fromisoformat(row['date'].strip()).toordinal()
+            by_currency.setdefault(currency, {})[day] = float(row['rate'])
+        rates = {}
+        for currency, days in by_currency.items():
+            ordered = sorted(days)
+            rates[currency] = (ordered, [days[day] for day in ordered])
+        return cls(pivot, rates)
+
+    def currencies(self):
+        return {self.pivot, *self._rates}
+
+    def rate(self, currency, day):
+        """Units of ``currency`` per pivot unit on ``day`` (a date or ISO string)."""
+        if currency == self.pivot:
+            return 1.0
+        entry = self._rates.get(currency)
+        if isinstance(day, str):
+            day = date.fromisoformat(day[:10])
+        if entry is not None:
+            index = bisect_right(entry[0], day.toordinal()) - 1
+            if index >= 0:
+                return entry[1][index]
+        raise MissingRate(f'No exchange rate for {currency} on or before {day.isoformat()}')
+
+    def factor(self, source, target, day):
+        """Multiply minor units of ``source`` by this to get major units of ``target``."""
+        scale = 10.0 ** -money.exponent(source)
+        if source == target:
+            return scale
+        return scale * self.rate(target, day) / self.rate(source, day)
+
+
+class RateCache:
+    """The current ``RateTable`` for one file, reloaded when the file changes."""
+
+    def __init__(self, path, pivot, reload_interval):
+        self.path = path
+        self.pivot = pivot
+        self.reload_interval = reload_interval
+        self._table = RateTable(pivot)
+        self._mtime = None
+        self.version = ''  # content hash of the loaded file; '' without one
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        if time.monotonic() - self._checked < self.reload_interval:
+            return self._table
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime_ns if self.path else None
+            except FileNotFoundError:
+                mtime = None
+            if mtime != self._mtime:
+                if mtime:
+                    with open(self.path, 'rb') as rates_file:
+                        content = rates_file.read()
+                    self._table = RateTable.parse(io.StringIO(content.decode('utf-8'), newline=''), self.pivot)
+                    self.version = hashlib.sha1(content).hexdigest()
+                else:
+                    self._table = RateTable(self.pivot)
+                    self.version = ''
+                self._mtime = mtime
+        return self._table
+
+
+def _rate_cache():
+    cache = current_app.extensions.get('fx_rates')
+    if cache is None:
+        config = current_app.config
+        cache = current_app.extensions.setdefault('fx_rates', RateCache(
+            config.get('FX_RATES_FILE'), config.get('FX_PIVOT_CURRENCY', 'EUR'), config.get('FX_RELOAD_INTERVAL', 60)
+        ))
+    return cache
+
+
+def get_rates():
+    """The app's current ``RateTable``."""
+    return _rate_cache().get()
+
+
+def rates_version():
+    """Identifies the rates ``get_rates()`` returns: a hash of the file's content."""
+    cache = _rate_cache()
+    cache.get()
+    return cache.version
@@ -0,0 +1,29 @@
+"""Gunicorn settings for ``gunicorn -c gunicorn.conf.py wsgi:app``."""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5555)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+max_requests = 10000
+max_requests_jitter = 1000
+
+# Import the app (and run migrations) once in the master, then fork.
+preload_app = True
+
+
+def when_ready(server):
+    # In-memory rate limit buckets are per worker: say so once, from the master.
+    from wsgi import app
+    from middlewares.rate_limit_middleware import warn_if_per_worker
+    warn_if_per_worker(app, server.cfg.workers)
+
+
+def post_fork(server, worker):
+    # Each worker needs its own database connections, not copies of the master's.
+    from wsgi import app
+    import database
+    database.dispose_engines(app)
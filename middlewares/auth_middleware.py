@@ -1,40 +1,186 @@
-import jwt
+import threading
+import time
+from collections import namedtuple
 from functools import wraps
-from flask import request, jsonify, current_app
-from models import User
+from flask import request, jsonify, current_app, g, has_app_context
+from sqlalchemy import delete, event, insert, inspect, select
+from cache import TTLCache
+from models import db, TokenRevocation, User
 
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = None
+# What protected handlers receive as ``current_user``: a snapshot of the
+# user row (or of the token claims in stateless mode), never a live ORM
+# object, so it can be cached and shared between requests.
+AuthUser = namedtuple('AuthUser', ['id', 'username', 'email'])
+
+
+class AuthCache:
+    """Per-app caches of verified tokens and users, plus revocations."""
 
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            if auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
+    def __init__(self, config):
+        expires = config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds()
+        self.tokens = TTLCache(config['AUTH_TOKEN_CACHE_SIZE'], expires)
+        self.users = TTLCache(config['AUTH_USER_CACHE_SIZE'], config['AUTH_USER_CACHE_TTL'])
+        self.token_lifetime = expires
+        self.poll_interval = config.get('AUTH_REVOCATION_POLL_INTERVAL', 5)
+        self._revoked = {}
+        self._lock = threading.Lock()
+        # The last token_revocations entry loaded, and when the table was last read.
+        self._last_revocation_id = 0
+        self._polled = float('-inf')
 
-        if not token:
-            return jsonify({'message': 'token is mising'}) , 401
-        
+    def revoke(self, user_id, revoked_at=None):
+        revoked_at = revoked_at or time.time()
+        with self._lock:
+            self._revoked[user_id] = max(revoked_at, self._revoked.get(user_id, 0))
+            # Tokens issued before the oldest still-valid one can no longer be presented.
+            cutoff = time.time() - self.token_lifetime
+            for stale in [uid for uid, at in self._revoked.items() if at < cutoff]:
+                del self._revoked[stale]
+        self.users.pop(user_id)
 
+    def poll(self, session):
+        """Load the revocations stored since the last poll, at most every ``poll_interval`` seconds."""
+        now = time.monotonic()
+        if now - self._polled < self.poll_interval or not self._lock.acquire(blocking=False):
+            return
         try:
-            data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-            current_user = User.query.filter_by(id = data['user_id']).first()
-            if not current_user:
-                return jsonify({'message' : 'user not found'}), 401
-        
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'token expired'}), 401
-        
-        except jwt.InvalidTokenError:
-            return jsonify({'message' : 'invalid token'}), 401
-        
-        return f(current_user, *args, **kwargs)
-    
-    return decorated
+            self._polled = now
+            table = TokenRevocation.__table__
+            rows = session.execute(
+                select(table.c.id, table.c.user_id, table.c.revoked_at)
+                .where(table.c.id > self._last_revocation_id).order_by(table.c.id)
+            ).all()
+        finally:
+            self._lock.release()
+        for row in rows:
+            self.revoke(row.user_id, row.revoked_at)
+            self._last_revocation_id = row.id
+
+    def is_revoked(self, claims):
+        revoked_at = self._revoked.get(claims['user_id'])
+        return revoked_at is not None and claims.get('iat', 0) <= revoked_at
+
+
+def get_auth_cache():
+    cache = current_app.extensions.get('auth_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('auth_cache', AuthCache(current_app.config))
+    return cache
+
+
+def revoke_user(user_id, connection=None):
+    """Reject every token issued to ``user_id`` so far.
+
+    Called automatically when a user is deleted or deactivated. This process
+    stops accepting the tokens at once. Given ``connection``, the revocation
+    is also stored in ``token_revocations``, in the same transaction. Other
+    processes in stateless mode load it within
+    ``AUTH_REVOCATION_POLL_INTERVAL`` seconds. Otherwise they notice when
+    their cached user row expires (``AUTH_USER_CACHE_TTL``).
+    """
+    revoked_at = time.time()
+    if connection is not None:
+        table = TokenRevocation.__table__
+        if has_app_context():
+            # Entries older than any unexpired token have nothing left to reject.
+            lifetime = current_app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds()
+            connection.execute(delete(table).where(table.c.revoked_at < revoked_at - lifetime))
+        connection.execute(insert(table).values(user_id=user_id, revoked_at=revoked_at))
+    if has_app_context():
+        get_auth_cache().revoke(user_id, revoked_at)
+
+
+@event.listens_for(User, 'after_delete')
+def _revoke_deleted_user(mapper, connection, target):
+    revoke_user(target.id, connection)
+
+
+@event.listens_for(User, 'after_update')
+def _revoke_deactivated_user(mapper, connection, target):
+    history = inspect(target).attrs.is_active.history
+    if history.has_changes() and not target.is_active:
+        revoke_user(target.id, connection)
+
+
+def verify_token(token):
+    """Decode ``token``, reusing an earlier verification when cached.
 
+    Raises ``jwt.InvalidTokenError`` subclasses like ``jwt.decode``.
+    """
+    import jwt
 
-        
+    cache = get_auth_cache()
+    claims = cache.tokens.get(token)
+    if claims is None:
+        claims = jwt.decode(
+            token,
+            current_app.config['JWT_SECRET_KEY'],
+            algorithms=['HS256'],
+            options={'require': ['exp', 'user_id']}
+        )
+        cache.tokens.set(token, claims, ttl=claims['exp'] - time.time())
+    elif claims['exp'] <= time.time():
+        cache.tokens.pop(token)
+        raise jwt.ExpiredSignatureError('Signature has expired')
+    if current_app.config['JWT_STATELESS_AUTH']:
+        # Nothing else here reads the database; revocations come from the table.
+        cache.poll(db.session)
+    if cache.is_revoked(claims):
+        raise jwt.InvalidTokenError('token revoked')
+    return claims
 
-        
 
+def load_user(claims):
+    if current_app.config['JWT_STATELESS_AUTH'] and 'username' in claims:
+        return AuthUser(claims['user_id'], claims['username'], claims.get('email'))
+
+    cache = get_auth_cache()
+    user = cache.users.get(claims['user_id'])
+    if user is None:
+        row = User.query.filter_by(id=claims['user_id']).first()
+        if not row or not row.is_active:
+            return None
+        user = AuthUser(row.id, row.username, row.email)
+        cache.users.set(user.id, user)
+    return user
+
+
+def bearer_claims():
+    """Verify the request's bearer token; returns ``(claims, error_response)``."""
+    import jwt
+
+    token = None
+
+    if 'Authorization' in request.headers:
+        auth_header = request.headers['Authorization']
+        if auth_header.startswith('Bearer '):
+            token = auth_header.split(' ')[1]
+
+    if not token:
+        return None, (jsonify({'message': 'token is mising'}) , 401)
+
+    try:
+        return verify_token(token), None
+
+    except jwt.ExpiredSignatureError:
+        return None, (jsonify({'message': 'token expired'}), 401)
+
+    except jwt.InvalidTokenError:
+        return None, (jsonify({'message' : 'invalid token'}), 401)
+
+
+def token_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        data, error = bearer_claims()
+        if error:
+            return error
+
+        current_user = load_user(data)
+        if not current_user:
+            return jsonify({'message' : 'user not found'}), 401
+
+        g.current_user = current_user
+        return f(current_user, *args, **kwargs)
+    
+    return decorated
@@ -0,0 +1,97 @@
+"""Negotiated gzip/brotli compression of response bodies.
+
+``init_compression(app)`` registers an ``after_request`` hook that
+compresses buffered responses of ``COMPRESS_MIMETYPES`` once they reach
+``COMPRESS_MIN_SIZE`` bytes. Brotli is preferred when the client accepts it
+and the ``brotli`` package is installed; gzip otherwise.
+
+Compressed responses get ``Vary: Accept-Encoding`` and an ETag suffixed
+with the encoding, so a cache never serves gzip bytes for the identity
+tag. ``etags.conditional`` accepts the suffixed tags in ``If-None-Match``.
+Streamed responses (export) compress themselves with ``stream_compressor``.
+"""
+import gzip
+import zlib
+
+from flask import current_app, request
+
+from etags import encoded_etag
+from middlewares.metrics_middleware import timed
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings):
+    """Pick ``'br'``, ``'gzip'`` or ``None`` from a parsed ``Accept-Encoding``."""
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def response_encoding():
+    """The encoding for a body the handler compresses itself, or ``None`` when ``COMPRESS_ENABLED`` is off."""
+    if not current_app.config.get('COMPRESS_ENABLED', True):
+        return None
+    return choose_encoding(request.accept_encodings)
+
+
+def compress(data, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['COMPRESS_BROTLI_QUALITY'])
+    return gzip.compress(data, compresslevel=config['COMPRESS_GZIP_LEVEL'], mtime=0)
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def stream_compressor(encoding, config):
+    """An object with ``compress(data)`` and ``flush()`` for streamed bodies."""
+    if encoding == 'br':
+        return _BrotliStream(config['COMPRESS_BROTLI_QUALITY'])
+    return zlib.compressobj(config['COMPRESS_GZIP_LEVEL'], zlib.DEFLATED, 31)
+
+
+def init_compression(app):
+    """Register the compression hook; a no-op when ``COMPRESS_ENABLED`` is false."""
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return
+    mimetypes = set(app.config['COMPRESS_MIMETYPES'])
+
+    @app.after_request
+    def compress_response(response):
+        if response.mimetype not in mimetypes or response.direct_passthrough or response.is_streamed:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code != 200 or 'Content-Encoding' in response.headers
+                or response.content_length is None
+                or response.content_length < current_app.config['COMPRESS_MIN_SIZE']):
+            return response
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        with timed('compress'):
+            response.set_data(compress(response.get_data(), encoding, current_app.config))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(encoded_etag(etag, encoding), weak)
+        return response
@@ -0,0 +1,266 @@
+"""Request instrumentation: latency histograms, SQL counts and a slow-query log.
+
+``init_metrics(app)`` registers request hooks and SQLAlchemy engine events.
+It exposes:
+
+* ``GET /metrics`` in the Prometheus text format. Each process keeps its own
+  registry, so scrape each worker or aggregate with a sidecar. It answers
+  only ``METRICS_ALLOWED_IPS`` (loopback by default) and requests bearing
+  ``METRICS_TOKEN``; anyone else gets a 404.
+* A ``Server-Timing`` header on every response with the total time, the
+  database time and query count, and any other phases recorded with
+  ``record_timing`` (bcrypt, serialization).
+* A slow-query log (``SLOW_QUERY_MS``). Only the parameterized statement is
+  logged; bound parameters are redacted.
+* ``MAX_QUERIES_PER_REQUEST``: requests issuing more statements than this
+  are logged, and fail with an error when ``TESTING`` or
+  ``QUERY_BUDGET_STRICT`` is set, so N+1 regressions break the tests.
+"""
+import bisect
+import hmac
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, abort, current_app, g, has_request_context, request
+from functools import wraps
+
+from sqlalchemy import event
+
+logger = logging.getLogger('expense_tracker.sql')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = label_names
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted(self._series.items())
+        for labels, series in items:
+            base = ','.join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            prefix = base + ',' if base else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{base}}} {series[-2]}')
+            lines.append(f'{self.name}_count{{{base}}} {series[-1]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            base = ','.join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            lines.append(f'{self.name}{{{base}}} {value}')
+        return lines
+
+
+class Metrics:
+    def __init__(self):
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', 'Request latency by endpoint.',
+            LATENCY_BUCKETS, ('endpoint', 'method'))
+        self.requests = Counter(
+            'http_requests_total', 'Requests by endpoint and status.', ('endpoint', 'method', 'status'))
+        self.queries_per_request = Histogram(
+            'db_queries_per_request', 'SQL statements issued per request.',
+            QUERY_COUNT_BUCKETS, ('endpoint',))
+        self.query_duration = Histogram(
+            'db_query_duration_seconds', 'SQL statement latency.', LATENCY_BUCKETS, ())
+        self.slow_queries = Counter('db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS.', ())
+        self.phase_duration = Histogram(
+            'app_phase_duration_seconds', 'Time spent in instrumented phases (bcrypt, serialize).',
+            LATENCY_BUCKETS, ('phase',))
+        self.rate_limited = Counter(
+            'http_rate_limited_total', 'Requests rejected by the rate limiter.', ('endpoint', 'scope'))
+
+    def render(self):
+        lines = []
+        for metric in (self.request_duration, self.requests, self.queries_per_request,
+                       self.query_duration, self.slow_queries, self.phase_duration, self.rate_limited):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def get_metrics():
+    return current_app.extensions['metrics']
+
+
+def record_timing(phase, seconds):
+    """Add ``seconds`` to the current request's ``phase`` (shown in Server-Timing)."""
+    if not has_request_context() or 'metrics' not in current_app.extensions:
+        return
+    timings = g.setdefault('phase_timings', {})
+    timings[phase] = timings.get(phase, 0.0) + seconds
+    get_metrics().phase_duration.observe(seconds, phase)
+
+
+@contextmanager
+def timed(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(phase, time.perf_counter() - start)
+
+
+@contextmanager
+def count_queries():
+    """Count statements run inside the block, for asserting query budgets in tests.
+
+        with count_queries() as counter:
+            client.get('/api/expenses/')
+        assert counter['count'] <= 3
+    """
+    counter = {'count': 0, 'statements': []}
+    _active_counters.append(counter)
+    try:
+        yield counter
+    finally:
+        _active_counters.remove(counter)
+
+
+_active_counters = []
+
+
+def _endpoint_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _install_engine_events(app, engine):
+    slow_seconds = app.config['SLOW_QUERY_MS'] / 1000
+    metrics = app.extensions['metrics']
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        metrics.query_duration.observe(elapsed)
+        for counter in _active_counters:
+            counter['count'] += 1
+            counter['statements'].append(statement)
+        if has_request_context():
+            g.sql_count = g.get('sql_count', 0) + 1
+            g.sql_time = g.get('sql_time', 0.0) + elapsed
+        if elapsed >= slow_seconds:
+            metrics.slow_queries.inc()
+            count = len(parameters) if parameters is not None else 0
+            logger.warning('slow query %.1fms: %s [parameters redacted: %d%s]',
+                           elapsed * 1000, ' '.join(statement.split())[:2000], count,
+                           ' rows' if executemany else '')
+
+
+def instrument_engine(app, engine):
+    """Time and count ``engine``'s statements too (for engines created outside Flask-SQLAlchemy)."""
+    if 'metrics' in app.extensions:
+        _install_engine_events(app, engine)
+
+
+def metrics_allowed():
+    """Whether this request may read ``/metrics``."""
+    if request.remote_addr in current_app.config.get('METRICS_ALLOWED_IPS', ()):
+        return True
+    token = current_app.config.get('METRICS_TOKEN')
+    header = request.headers.get('Authorization', '')
+    return bool(token) and header.startswith('Bearer ') and hmac.compare_digest(header[7:], token)
+
+
+def query_budget(limit):
+    """Override ``MAX_QUERIES_PER_REQUEST`` for one view; ``None`` disables the check."""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            g.query_budget = limit
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+def init_metrics(app):
+    """Register the hooks and ``/metrics``; call inside an app context after engines exist."""
+    from models import db
+
+    app.extensions['metrics'] = Metrics()
+    for engine in db.engines.values():
+        _install_engine_events(app, engine)
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        g.sql_count = 0
+        g.sql_time = 0.0
+
+    @app.after_request
+    def record_request(response):
+        start = g.get('request_start')
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = _endpoint_label()
+        metrics = get_metrics()
+        metrics.request_duration.observe(elapsed, endpoint, request.method)
+        metrics.requests.inc(endpoint, request.method, str(response.status_code))
+        metrics.queries_per_request.observe(g.sql_count, endpoint)
+
+        timings = [f'app;dur={elapsed * 1000:.2f}', f'db;dur={g.sql_time * 1000:.2f};desc="{g.sql_count} queries"']
+        timings += [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in g.get('phase_timings', {}).items()]
+        response.headers['Server-Timing'] = ', '.join(timings)
+
+        budget = g.query_budget if 'query_budget' in g else current_app.config.get('MAX_QUERIES_PER_REQUEST')
+        if budget is not None and g.sql_count > budget:
+            message = f'{request.method} {endpoint} ran {g.sql_count} SQL statements (budget {budget})'
+            if current_app.testing or current_app.config.get('QUERY_BUDGET_STRICT'):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        if not metrics_allowed():
+            abort(404)
+        return Response(get_metrics().render(), mimetype='text/plain; version=0.0.4')
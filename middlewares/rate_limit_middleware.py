@@ -0,0 +1,307 @@
+"""Token bucket rate limiting per client IP, per user and per login name.
+
+``RATE_LIMITS`` maps a blueprint name (``'expense'``) or an endpoint
+(``'auth.login'``) to limits per scope. Endpoint entries override the
+blueprint entry scope by scope:
+
+    RATE_LIMITS = {
+        'expense': {'user': '300/minute', 'ip': '600/minute'},
+        'auth.login': {'ip': '20/minute', 'login': '5/minute'},
+    }
+
+Scopes:
+
+* ``ip``: the client address (see ``RATELIMIT_PROXY_COUNT``).
+* ``user``: the ``user_id`` of a valid bearer token. Requests without one
+  are only limited by ``ip``.
+* ``login``: the username submitted to the login endpoint, so guessing one
+  account's password from many addresses is limited too.
+
+A limit ``'N/period'`` is a bucket holding N tokens that refills at
+N per period, so clients may burst up to N requests and then sustain the
+average rate. Buckets belong to the rule that set the limit: a blueprint
+limit is one bucket shared by all its endpoints, an endpoint override has
+its own. A request rejected by one bucket is refunded to the others. Checks run in a ``before_request`` hook, before the token
+is verified and before bcrypt runs. Responses carry ``RateLimit-Limit``,
+``RateLimit-Remaining``, ``RateLimit-Reset`` and ``RateLimit-Policy``
+for the tightest bucket, and rejections get a 429 with ``Retry-After``.
+
+Buckets live in the process (``memory://``) unless ``RATELIMIT_STORAGE_URL``
+points at Redis, which shares them between workers and hosts. When Redis
+is unreachable requests are let through and a warning is logged. With
+``memory://`` every worker process enforces each limit on its own, so the
+server as a whole allows the worker count times the limit;
+``gunicorn.conf.py`` warns about that at start-up (``warn_if_per_worker``).
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, g, jsonify, request
+
+try:
+    import redis
+except ImportError:  # optional dependency
+    redis = None
+
+logger = logging.getLogger('expense_tracker.ratelimit')
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+Limit = namedtuple('Limit', ['capacity', 'period'])
+
+# Outcome of one bucket check. ``reset_after`` is the time until the bucket
+# is full again; ``retry_after`` the time until the next request fits.
+Decision = namedtuple('Decision', ['allowed', 'remaining', 'reset_after', 'retry_after'])
+
+
+def parse_limit(value):
+    """Parse ``'10/minute'`` (or ``'10/5 minutes'``) into a ``Limit``."""
+    try:
+        count, period = value.split('/')
+        parts = period.split()
+        multiplier = int(parts[0]) if len(parts) == 2 else 1
+        unit = parts[-1].rstrip('s')
+        return Limit(int(count), multiplier * PERIODS[unit])
+    except (ValueError, KeyError, IndexError):
+        raise ValueError(f'invalid rate limit {value!r}, expected e.g. "10/minute"') from None
+
+
+def _decision(limit, tokens, allowed, cost=1):
+    rate = limit.capacity / limit.period
+    return Decision(
+        allowed,
+        int(tokens),
+        (limit.capacity - tokens) / rate,
+        0.0 if allowed else (cost - tokens) / rate,
+    )
+
+
+class MemoryStore:
+    """Buckets in a dict, for one process or for tests.
+
+    Keeps at most ``max_keys`` buckets, dropping the least recently used.
+    A dropped bucket behaves like a full one.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, limit, cost=1):
+        rate = limit.capacity / limit.period
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (limit.capacity, now))
+            tokens = min(limit.capacity, tokens + (now - stamp) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens = min(limit.capacity, tokens - cost)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return _decision(limit, tokens, allowed, cost)
+
+    def refund(self, key, limit, cost=1):
+        self.consume(key, limit, -cost)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# Refill and take in one round trip. Uses the Redis clock so workers with
+# skewed clocks agree; keys expire once the bucket would be full again.
+_REDIS_CONSUME = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = tonumber(state[1]) or capacity
+local stamp = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - stamp) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = math.min(capacity, tokens - cost)
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'stamp', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisStore:
+    """Buckets shared through Redis by every worker using the same URL."""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        if redis is None:
+            raise RuntimeError('RATELIMIT_STORAGE_URL points at Redis but the redis package is not installed')
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.prefix = prefix
+        self._consume = self.client.register_script(_REDIS_CONSUME)
+
+    def consume(self, key, limit, cost=1):
+        rate = limit.capacity / limit.period
+        try:
+            allowed, tokens = self._consume(keys=[self.prefix + key], args=[limit.capacity, rate, cost])
+        except redis.RedisError as error:
+            logger.warning('rate limit store unavailable, allowing request: %s', error)
+            return Decision(True, limit.capacity, 0.0, 0.0)
+        return _decision(limit, float(tokens), bool(allowed), cost)
+
+    def refund(self, key, limit, cost=1):
+        self.consume(key, limit, -cost)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+def create_store(url):
+    if not url or url.startswith('memory://'):
+        return MemoryStore()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStore(url)
+    raise ValueError(f'unsupported RATELIMIT_STORAGE_URL {url!r}')
+
+
+class RateLimiter:
+    def __init__(self, config):
+        self.store = create_store(config.get('RATELIMIT_STORAGE_URL'))
+        self.proxy_count = config.get('RATELIMIT_PROXY_COUNT', 0)
+        self.rules = {
+            name: {scope: parse_limit(value) for scope, value in limits.items()}
+            for name, limits in config.get('RATE_LIMITS', {}).items()
+        }
+        self._resolved = {}
+
+    def limits_for(self, endpoint):
+        """``{scope: (rule, limit)}`` for ``endpoint``: its blueprint's, overridden by its own.
+
+        ``rule`` is the ``RATE_LIMITS`` key the limit came from and names the bucket.
+        """
+        limits = self._resolved.get(endpoint)
+        if limits is None:
+            blueprint = endpoint.rpartition('.')[0]
+            limits = {scope: (blueprint, limit) for scope, limit in self.rules.get(blueprint, {}).items()}
+            limits.update((scope, (endpoint, limit)) for scope, limit in self.rules.get(endpoint, {}).items())
+            self._resolved[endpoint] = limits
+        return limits
+
+    def client_ip(self):
+        if self.proxy_count and len(request.access_route) >= self.proxy_count:
+            return request.access_route[-self.proxy_count]
+        return request.remote_addr or 'unknown'
+
+    def scope_key(self, scope):
+        if scope == 'ip':
+            return self.client_ip()
+        if scope == 'user':
+            return _token_user_id()
+        if scope == 'login':
+            data = request.get_json(silent=True)
+            username = data.get('username') if isinstance(data, dict) else None
+            return username.lower() if isinstance(username, str) and username else None
+        raise ValueError(f'unknown rate limit scope {scope!r}')
+
+    def check(self, endpoint):
+        """Consume one token from each applicable bucket.
+
+        Returns ``(decision, limit, scope)`` for the rejecting bucket, or for
+        the one closest to running out when every bucket allows the request.
+        A rejected request gets its tokens back from the buckets before it.
+        """
+        tightest = None
+        consumed = []
+        for scope, (rule, limit) in self.limits_for(endpoint).items():
+            key = self.scope_key(scope)
+            if key is None:
+                continue
+            bucket = f'{rule}:{scope}:{key}'
+            decision = self.store.consume(bucket, limit)
+            if not decision.allowed:
+                for taken, taken_limit in consumed:
+                    self.store.refund(taken, taken_limit)
+                return decision, limit, scope
+            consumed.append((bucket, limit))
+            if tightest is None or decision.remaining < tightest[0].remaining:
+                tightest = (decision, limit, scope)
+        return tightest
+
+
+def _token_user_id():
+    import jwt
+
+    from middlewares.auth_middleware import verify_token
+
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header.startswith('Bearer '):
+        return None
+    try:
+        return str(verify_token(auth_header.split(' ')[1])['user_id'])
+    except jwt.InvalidTokenError:
+        return None
+
+
+def get_rate_limiter():
+    return current_app.extensions['rate_limiter']
+
+
+def warn_if_per_worker(app, workers):
+    """Log a warning, and return ``True``, when ``workers`` processes would each keep their own buckets."""
+    limiter = app.extensions.get('rate_limiter')
+    if limiter is None or workers <= 1 or not isinstance(limiter.store, MemoryStore):
+        return False
+    logger.warning(
+        'rate limits are kept per process (RATELIMIT_STORAGE_URL=memory://): with %d workers a client '
+        'can make up to %d times each limit. Point RATELIMIT_STORAGE_URL at Redis to share them.',
+        workers, workers,
+    )
+    return True
+
+
+def _set_headers(response, decision, limit):
+    response.headers['RateLimit-Limit'] = str(limit.capacity)
+    response.headers['RateLimit-Remaining'] = str(decision.remaining)
+    response.headers['RateLimit-Reset'] = str(math.ceil(decision.reset_after))
+    response.headers['RateLimit-Policy'] = f'{limit.capacity};w={limit.period}'
+
+
+def init_rate_limits(app):
+    """Register the rate limiting hooks; a no-op when ``RATELIMIT_ENABLED`` is false."""
+    if not app.config.get('RATELIMIT_ENABLED', True):
+        return
+    app.extensions['rate_limiter'] = RateLimiter(app.config)
+
+    @app.before_request
+    def enforce_rate_limits():
+        if request.endpoint is None or request.method == 'OPTIONS':
+            return None
+        result = get_rate_limiter().check(request.endpoint)
+        if result is None:
+            return None
+        g.rate_limit = result
+        decision, limit, scope = result
+        if decision.allowed:
+            return None
+        metrics = current_app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.rate_limited.inc(request.endpoint, scope)
+        response = jsonify({'message': 'Too many requests, please retry later.'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, math.ceil(decision.retry_after)))
+        return response
+
+    @app.after_request
+    def add_rate_limit_headers(response):
+        result = g.get('rate_limit')
+        if result is not None:
+            _set_headers(response, result[0], result[1])
+        return response
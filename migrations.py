@@ -0,0 +1,300 @@
+"""Versioned schema migrations.
+
+Each migration is a function registered with ``@migration(version, description)``
+that receives a SQLAlchemy connection inside a transaction. Applied versions are
+recorded in the ``schema_migrations`` table, so ``upgrade()`` only runs what is
+pending. Migrations must be idempotent (``checkfirst``, "if missing" helpers):
+the first one creates tables from the current models, and databases created by
+the old ``db.create_all()`` already have some of the objects later ones add.
+
+An empty database skips the history: ``bootstrap`` creates the current
+schema from the models in one transaction and records every version.
+"""
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, Float, Integer, MetaData, String, Table, inspect, select, text
+
+from models import (db, User, Expense, ExpenseRollup, ExpenseChange, RecurringRule, Budget, BudgetAlert,
+                    TokenRevocation)
+import changes
+import money
+import rollups
+import search
+
+logger = logging.getLogger(__name__)
+
+_version_metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', _version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False, default=datetime.utcnow),
+)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return fn
+    return register
+
+
+def create_index_if_missing(connection, index):
+    index.create(connection, checkfirst=True)
+
+
+def drop_index_if_exists(connection, index):
+    index.drop(connection, checkfirst=True)
+
+
+def column_names(connection, table):
+    return {col['name'] for col in inspect(connection).get_columns(table.name)}
+
+
+def add_column_if_missing(connection, table, column):
+    """Add ``column`` (a model Column) to ``table`` unless it already exists."""
+    if column.name in column_names(connection, table):
+        return
+    column_type = column.type.compile(dialect=connection.dialect)
+    ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+    if column.server_default is not None:
+        default = column.server_default.arg
+        default = default.compile(dialect=connection.dialect) if hasattr(default, 'compile') else f"'{default}'"
+        ddl += f' DEFAULT {default}'
+    if not column.nullable:
+        ddl += ' NOT NULL'
+    connection.exec_driver_sql(ddl)
+
+
+@migration(1, 'initial schema: users and expenses')
+def _initial_schema(connection):
+    User.__table__.create(connection, checkfirst=True)
+    Expense.__table__.create(connection, checkfirst=True)
+
+
+@migration(2, 'composite indexes on expenses')
+def _expense_indexes(connection):
+    for index in Expense.__table__.indexes:
+        if index.name in ('ix_expenses_user_date_id', 'ix_expenses_user_category_date'):
+            create_index_if_missing(connection, index)
+
+
+@migration(3, 'expense_rollups table')
+def _expense_rollups(connection):
+    ExpenseRollup.__table__.create(connection, checkfirst=True)
+    # Older databases still have float amounts here; migration 10 rebuilds them.
+    if 'amount_minor' in column_names(connection, Expense.__table__):
+        rollups.rebuild(connection)
+
+
+@migration(4, 'users.is_active')
+def _user_is_active(connection):
+    add_column_if_missing(connection, User.__table__, User.__table__.c.is_active)
+
+
+@migration(5, 'users.expenses_version')
+def _user_expenses_version(connection):
+    add_column_if_missing(connection, User.__table__, User.__table__.c.expenses_version)
+
+
+@migration(6, 'expense_changes log')
+def _expense_changes(connection):
+    ExpenseChange.__table__.create(connection, checkfirst=True)
+    if connection.execute(select(ExpenseChange.seq).limit(1)).first() is None:
+        changes.backfill(connection)
+
+
+@migration(7, 'full-text search index on expenses')
+def _expense_search(connection):
+    search.install(connection)
+
+
+@migration(8, 'recurring_rules and expenses.recurring_rule_id')
+def _recurring_rules(connection):
+    RecurringRule.__table__.create(connection, checkfirst=True)
+    add_column_if_missing(connection, Expense.__table__, Expense.__table__.c.recurring_rule_id)
+    for index in Expense.__table__.indexes:
+        if index.name == 'ux_expenses_recurring_rule_date':
+            create_index_if_missing(connection, index)
+
+
+@migration(9, 'budgets and budget_alerts')
+def _budgets(connection):
+    Budget.__table__.create(connection, checkfirst=True)
+    BudgetAlert.__table__.create(connection, checkfirst=True)
+
+
+class MigrationError(RuntimeError):
+    """A migration refused to run; nothing it would have changed was touched."""
+
+
+# Original amounts that migration 10 rounded, kept when rounding was allowed.
+amount_rounding_audit = Table(
+    'amount_rounding_audit', _version_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('table_name', String(50), nullable=False),
+    Column('row_key', String(100), nullable=False),
+    Column('amount', Float(precision=53), nullable=False),
+    Column('amount_minor', BigInteger, nullable=False),
+    Column('migrated_at', DateTime, nullable=False, default=datetime.utcnow),
+)
+
+
+def _legacy_scale():
+    return 10 ** money.exponent(money.LEGACY_CURRENCY)
+
+
+def _inexact_amounts(connection, table):
+    """Rows of ``table`` whose float ``amount`` is not a whole number of legacy minor units."""
+    if 'amount' not in column_names(connection, table):
+        return []
+    scale = _legacy_scale()
+    keys = ', '.join(col.name for col in table.primary_key)
+    return connection.execute(text(
+        f'SELECT {keys}, amount FROM {table.name} '
+        f'WHERE ABS(amount * {scale} - ROUND(amount * {scale})) > 1e-6'
+    )).all()
+
+
+def _amount_to_minor_units(connection, table, inexact):
+    """Replace a float ``amount`` column of major units with ``amount_minor`` + ``currency``.
+
+    ``inexact`` rows (see ``_inexact_amounts``) are rounded; their original
+    amounts are copied to ``amount_rounding_audit`` first.
+    """
+    existing = column_names(connection, table)
+    add_column_if_missing(connection, table, table.c.currency)
+    if 'amount' not in existing:
+        return
+    scale = _legacy_scale()
+    # Filled in right below; the default only lets the NOT NULL column be added.
+    add_column_if_missing(connection, table, Column('amount_minor', BigInteger, nullable=False, server_default='0'))
+    connection.execute(text(
+        f'UPDATE {table.name} SET amount_minor = CAST(ROUND(amount * {scale}) AS BIGINT)'
+    ))
+    if inexact:
+        amount_rounding_audit.create(connection, checkfirst=True)
+        connection.execute(amount_rounding_audit.insert(), [
+            {'table_name': table.name, 'row_key': ','.join(str(value) for value in row[:-1]),
+             'amount': row[-1], 'amount_minor': round(row[-1] * scale), 'migrated_at': datetime.utcnow()}
+            for row in inexact
+        ])
+        for row in inexact:
+            logger.warning('%s %s: amount %r rounded to whole minor units (original kept in %s)',
+                           table.name, tuple(row[:-1]), row[-1], amount_rounding_audit.name)
+
+    indexes = [index for index in table.indexes if 'amount_minor' in (index.dialect_options['postgresql']['include'] or ())]
+    for index in indexes:
+        drop_index_if_exists(connection, index)
+    connection.exec_driver_sql(f'ALTER TABLE {table.name} DROP COLUMN amount')
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(f'ALTER TABLE {table.name} ALTER COLUMN amount_minor DROP DEFAULT')
+    for index in indexes:
+        create_index_if_missing(connection, index)
+
+
+@migration(10, 'amounts as integer minor units with a currency')
+def _currencies(connection):
+    tables = (Expense.__table__, RecurringRule.__table__, Budget.__table__)
+    # Checked for every table before anything changes: SQLite commits DDL
+    # as it goes, so a later refusal could not undo an earlier conversion.
+    inexact = {table.name: _inexact_amounts(connection, table) for table in tables}
+    found = sum(len(rows) for rows in inexact.values())
+    if found and os.environ.get('MIGRATE_ROUND_AMOUNTS', 'false').lower() not in ('1', 'true', 'yes'):
+        examples = '; '.join(
+            f'{name} {tuple(row[:-1])}: {row[-1]!r}' for name, rows in inexact.items() for row in rows[:5]
+        )
+        raise MigrationError(
+            f'{found} amount(s) have more than {money.exponent(money.LEGACY_CURRENCY)} decimal places '
+            f'and cannot be stored exactly ({examples}). Fix them, or set MIGRATE_ROUND_AMOUNTS=true '
+            f'to round them and keep the originals in {amount_rounding_audit.name}.'
+        )
+
+    add_column_if_missing(connection, User.__table__, User.__table__.c.base_currency)
+    for table in tables:
+        _amount_to_minor_units(connection, table, inexact[table.name])
+    add_column_if_missing(connection, BudgetAlert.__table__, BudgetAlert.__table__.c.currency)
+
+    # The rollup primary key gains the currency: rebuild the table.
+    if 'currency' not in column_names(connection, ExpenseRollup.__table__):
+        ExpenseRollup.__table__.drop(connection)
+        ExpenseRollup.__table__.create(connection)
+    rollups.rebuild(connection)
+
+
+@migration(11, 'unlink expenses of deleted recurring rules')
+def _orphaned_recurring_expenses(connection):
+    # Rule ids could be reused on SQLite; a new rule must not collide with
+    # expenses still pointing at a deleted one.
+    connection.execute(text(
+        'UPDATE expenses SET recurring_rule_id = NULL WHERE recurring_rule_id IS NOT NULL '
+        'AND recurring_rule_id NOT IN (SELECT id FROM recurring_rules)'
+    ))
+
+
+@migration(12, 'token_revocations table')
+def _token_revocations(connection):
+    TokenRevocation.__table__.create(connection, checkfirst=True)
+
+
+def current_version(connection):
+    schema_migrations.create(connection, checkfirst=True)
+    version = connection.execute(
+        select(schema_migrations.c.version).order_by(schema_migrations.c.version.desc()).limit(1)
+    ).scalar()
+    return version or 0
+
+
+def pending(connection):
+    version = current_version(connection)
+    return [entry for entry in MIGRATIONS if entry[0] > version]
+
+
+def head():
+    return MIGRATIONS[-1][0]
+
+
+def bootstrap(connection):
+    """Create the current schema in an empty database and mark every migration applied."""
+    db.metadata.create_all(connection)
+    search.install(connection)
+    now = datetime.utcnow()
+    connection.execute(schema_migrations.insert(), [
+        {'version': version, 'description': description, 'applied_at': now}
+        for version, description, _ in MIGRATIONS
+    ])
+
+
+def upgrade(engine=None, target=None):
+    """Apply every pending migration (up to ``target``) and return the applied versions."""
+    engine = engine or db.engine
+    with engine.begin() as connection:
+        start = current_version(connection)
+        if start >= (target or head()):
+            return []
+        if start == 0 and target is None and set(inspect(connection).get_table_names()) == {'schema_migrations'}:
+            bootstrap(connection)
+            return [version for version, _, _ in MIGRATIONS]
+
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version <= start:
+            continue
+        if target is not None and version > target:
+            break
+        # One transaction per migration: a failure leaves earlier ones recorded.
+        with engine.begin() as connection:
+            if current_version(connection) >= version:
+                continue
+            fn(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+        applied.append(version)
+    return applied
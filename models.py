@@ -2,9 +2,11 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import enum
-import bcrypt
+import password_pool
+import money
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class CategoryEnum(enum.Enum):
     GROCERIES = "Groceries"
@@ -22,49 +24,227 @@ class User(db.Model):
     username = db.Column(db.String(50), unique=True, nullable=False)
     email = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
+    is_active = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+    # Incremented on every expense write; see etags.py.
+    expenses_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Summaries and budgets are reported in this currency.
+    base_currency = db.Column(db.String(3), nullable=False, default=money.LEGACY_CURRENCY,
+                              server_default=money.LEGACY_CURRENCY)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     expenses = db.relationship('Expense', backref='user', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        password_bytes = password.encode('utf-8')
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+        # May raise password_pool.PoolSaturated when the hashing pool is full.
+        self.password_hash = password_pool.hash_password(password)
     
     def verify_password(self, password):
-        password_bytes = password.encode('utf-8')
-        hash_bytes = self.password_hash.encode('utf-8')
-        return bcrypt.checkpw(password_bytes, hash_bytes)
+        return password_pool.check_password(password, self.password_hash)
     
     def to_dict(self):
         return {
             'id': self.id,
             'username': self.username,
             'email': self.email,
+            'base_currency': self.base_currency,
             'created_at': self.created_at.isoformat()
         }
 
+
+class TokenRevocation(db.Model):
+    """Tokens of ``user_id`` issued up to ``revoked_at`` are invalid; see ``auth_middleware.py``.
+
+    No foreign key: the revocation of a deleted user must outlive the user row.
+    """
+    __tablename__ = 'token_revocations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    revoked_at = db.Column(db.Float, nullable=False)  # epoch seconds, compared with the token's iat
+
+    __table_args__ = (
+        # Workers read the entries after the last id they have seen.
+        {'sqlite_autoincrement': True},
+    )
+
+
 class Expense(db.Model):
     __tablename__ = 'expenses'
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    # Integer minor units of ``currency`` (see money.py); the API's ``amount`` is derived from both.
+    amount_minor = db.Column(db.BigInteger, nullable=False)
+    currency = db.Column(db.String(3), nullable=False, default=money.LEGACY_CURRENCY,
+                         server_default=money.LEGACY_CURRENCY)
     category = db.Column(db.Enum(CategoryEnum), nullable=False)
     date = db.Column(db.DateTime, default=datetime.utcnow)
     description = db.Column(db.Text, nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set on expenses materialized from a RecurringRule. No foreign key: the
+    # expenses outlive their rule, and this table predates recurring_rules.
+    recurring_rule_id = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        # Serves the list endpoint: equality on user_id, then ORDER BY date DESC, id DESC.
+        db.Index('ix_expenses_user_date_id', user_id, date.desc(), id.desc()),
+        # Category breakdowns; on PostgreSQL the amount is carried in the index
+        # so the aggregation can be answered from an index-only scan.
+        db.Index('ix_expenses_user_category_date', user_id, category, date,
+                 postgresql_include=['amount_minor', 'currency']),
+        # One expense per rule and occurrence: materializing twice inserts nothing.
+        db.Index('ux_expenses_recurring_rule_date', recurring_rule_id, date, unique=True),
+    )
     
     def to_dict(self):
         return {
             'id': self.id,
             'title': self.title,
-            'amount': self.amount,
+            'amount': money.to_major(self.amount_minor, self.currency),
+            'currency': self.currency,
             'category': self.category.name,  # Use name instead of the Enum object
             'date': self.date.isoformat(),
             'description': self.description,
             'user_id': self.user_id,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
-        }
\ No newline at end of file
+        }
+
+
+class ExpenseRollup(db.Model):
+    """Per-user monthly totals by category and currency, kept current by ``rollups.py``.
+
+    Amounts are integer minor units of ``currency``.
+    """
+    __tablename__ = 'expense_rollups'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    category = db.Column(db.Enum(CategoryEnum), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    currency = db.Column(db.String(3), primary_key=True)
+    total = db.Column(db.BigInteger, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    min_amount = db.Column(db.BigInteger, nullable=True)
+    max_amount = db.Column(db.BigInteger, nullable=True)
+
+
+class ExpenseChange(db.Model):
+    """Append-only log of expense writes, read by the delta sync endpoint."""
+    __tablename__ = 'expense_changes'
+
+    seq = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    expense_id = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_expense_changes_user_seq', user_id, seq),
+        # Never reuse a sequence number, even if the newest entry is removed.
+        {'sqlite_autoincrement': True},
+    )
+
+
+class RecurringRule(db.Model):
+    """An expense repeated every ``interval_months`` on ``day_of_month``; see ``recurring.py``."""
+    __tablename__ = 'recurring_rules'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    title = db.Column(db.String(100), nullable=False)
+    amount_minor = db.Column(db.BigInteger, nullable=False)
+    currency = db.Column(db.String(3), nullable=False, default=money.LEGACY_CURRENCY,
+                         server_default=money.LEGACY_CURRENCY)
+    category = db.Column(db.Enum(CategoryEnum), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    interval_months = db.Column(db.Integer, nullable=False, default=1)
+    day_of_month = db.Column(db.Integer, nullable=False)  # clamped to the length of short months
+    start_date = db.Column(db.DateTime, nullable=False)
+    end_date = db.Column(db.DateTime, nullable=True)
+    # Date of the first occurrence not materialized yet.
+    next_run = db.Column(db.DateTime, nullable=False)
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_recurring_rules_due', is_active, next_run),
+        db.Index('ix_recurring_rules_user', user_id),
+        # Never hand a deleted rule's id to a new one.
+        {'sqlite_autoincrement': True},
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'amount': money.to_major(self.amount_minor, self.currency),
+            'currency': self.currency,
+            'category': self.category.name,
+            'description': self.description,
+            'interval_months': self.interval_months,
+            'day_of_month': self.day_of_month,
+            'start_date': self.start_date.isoformat(),
+            'end_date': self.end_date.isoformat() if self.end_date else None,
+            'next_run': self.next_run.isoformat(),
+            'is_active': self.is_active,
+            'created_at': self.created_at.isoformat()
+        }
+
+
+class Budget(db.Model):
+    """A monthly spending limit for one category; see ``budgets.py``."""
+    __tablename__ = 'budgets'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    category = db.Column(db.Enum(CategoryEnum), primary_key=True)
+    amount_minor = db.Column(db.BigInteger, nullable=False)
+    currency = db.Column(db.String(3), nullable=False, default=money.LEGACY_CURRENCY,
+                         server_default=money.LEGACY_CURRENCY)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'category': self.category.name,
+            'amount': money.to_major(self.amount_minor, self.currency),
+            'currency': self.currency,
+            'updated_at': self.updated_at.isoformat()
+        }
+
+
+class BudgetAlert(db.Model):
+    """A stored notification that a month's spend crossed a budget threshold."""
+    __tablename__ = 'budget_alerts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    category = db.Column(db.Enum(CategoryEnum), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    threshold = db.Column(db.Float, nullable=False)  # fraction of the budget, e.g. 0.8
+    # Major units of ``currency``, the budget's currency; spend in other
+    # currencies is converted at the time of the alert.
+    spent = db.Column(db.Float, nullable=False)
+    budget = db.Column(db.Float, nullable=False)
+    currency = db.Column(db.String(3), nullable=False, default=money.LEGACY_CURRENCY,
+                         server_default=money.LEGACY_CURRENCY)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    read_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # Each threshold alerts once per category and month.
+        db.Index('ux_budget_alerts_crossing', user_id, category, month, threshold, unique=True),
+        db.Index('ix_budget_alerts_user_id', user_id, id),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'category': self.category.name,
+            'month': self.month,
+            'threshold': self.threshold,
+            'spent': self.spent,
+            'budget': self.budget,
+            'currency': self.currency,
+            'created_at': self.created_at.isoformat(),
+            'read_at': self.read_at.isoformat() if self.read_at else None
+        }
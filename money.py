@@ -0,0 +1,67 @@
+"""Exact money: integer minor units plus an ISO 4217 currency code.
+
+Amounts are stored and summed as integers in the currency's minor unit
+(cents for USD, yen for JPY). ``amount`` in the API stays a decimal number
+in major units; it is parsed with ``to_minor`` and rendered with
+``to_major`` or, in SQL, ``amount_expression``. Conversion between
+currencies lives in ``fx.py``.
+"""
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import Float, case, cast
+
+# Supported currencies and their minor-unit exponents (ISO 4217).
+CURRENCY_EXPONENTS = {
+    'AUD': 2, 'BHD': 3, 'BRL': 2, 'CAD': 2, 'CHF': 2, 'CNY': 2, 'CZK': 2, 'DKK': 2, 'EUR': 2, 'GBP': 2,
+    'HKD': 2, 'HUF': 2, 'IDR': 2, 'ILS': 2, 'INR': 2, 'ISK': 0, 'JPY': 0, 'KRW': 0, 'KWD': 3, 'MXN': 2,
+    'MYR': 2, 'NOK': 2, 'NZD': 2, 'PHP': 2, 'PLN': 2, 'RON': 2, 'SEK': 2, 'SGD': 2, 'THB': 2, 'TRY': 2,
+    'USD': 2, 'ZAR': 2,
+}
+# Existing rows (stored as dollars before amounts had a currency) are USD.
+LEGACY_CURRENCY = 'USD'
+
+
+def exponent(currency):
+    return CURRENCY_EXPONENTS[currency]
+
+
+def parse_currency(value):
+    """Parse a currency code; returns ``(code, error_message)``."""
+    code = str(value or '').strip().upper()
+    if code not in CURRENCY_EXPONENTS:
+        return None, f'Invalid currency! Supported currencies are: {sorted(CURRENCY_EXPONENTS)}'
+    return code, None
+
+
+def parse_decimal(value):
+    """Parse a major-unit amount (number or string); raises ``ValueError`` unless finite."""
+    try:
+        # str() first: a float's shortest repr is the decimal the client sent.
+        amount = Decimal(str(value).strip())
+    except (InvalidOperation, TypeError) as exc:
+        raise ValueError('not a number') from exc
+    if not amount.is_finite():
+        raise ValueError('not a number')
+    return amount
+
+
+def to_minor(value, currency):
+    """Convert a major-unit amount to minor units of ``currency``.
+
+    Raises ``ValueError`` when ``value`` is not a finite number or has more
+    decimal places than ``currency`` allows: nothing is rounded.
+    """
+    minor = parse_decimal(value).scaleb(exponent(currency))
+    if minor != minor.to_integral_value():
+        raise ValueError(f'{currency} amounts have at most {exponent(currency)} decimal places')
+    return int(minor)
+
+
+def to_major(minor, currency):
+    return minor / 10 ** exponent(currency)
+
+
+def amount_expression(minor_column, currency_column):
+    """SQL for the major-unit amount of a (minor units, currency) column pair."""
+    divisors = {code: 10 ** digits for code, digits in CURRENCY_EXPONENTS.items() if digits != 2}
+    return cast(minor_column, Float) / case(divisors, value=currency_column, else_=100)
@@ -0,0 +1,128 @@
+"""Bounded worker pool for bcrypt hashing and verification.
+
+bcrypt is deliberately slow. Run inline on request threads, a burst of
+logins occupies every worker and starves cheap requests. Here the work runs
+on a fixed number of threads (bcrypt releases the GIL), at most
+``PASSWORD_POOL_MAX_QUEUE`` calls may wait for one, and anything beyond that
+is rejected immediately with ``PoolSaturated``.
+
+The models import this module, so bcrypt itself is imported by the first
+hash or check rather than at start-up.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app, has_app_context
+
+from middlewares.metrics_middleware import timed
+
+
+class PoolSaturated(Exception):
+    """Raised when the password pool cannot take or finish more work in time."""
+
+    def __init__(self, retry_after=1):
+        super().__init__('password hashing pool is saturated')
+        self.retry_after = retry_after
+
+
+class PasswordPool:
+    def __init__(self, workers, max_queue, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PoolSaturated()
+        try:
+            future = self._executor.submit(fn, *args)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        # The slot is held until the work really finishes, even if the caller gave up.
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args):
+        future = self._submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise PoolSaturated() from None
+
+    async def run_async(self, fn, *args):
+        """Like ``run``, but waits without blocking the event loop."""
+        future = self._submit(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise PoolSaturated() from None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_pool():
+    """Return the current app's pool, or ``None`` when hashing runs inline."""
+    if not has_app_context():
+        return None
+    pool = current_app.extensions.get('password_pool')
+    if pool is None:
+        workers = current_app.config['PASSWORD_POOL_WORKERS']
+        if workers <= 0:
+            return None
+        pool = current_app.extensions.setdefault('password_pool', PasswordPool(
+            workers,
+            current_app.config['PASSWORD_POOL_MAX_QUEUE'],
+            current_app.config['PASSWORD_POOL_TIMEOUT'],
+        ))
+    return pool
+
+
+def _rounds():
+    if has_app_context():
+        return current_app.config['BCRYPT_ROUNDS']
+    return int(os.environ.get('BCRYPT_ROUNDS', 12))
+
+
+def _hash(password_bytes, rounds):
+    import bcrypt
+
+    return bcrypt.hashpw(password_bytes, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password_bytes, hash_bytes):
+    import bcrypt
+
+    return bcrypt.checkpw(password_bytes, hash_bytes)
+
+
+def hash_password(password):
+    pool = get_pool()
+    args = (password.encode('utf-8'), _rounds())
+    with timed('bcrypt'):
+        return pool.run(_hash, *args) if pool else _hash(*args)
+
+
+def check_password(password, password_hash):
+    pool = get_pool()
+    args = (password.encode('utf-8'), password_hash.encode('utf-8'))
+    with timed('bcrypt'):
+        return pool.run(_check, *args) if pool else _check(*args)
+
+
+async def hash_password_async(password):
+    pool = get_pool()
+    args = (password.encode('utf-8'), _rounds())
+    with timed('bcrypt'):
+        return await (pool.run_async(_hash, *args) if pool else asyncio.to_thread(_hash, *args))
+
+
+async def check_password_async(password, password_hash):
+    pool = get_pool()
+    args = (password.encode('utf-8'), password_hash.encode('utf-8'))
+    with timed('bcrypt'):
+        return await (pool.run_async(_check, *args) if pool else asyncio.to_thread(_check, *args))
@@ -0,0 +1,214 @@
+"""Materializes recurring expense rules into ``expenses``.
+
+A rule's ``next_run`` is the date of its first occurrence that has not been
+written yet. ``run_due`` picks up rules whose ``next_run`` has passed and,
+for a batch of them, writes every missed occurrence in one transaction: one
+executemany INSERT, then the usual rollup / budget / ETag / change log
+bookkeeping per user. After downtime a rule's whole backlog is written at
+once.
+
+Several workers (gunicorn processes, a cron job) may run this at the same
+time. Each worker claims a rule by moving its ``next_run`` forward with a
+compare-and-set ``UPDATE ... WHERE next_run = <value it read>``; a worker
+that loses the race skips the rule. The unique index on
+``(recurring_rule_id, date)`` is the second line of defence: inserts use
+``ON CONFLICT DO NOTHING``, so an occurrence is never written twice.
+
+``RecurringScheduler`` runs ``run_due`` every ``RECURRING_INTERVAL``
+seconds on a daemon thread in each worker process.
+"""
+import logging
+import os
+import threading
+from calendar import monthrange
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+import budgets
+import changes
+import etags
+import rollups
+from models import db, Expense, RecurringRule
+
+logger = logging.getLogger(__name__)
+
+_INSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+# Occurrences written per rule per pass; a longer backlog continues on the next pass.
+MAX_CATCH_UP = 1000
+
+
+def occurrence_in(year, month, day_of_month, time_of):
+    """The occurrence in ``year``-``month``, clamped to the month's last day."""
+    day = min(day_of_month, monthrange(year, month)[1])
+    return time_of.replace(year=year, month=month, day=day)
+
+
+def add_months(value, months, day_of_month):
+    index = value.year * 12 + value.month - 1 + months
+    return occurrence_in(index // 12, index % 12 + 1, day_of_month, value)
+
+
+def first_occurrence(start_date, day_of_month, interval_months):
+    """The first occurrence on or after ``start_date``."""
+    candidate = occurrence_in(start_date.year, start_date.month, day_of_month, start_date)
+    if candidate < start_date:
+        candidate = add_months(candidate, interval_months, day_of_month)
+    return candidate
+
+
+def due_dates(rule, now):
+    """``(dates, next_run)``: the occurrences of ``rule`` up to ``now`` and the one after them."""
+    dates = []
+    current = rule.next_run
+    while current <= now and (rule.end_date is None or current <= rule.end_date) and len(dates) < MAX_CATCH_UP:
+        dates.append(current)
+        current = add_months(current, rule.interval_months, rule.day_of_month)
+    return dates, current
+
+
+def _insert_ignoring_duplicates(session):
+    make_insert = _INSERT_DIALECTS.get(session.get_bind().dialect.name)
+    if make_insert is None:
+        return insert(Expense.__table__)
+    return make_insert(Expense.__table__).on_conflict_do_nothing(
+        index_elements=['recurring_rule_id', 'date']
+    )
+
+
+def run_due(session, now=None, limit=200, rule_ids=None):
+    """Materialize up to ``limit`` due rules in one transaction.
+
+    Returns ``(rules, written)``: how many due rules were found and how
+    many expenses were inserted.
+    """
+    now = now or datetime.utcnow()
+    rules_table = RecurringRule.__table__
+    query = (
+        select(rules_table)
+        .where(rules_table.c.is_active.is_(True), rules_table.c.next_run <= now)
+        .order_by(rules_table.c.next_run)
+        .limit(limit)
+    )
+    if rule_ids is not None:
+        query = query.where(rules_table.c.id.in_(rule_ids))
+    rules = session.execute(query).all()
+    if not rules:
+        return 0, 0
+
+    rows = []
+    for rule in rules:
+        dates, next_run = due_dates(rule, now)
+        finished = rule.end_date is not None and next_run > rule.end_date
+        claimed = session.execute(
+            update(rules_table)
+            .where(rules_table.c.id == rule.id, rules_table.c.next_run == rule.next_run)
+            .values(next_run=next_run, is_active=not finished)
+        ).rowcount
+        if not claimed:
+            continue  # another worker got there first
+        rows.extend({
+            'title': rule.title,
+            'amount_minor': rule.amount_minor,
+            'currency': rule.currency,
+            'category': rule.category,
+            'date': when,
+            'description': rule.description,
+            'user_id': rule.user_id,
+            'recurring_rule_id': rule.id,
+            'created_at': now,
+            'updated_at': now,
+        } for when in dates)
+
+    inserted = []
+    if rows:
+        table = Expense.__table__
+        inserted = session.execute(
+            _insert_ignoring_duplicates(session).returning(
+                table.c.id, table.c.user_id, table.c.category, table.c.date, table.c.currency, table.c.amount_minor
+            ),
+            rows
+        ).all()
+
+    by_user = {}
+    for row in inserted:
+        by_user.setdefault(row.user_id, []).append(row)
+    for user_id, user_rows in by_user.items():
+        rollups.add_many(session, user_id, [(row.category, row.date, row.currency, row.amount_minor) for row in user_rows])
+        budgets.check(session, user_id, {rollups.bucket_of(row.category, row.date) for row in user_rows})
+        etags.bump(session, user_id)
+        changes.record(session, user_id, [row.id for row in user_rows])
+    session.commit()
+    return len(rules), len(inserted)
+
+
+def run_all_due(session, now=None, limit=200):
+    """Call ``run_due`` until nothing is due; returns the number of expenses written."""
+    now = now or datetime.utcnow()
+    total = 0
+    while True:
+        rules, written = run_due(session, now, limit)
+        total += written
+        if not rules:
+            return total
+
+
+class RecurringScheduler:
+    """Runs ``run_all_due`` every ``interval`` seconds on a daemon thread.
+
+    ``ensure_started`` is cheap and is called on every request: the thread
+    is started lazily in each process, so it also runs in workers forked
+    from a preloaded master (threads do not survive ``fork``).
+    """
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            threading.Thread(target=self._run, args=(self._stop,), name='recurring-scheduler', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, stop):
+        while True:
+            self.tick()
+            if stop.wait(self.interval):
+                return
+
+    def tick(self):
+        with self.app.app_context():
+            try:
+                written = run_all_due(db.session, limit=self.app.config['RECURRING_BATCH_SIZE'])
+                if written:
+                    logger.info('materialized %d recurring expense(s)', written)
+            except Exception:
+                db.session.rollback()
+                logger.exception('recurring expense run failed')
+            finally:
+                db.session.remove()
+
+
+def init_recurring(app):
+    """Start the scheduler lazily on the first request of each process."""
+    if not app.config.get('RECURRING_SCHEDULER_ENABLED', True):
+        return
+    scheduler = RecurringScheduler(app, app.config['RECURRING_INTERVAL'])
+    app.extensions['recurring_scheduler'] = scheduler
+
+    @app.before_request
+    def start_recurring_scheduler():
+        scheduler.ensure_started()
@@ -0,0 +1,236 @@
+"""Read-replica routing for GET handlers.
+
+Replicas are ordinary Flask-SQLAlchemy binds listed in ``READ_REPLICA_BINDS``.
+Handlers decorated with ``@read_replica`` (below ``@token_required``) run
+their queries on a healthy replica. Everything else, including the auth
+user lookup, goes to the primary.
+
+* Health and lag: each replica is checked at most every
+  ``REPLICA_HEALTH_INTERVAL`` seconds. Lag is the age of the oldest
+  ``expense_changes`` entry the primary has and the replica has not seen.
+  A replica that fails the check, or lags by more than
+  ``REPLICA_MAX_LAG_SECONDS``, is skipped. With no usable replica, reads
+  fall back to the primary.
+* Read-after-write: a response to a request that wrote carries the
+  primary's latest ``expense_changes`` sequence number, as the
+  ``write_watermark`` cookie and the ``X-Write-Watermark`` header. A request
+  that sends it back (either one) only reads from a replica that had
+  reached that sequence number at its last check, whichever worker or host
+  serves it. Within one process, a user who wrote after a replica's
+  ``current_as_of`` (the time it was checked minus its lag) also reads from
+  the primary, watermark or not. Any commit that ran DML counts as a write,
+  ORM flushes and Core ``insert``/``update``/``delete`` alike.
+
+For local testing, two SQLite files can stand in for primary and replica;
+``flask replica-sync`` copies the primary into each SQLite replica.
+"""
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, func, select
+
+from cache import TTLCache
+
+WATERMARK_COOKIE = 'write_watermark'
+WATERMARK_HEADER = 'X-Write-Watermark'
+
+
+class RoutingSession(Session):
+    """``db.session`` class that sends reads in ``@read_replica`` handlers to a replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and g.get('read_replica'):
+            engine = choose_replica()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _note_write(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _note_statement(orm_execute_state):
+    # Core DML through session.execute never flushes; text() counts too.
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(session):
+    if session.info.pop('wrote', False) and has_request_context():
+        g.replica_wrote = True
+        user = g.get('current_user')
+        if user is not None:
+            get_monitor().last_writes.set(user.id, time.time())
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(session):
+    session.info.pop('wrote', None)
+
+
+class ReplicaMonitor:
+    def __init__(self, config):
+        self.binds = list(config.get('READ_REPLICA_BINDS') or [])
+        self.interval = config.get('REPLICA_HEALTH_INTERVAL', 5)
+        self.max_lag = config.get('REPLICA_MAX_LAG_SECONDS', 5)
+        self.status = {}  # bind -> (checked_at, healthy, lag_seconds, current_as_of, seq)
+        # A usable replica is current as of at most interval + max_lag seconds
+        # ago; older writes no longer rule one out.
+        self.last_writes = TTLCache(100_000, max(self.interval + self.max_lag, 1))
+        self._lock = threading.Lock()
+
+    def check(self, db, bind):
+        from models import ExpenseChange
+
+        table = ExpenseChange.__table__
+        try:
+            with db.engines[bind].connect() as replica:
+                replica_seq = replica.execute(select(func.max(table.c.seq))).scalar() or 0
+            with db.engines[None].connect() as primary:
+                oldest_missing = primary.execute(
+                    select(func.min(table.c.changed_at)).where(table.c.seq > replica_seq)
+                ).scalar()
+        except Exception:
+            current_app.logger.warning('read replica %s failed its health check', bind, exc_info=True)
+            return False, None, 0
+        if oldest_missing is None:
+            return True, 0.0, replica_seq
+        return True, max(0.0, (datetime.utcnow() - oldest_missing).total_seconds()), replica_seq
+
+    def usable(self, db):
+        """Return ``[(bind, current_as_of, seq)]`` for healthy replicas within the lag budget.
+
+        ``current_as_of`` is a ``time.time()`` before which the replica had
+        every change: the start of its last check minus its lag. ``seq`` is
+        the latest ``expense_changes`` entry it had then.
+        """
+        now = time.monotonic()
+        stale = [bind for bind in self.binds
+                 if now - self.status.get(bind, (float('-inf'),))[0] >= self.interval]
+        if stale and self._lock.acquire(blocking=False):
+            # One thread refreshes; the others use the previous status meanwhile.
+            try:
+                for bind in stale:
+                    started = time.time()
+                    healthy, lag, seq = self.check(db, bind)
+                    current_as_of = started - lag if healthy else None
+                    self.status[bind] = (time.monotonic(), healthy, lag, current_as_of, seq)
+            finally:
+                self._lock.release()
+        return [
+            (bind, current_as_of, seq) for bind, (_, healthy, lag, current_as_of, seq) in self.status.items()
+            if healthy and lag is not None and lag <= self.max_lag
+        ]
+
+
+def get_monitor():
+    monitor = current_app.extensions.get('replica_monitor')
+    if monitor is None:
+        monitor = current_app.extensions.setdefault('replica_monitor', ReplicaMonitor(current_app.config))
+    return monitor
+
+
+def choose_replica():
+    """Return the engine for this request's reads, or ``None`` for the primary."""
+    if not has_app_context():
+        return None
+    if 'replica_engine' in g:
+        return g.replica_engine
+
+    from models import db
+
+    engine = None
+    monitor = get_monitor()
+    if monitor.binds:
+        candidates = monitor.usable(db)
+        watermark = request_watermark()
+        if watermark:
+            candidates = [candidate for candidate in candidates if candidate[2] >= watermark]
+        user = g.get('current_user')
+        last_write = monitor.last_writes.get(user.id) if user is not None else None
+        if last_write is not None:
+            candidates = [candidate for candidate in candidates if candidate[1] > last_write]
+        if candidates:
+            engine = db.engines[random.choice(candidates)[0]]
+    # Keep one engine for the whole request so its reads are consistent.
+    g.replica_engine = engine
+    return engine
+
+
+def request_watermark():
+    """The write watermark the client sent back, or 0."""
+    if not has_request_context():
+        return 0
+
+    import changes
+
+    try:
+        return changes.decode_watermark(
+            request.headers.get(WATERMARK_HEADER) or request.cookies.get(WATERMARK_COOKIE))
+    except ValueError:
+        return 0
+
+
+def init_replicas(app):
+    """Hand the write watermark to clients of an app with read replicas."""
+    if not app.config.get('READ_REPLICA_BINDS'):
+        return
+
+    import changes
+    from models import ExpenseChange, db
+
+    @app.after_request
+    def set_watermark(response):
+        if not g.pop('replica_wrote', False):
+            return response
+        with db.engines[None].connect() as primary:
+            seq = primary.execute(select(func.max(ExpenseChange.__table__.c.seq))).scalar() or 0
+        token = changes.encode_watermark(seq)
+        response.set_cookie(WATERMARK_COOKIE, token, httponly=True, samesite='Lax')
+        response.headers[WATERMARK_HEADER] = token
+        return response
+
+
+def read_replica(f):
+    """Run the handler's queries on a read replica when one is usable."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        g.read_replica = True
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.read_replica = False
+    return decorated
+
+
+def sync_sqlite_replicas(app):
+    """Copy a SQLite primary into every SQLite replica (a local replication stand-in)."""
+    from models import db
+
+    copied = []
+    with app.app_context():
+        primary = db.engines[None]
+        for bind in get_monitor().binds:
+            replica = db.engines[bind]
+            if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+                continue
+            source = sqlite3.connect(primary.url.database)
+            target = sqlite3.connect(replica.url.database)
+            try:
+                source.backup(target)
+            finally:
+                source.close()
+                target.close()
+            replica.dispose()
+            copied.append(bind)
+    return copied
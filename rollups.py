@@ -0,0 +1,212 @@
+"""Incrementally maintained ``expense_rollups`` table.
+
+Every write path calls into this module inside its own transaction, after
+flushing the expense change:
+
+* ``add`` for a new expense: an upsert that bumps total/count/min/max.
+* ``refresh`` for updates and deletes: the touched (category, month)
+  buckets are recomputed from ``expenses``, in every currency. A decrement
+  cannot restore a min/max, and recomputing one bucket is an index range
+  scan over a single month of a single category.
+
+Each currency has its own row in a bucket, with amounts in integer minor
+units, so the totals stay exact; summaries convert them (see
+``aggregations.fold_currencies``).
+
+``rebuild`` and ``verify`` recompute everything from ``expenses`` to repair
+or detect drift.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, delete, func, insert, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from aggregations import bucket_expression
+from models import Expense, ExpenseRollup
+
+_UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def month_key(value):
+    return value.strftime('%Y-%m')
+
+
+def bucket_of(category, value):
+    return category, month_key(value)
+
+
+def month_bounds(month):
+    start = datetime.strptime(month, '%Y-%m')
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+
+def _dialect_name(executor):
+    bind = executor.get_bind() if hasattr(executor, 'get_bind') else executor
+    return bind.dialect.name
+
+
+def add(session, user_id, category, value, currency, amount_minor):
+    """Fold one new expense into its bucket."""
+    add_many(session, user_id, [(category, value, currency, amount_minor)])
+
+
+def add_many(session, user_id, expenses):
+    """Fold new ``(category, date, currency, amount_minor)`` expenses in, one upsert per bucket."""
+    buckets = {}
+    for category, value, currency, amount in expenses:
+        key = (*bucket_of(category, value), currency)
+        bucket = buckets.get(key)
+        if bucket is None:
+            buckets[key] = [amount, 1, amount, amount]
+        else:
+            bucket[0] += amount
+            bucket[1] += 1
+            bucket[2] = min(bucket[2], amount)
+            bucket[3] = max(bucket[3], amount)
+    if not buckets:
+        return
+
+    dialect_name = _dialect_name(session)
+    make_insert = _UPSERT_DIALECTS.get(dialect_name)
+    if make_insert is None:
+        # No native upsert: recompute the buckets instead.
+        refresh(session, user_id, {(category, month) for category, month, _ in buckets})
+        return
+
+    rollups = ExpenseRollup.__table__
+    least = func.least if dialect_name == 'postgresql' else func.min
+    greatest = func.greatest if dialect_name == 'postgresql' else func.max
+    stmt = make_insert(rollups)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[rollups.c.user_id, rollups.c.category, rollups.c.month, rollups.c.currency],
+        set_={
+            'total': rollups.c.total + stmt.excluded.total,
+            'count': rollups.c.count + stmt.excluded.count,
+            'min_amount': least(func.coalesce(rollups.c.min_amount, stmt.excluded.min_amount), stmt.excluded.min_amount),
+            'max_amount': greatest(func.coalesce(rollups.c.max_amount, stmt.excluded.max_amount), stmt.excluded.max_amount),
+        }
+    )
+    session.execute(stmt, [
+        {
+            'user_id': user_id,
+            'category': category,
+            'month': month,
+            'currency': currency,
+            'total': total,
+            'count': count,
+            'min_amount': low,
+            'max_amount': high,
+        }
+        for (category, month, currency), (total, count, low, high) in buckets.items()
+    ])
+
+
+def _bucket_select(dialect_name, filters):
+    month = bucket_expression('month', dialect_name=dialect_name)
+    return (
+        select(
+            Expense.user_id,
+            Expense.category,
+            month.label('month'),
+            Expense.currency,
+            func.sum(Expense.amount_minor),
+            func.count(Expense.id),
+            func.min(Expense.amount_minor),
+            func.max(Expense.amount_minor),
+        )
+        .where(*filters)
+        .group_by(Expense.user_id, Expense.category, month, Expense.currency)
+    )
+
+
+_ROLLUP_COLUMNS = ['user_id', 'category', 'month', 'currency', 'total', 'count', 'min_amount', 'max_amount']
+
+
+def refresh(session, user_id, buckets):
+    """Recompute the given ``(category, month)`` buckets for one user."""
+    rollups = ExpenseRollup.__table__
+    dialect_name = _dialect_name(session)
+    for category, month in set(buckets):
+        start, end = month_bounds(month)
+        session.execute(delete(rollups).where(and_(
+            rollups.c.user_id == user_id,
+            rollups.c.category == category,
+            rollups.c.month == month,
+        )))
+        session.execute(insert(rollups).from_select(_ROLLUP_COLUMNS, _bucket_select(dialect_name, [
+            Expense.user_id == user_id,
+            Expense.category == category,
+            Expense.date >= start,
+            Expense.date < end,
+        ])))
+
+
+def rebuild(session, user_id=None):
+    """Recompute all buckets (for one user, or everyone) from ``expenses``."""
+    rollups = ExpenseRollup.__table__
+    dialect_name = _dialect_name(session)
+    if user_id is None:
+        session.execute(delete(rollups))
+        filters = []
+    else:
+        session.execute(delete(rollups).where(rollups.c.user_id == user_id))
+        filters = [Expense.user_id == user_id]
+    session.execute(insert(rollups).from_select(_ROLLUP_COLUMNS, _bucket_select(dialect_name, filters)))
+
+
+def verify(session, user_id=None):
+    """Return a list of buckets whose stored rollup differs from ``expenses``."""
+    rollups = ExpenseRollup.__table__
+    filters = [] if user_id is None else [Expense.user_id == user_id]
+    expected = {
+        tuple(row[:4]): tuple(row[4:])
+        for row in session.execute(_bucket_select(_dialect_name(session), filters))
+    }
+
+    stored_query = select(*[rollups.c[name] for name in _ROLLUP_COLUMNS])
+    if user_id is not None:
+        stored_query = stored_query.where(rollups.c.user_id == user_id)
+    stored = {tuple(row[:4]): tuple(row[4:]) for row in session.execute(stored_query)}
+
+    # Minor units are integers: any difference is drift.
+    drift = []
+    for key in expected.keys() | stored.keys():
+        if expected.get(key) != stored.get(key):
+            user, category, month, currency = key
+            drift.append({
+                'user_id': user,
+                'category': category.name if hasattr(category, 'name') else category,
+                'month': month,
+                'currency': currency,
+                'expected': expected.get(key),
+                'stored': stored.get(key),
+            })
+    return drift
+
+
+def summarize(session, user_id, group_by):
+    """Read grouped totals from the rollup table; ``group_by`` ⊆ {category, month}.
+
+    Rows are per currency, in minor units, shaped like the raw summary query
+    so both can go through ``aggregations.fold_currencies``.
+    """
+    rollups = ExpenseRollup.__table__
+    keys = [rollups.c[key] for key in group_by] + [rollups.c.currency]
+    query = (
+        select(
+            *keys,
+            literal(None).label('fx_day'),
+            func.sum(rollups.c.total).label('total'),
+            func.sum(rollups.c.count).label('count'),
+            func.min(rollups.c.min_amount).label('min'),
+            func.max(rollups.c.max_amount).label('max'),
+        )
+        .where(rollups.c.user_id == user_id)
+        .group_by(*keys)
+        .order_by(*keys)
+    )
+    return session.execute(query).all()
@@ -0,0 +1,112 @@
+"""Full-text search over expense titles and descriptions (``?q=``).
+
+* SQLite: an FTS5 table ``expenses_fts`` with ``expenses`` as its external
+  content, kept in sync by triggers, so every write path (ORM, bulk
+  ``executemany``, hand edits) updates it in the same transaction. Ranked by
+  BM25 with title matches weighted ``TITLE_WEIGHT`` times higher.
+* PostgreSQL: a stored generated ``tsvector`` column ``search_vector``
+  with a GIN index, ranked by ``ts_rank_cd``.
+* Any other database: an unindexed, case-insensitive ``LIKE`` scan, ranked
+  by the number of terms found in the title.
+
+Search terms are reduced to word tokens and each is matched as a prefix,
+all of them required: ``q=amaz ord`` finds "Amazon order". Users cannot
+inject operators into the MATCH/tsquery syntax.
+
+Results are ordered by ``rank DESC, id DESC`` (higher rank is better on
+both backends) and paged with a keyset cursor on that pair. Ranks depend
+on corpus statistics, so a page boundary can shift slightly when other
+rows are written between requests.
+"""
+import re
+
+from sqlalchemy import and_, case, column, func, literal_column, or_, table, text
+
+from models import db, Expense
+
+TITLE_WEIGHT = 10.0
+MAX_TERMS = 16
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+expenses_fts = table('expenses_fts', column('rowid'))
+
+_SQLITE_DDL = [
+    # remove_diacritics 2 lets "cafe" match "café".
+    "CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5("
+    "title, description, content='expenses', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN "
+    "INSERT INTO expenses_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN "
+    "INSERT INTO expenses_fts(expenses_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF title, description ON expenses BEGIN "
+    "INSERT INTO expenses_fts(expenses_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO expenses_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+]
+
+_POSTGRESQL_DDL = [
+    "ALTER TABLE expenses ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_expenses_search ON expenses USING gin (search_vector)",
+]
+
+
+def install(connection):
+    """Create the index (and its sync triggers) and fill it from ``expenses``."""
+    dialect_name = connection.dialect.name
+    if dialect_name == 'sqlite':
+        for statement in _SQLITE_DDL:
+            connection.exec_driver_sql(statement)
+        rebuild(connection)
+    elif dialect_name == 'postgresql':
+        # The generated column is computed for existing rows by the ALTER itself.
+        for statement in _POSTGRESQL_DDL:
+            connection.exec_driver_sql(statement)
+
+
+def rebuild(connection):
+    """Re-index every expense (SQLite; PostgreSQL's generated column needs no rebuild)."""
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("INSERT INTO expenses_fts(expenses_fts) VALUES ('rebuild')"))
+
+
+def terms(q):
+    """The word tokens of a ``q`` value (at most ``MAX_TERMS``)."""
+    return _TOKEN.findall(q or '')[:MAX_TERMS]
+
+
+def apply(query, q, dialect_name=None):
+    """Restrict ``query`` to expenses matching ``q``; returns ``(query, rank)``.
+
+    ``rank`` is a column expression to select and order by (higher is better).
+    ``q`` must contain at least one term (see ``terms``).
+    """
+    words = terms(q)
+    dialect_name = dialect_name or db.engine.dialect.name
+    if dialect_name == 'sqlite':
+        fts = literal_column('expenses_fts')
+        match = ' '.join(f'"{word}"*' for word in words)
+        rank = (-func.bm25(fts, TITLE_WEIGHT, 1.0)).label('rank')
+        query = query.join(expenses_fts, expenses_fts.c.rowid == Expense.id).filter(fts.op('MATCH')(match))
+    elif dialect_name == 'postgresql':
+        vector = literal_column('expenses.search_vector')
+        tsquery = func.to_tsquery('simple', ' & '.join(f'{word}:*' for word in words))
+        rank = func.ts_rank_cd(vector, tsquery).label('rank')
+        query = query.filter(vector.op('@@')(tsquery))
+    else:
+        title, description = func.lower(Expense.title), func.lower(func.coalesce(Expense.description, ''))
+        in_title = [title.contains(word.lower(), autoescape=True) for word in words]
+        rank = sum(case((match, 1), else_=0) for match in in_title).label('rank')
+        query = query.filter(and_(*[
+            or_(match, description.contains(word.lower(), autoescape=True)) for match, word in zip(in_title, words)
+        ]))
+    return query, rank
+
+
+def after_position(query, rank, position):
+    # Keyset condition for ORDER BY rank DESC, id DESC.
+    position_rank, position_id = position
+    return query.filter(or_(rank < position_rank, and_(rank == position_rank, Expense.id < position_id)))
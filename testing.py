@@ -0,0 +1,63 @@
+"""Lightweight apps for tests and benchmarks.
+
+``create_test_app`` builds the app on ``TestingConfig``: a private in-memory
+SQLite database, created straight from the models (see
+``migrations.bootstrap``), with cheap bcrypt and no background threads.
+
+``rolled_back`` isolates one test from the next without recreating the
+schema. Every session of the app joins one outer transaction on the shared
+connection, each ``commit()`` only releases a SAVEPOINT, and the outer
+transaction is rolled back at the end::
+
+    app = create_test_app()
+    with rolled_back(app):
+        client = app.test_client()
+        client.post('/api/auth/register', json={...})
+    # the user is gone again
+"""
+from contextlib import contextmanager
+
+from app import create_app
+from config import TestingConfig
+from models import db
+
+
+def create_test_app(**overrides):
+    """Return an app on ``TestingConfig``, with keyword arguments overriding config keys."""
+    config = type('TestConfig', (TestingConfig,), overrides) if overrides else TestingConfig
+    return create_app(config)
+
+
+@contextmanager
+def rolled_back(app):
+    """Undo every database write ``app`` makes inside the block; yields the connection.
+
+    Only the default bind is covered. The async engine of ``asgi_app`` opens
+    its own connections and is not.
+    """
+    with app.app_context():
+        engines = db.engines
+        engine = engines[None]
+        db.session.remove()
+
+    connection = engine.connect()
+    session_options = db.session.session_factory.kw
+    saved_options = dict(session_options)
+    try:
+        outer = connection.begin()
+        # Sessions look their bind up in ``db.engines``; a Connection works there too.
+        engines[None] = connection
+        session_options['join_transaction_mode'] = 'create_savepoint'
+        yield connection
+    finally:
+        # Undone even when the test failed, so the next one gets the real engine.
+        session_options.clear()
+        session_options.update(saved_options)
+        engines[None] = engine
+        # Cached users and tokens may name rows that no longer exist.
+        app.extensions.pop('auth_cache', None)
+        try:
+            if connection.in_transaction():
+                outer.rollback()
+        finally:
+            connection.close()
@@ -0,0 +1,50 @@
+"""Shared fixtures: one in-memory app per run, every test rolled back.
+
+Run from the repository root with ``python -m pytest``.
+"""
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, delete
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations  # noqa: E402
+from testing import create_test_app, rolled_back  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    return create_test_app()
+
+
+@pytest.fixture
+def client(app):
+    with rolled_back(app):
+        yield app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    client.post('/api/auth/register', json={'username': 'alice', 'email': 'alice@example.com', 'password': 'pw'})
+    token = client.post('/api/auth/login', json={'username': 'alice', 'password': 'pw'}).get_json()['token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    """A database at schema version 9: float ``amount`` columns, no currencies."""
+    engine = create_engine(f'sqlite:///{tmp_path}/legacy.db')
+    migrations.upgrade(engine)
+    with engine.begin() as connection:
+        for table in ('expenses', 'recurring_rules', 'budgets'):
+            connection.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN amount FLOAT')
+            connection.exec_driver_sql(f'ALTER TABLE {table} DROP COLUMN amount_minor')
+            connection.exec_driver_sql(f'ALTER TABLE {table} DROP COLUMN currency')
+        connection.execute(delete(migrations.schema_migrations).where(migrations.schema_migrations.c.version >= 10))
+        connection.exec_driver_sql(
+            "INSERT INTO users (username, email, password_hash, created_at, is_active, expenses_version, base_currency) "
+            "VALUES ('carol', 'carol@example.com', 'x', '2024-01-01', 1, 0, 'USD')")
+    yield engine
+    engine.dispose()
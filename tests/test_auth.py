@@ -0,0 +1,54 @@
+"""Deleting a user revokes their tokens in every worker, stateless mode included."""
+import pytest
+
+from models import db, User
+from testing import create_test_app
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two stateless apps on one SQLite file, standing in for two worker processes."""
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/auth.db',
+        'JWT_STATELESS_AUTH': True,
+        'AUTH_REVOCATION_POLL_INTERVAL': 0,
+    }
+    return create_test_app(**settings), create_test_app(**settings)
+
+
+def login(client):
+    client.post('/api/auth/register', json={'username': 'alice', 'email': 'alice@example.com', 'password': 'pw'})
+    token = client.post('/api/auth/login', json={'username': 'alice', 'password': 'pw'}).get_json()['token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def delete_user(app, username):
+    with app.app_context():
+        db.session.delete(db.session.execute(db.select(User).filter_by(username=username)).scalar_one())
+        db.session.commit()
+
+
+def test_a_deleted_users_token_is_rejected_by_other_workers(workers):
+    first, second = workers
+    headers = login(first.test_client())
+    reader = second.test_client()
+    assert reader.get('/api/expenses/', headers=headers).status_code == 200
+
+    delete_user(first, 'alice')
+    response = reader.get('/api/expenses/', headers=headers)
+    assert response.status_code == 401
+    assert response.get_json()['message'] == 'invalid token'
+
+
+def test_me_answers_401_for_a_user_deleted_before_revocations_are_loaded(workers):
+    first, second = workers
+    headers = login(first.test_client())
+    reader = second.test_client()
+    assert reader.get('/api/auth/me', headers=headers).status_code == 200
+
+    # The second worker has not loaded the revocation yet.
+    second.extensions['auth_cache'].poll_interval = 3600
+    delete_user(first, 'alice')
+    response = reader.get('/api/auth/me', headers=headers)
+    assert response.status_code == 401
+    assert response.get_json()['message'] == 'user not found'
@@ -0,0 +1,95 @@
+"""Amounts in several currencies: conversion, missing rates and migration 10."""
+import pytest
+
+import migrations
+from testing import create_test_app, rolled_back
+
+RATES = 'date,currency,rate\n2026-01-01,USD,1.25\n2026-10-01,USD,1.20\n2026-10-01,JPY,160\n'
+
+
+def add_expense(client, headers, amount, currency, **fields):
+    response = client.post('/api/expenses/', headers=headers, json={
+        'title': 'Lunch', 'amount': amount, 'currency': currency, 'category': 'GROCERIES', **fields,
+    })
+    assert response.status_code == 201, response.get_json()
+
+
+def test_summary_converts_each_currency_at_its_days_rate(tmp_path):
+    rates = tmp_path / 'rates.csv'
+    rates.write_text(RATES)
+    app = create_test_app(FX_RATES_FILE=str(rates))
+    with rolled_back(app):
+        client = app.test_client()
+        client.post('/api/auth/register', json={'username': 'bob', 'email': 'bob@example.com', 'password': 'pw'})
+        token = client.post('/api/auth/login', json={'username': 'bob', 'password': 'pw'}).get_json()['token']
+        headers = {'Authorization': f'Bearer {token}'}
+        add_expense(client, headers, '12', 'USD', date='2026-10-02T12:00:00')
+        # 1600 JPY is 10 EUR, 12 USD at the 2026-10-01 rates.
+        add_expense(client, headers, '1600', 'JPY', date='2026-10-02T12:00:00')
+        # 12.50 USD is 10 EUR at the January rate.
+        add_expense(client, headers, '12.50', 'USD', date='2026-09-30T12:00:00')
+
+        summary = client.get('/api/expenses/summary', headers=headers).get_json()
+        assert summary['currency'] == 'USD'
+        assert summary['totals']['total'] == 36.5
+        assert 'unconverted' not in summary
+        in_euros = client.get('/api/expenses/summary?currency=EUR&group_by=month', headers=headers).get_json()
+        assert [(group['month'], group['total']) for group in in_euros['groups']] == [('2026-09', 10.0), ('2026-10', 20.0)]
+
+
+def test_spend_without_a_rate_is_reported_per_currency(client, auth_headers):
+    assert client.put('/api/budgets/GROCERIES', headers=auth_headers, json={'amount': '100'}).status_code == 200
+    add_expense(client, auth_headers, '10', 'USD')
+    add_expense(client, auth_headers, '1600', 'JPY')
+
+    response = client.get('/api/expenses/summary', headers=auth_headers)
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert summary['totals']['total'] == 10.0
+    assert [(entry['category'], entry['currency'], entry['total']) for entry in summary['unconverted']] == [
+        ('GROCERIES', 'JPY', 1600)]
+
+    response = client.get('/api/budgets/status', headers=auth_headers)
+    assert response.status_code == 200
+    [budget] = response.get_json()['budgets']
+    assert (budget['spent'], budget['unconverted']) == (10.0, {'JPY': 1600})
+
+
+def add_legacy_expenses(engine, *amounts):
+    with engine.begin() as connection:
+        for amount in amounts:
+            connection.exec_driver_sql(
+                'INSERT INTO expenses (title, amount, category, date, user_id, created_at, updated_at) '
+                "VALUES ('Lunch', ?, 'GROCERIES', '2024-01-05', 1, '2024-01-05', '2024-01-05')", (amount,))
+
+
+def rows(engine, sql):
+    with engine.connect() as connection:
+        return connection.exec_driver_sql(sql).all()
+
+
+def test_migration_10_stores_exact_amounts_as_minor_units(legacy_engine, monkeypatch):
+    monkeypatch.delenv('MIGRATE_ROUND_AMOUNTS', raising=False)
+    add_legacy_expenses(legacy_engine, 19.99, 0.1, 100)
+    assert migrations.upgrade(legacy_engine) == list(range(10, migrations.head() + 1))
+    assert rows(legacy_engine, 'SELECT amount_minor, currency FROM expenses ORDER BY id') == [
+        (1999, 'USD'), (10, 'USD'), (10000, 'USD')]
+    assert rows(legacy_engine, 'SELECT total, count FROM expense_rollups') == [(12009, 3)]
+
+
+def test_migration_10_refuses_inexact_amounts_without_changing_anything(legacy_engine, monkeypatch):
+    monkeypatch.delenv('MIGRATE_ROUND_AMOUNTS', raising=False)
+    add_legacy_expenses(legacy_engine, 19.99, 3.333)
+    with pytest.raises(migrations.MigrationError, match='3.333'):
+        migrations.upgrade(legacy_engine)
+    assert rows(legacy_engine, 'SELECT MAX(version) FROM schema_migrations') == [(9,)]
+    assert rows(legacy_engine, 'SELECT amount FROM expenses ORDER BY id') == [(19.99,), (3.333,)]
+
+
+def test_migration_10_keeps_rounded_originals_in_the_audit_table(legacy_engine, monkeypatch):
+    monkeypatch.setenv('MIGRATE_ROUND_AMOUNTS', 'true')
+    add_legacy_expenses(legacy_engine, 19.99, 3.333)
+    assert migrations.upgrade(legacy_engine) == list(range(10, migrations.head() + 1))
+    assert rows(legacy_engine, 'SELECT amount_minor FROM expenses ORDER BY id') == [(1999,), (333,)]
+    assert rows(legacy_engine, 'SELECT table_name, row_key, amount, amount_minor FROM amount_rounding_audit') == [
+        ('expenses', '2', 3.333, 333)]
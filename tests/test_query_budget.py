@@ -0,0 +1,52 @@
+"""Read endpoints run a fixed number of SQL statements, however many rows they return."""
+import pytest
+
+from middlewares.metrics_middleware import count_queries
+
+CATEGORIES = ['GROCERIES', 'LEISURE', 'UTILITIES']
+
+# Statements per request, including the SAVEPOINT and its release or
+# rollback that ``rolled_back`` wraps around each request's session.
+READ_BUDGETS = {
+    '/api/expenses/': 5,
+    '/api/expenses/?layout=columnar&limit=5': 5,
+    '/api/expenses/?q=lunch': 5,
+    '/api/expenses/?filter=three_months': 4,
+    '/api/expenses/summary': 5,
+    '/api/expenses/summary?group_by=category,month': 5,
+    '/api/expenses/summary?group_by=week&currency=USD': 4,
+    '/api/expenses/export?format=csv': 3,
+    '/api/expenses/export?format=ndjson': 3,
+    '/api/expenses/changes': 4,
+}
+
+
+def add_expenses(client, headers, count, offset=0):
+    for i in range(offset, offset + count):
+        response = client.post('/api/expenses/', headers=headers, json={
+            'title': f'lunch {i}',
+            'amount': '12.50',
+            'category': CATEGORIES[i % len(CATEGORIES)],
+            'date': f'2026-{1 + i % 9:02d}-{1 + i % 27:02d}T12:00:00',
+        })
+        assert response.status_code == 201
+
+
+def statements(client, headers, path):
+    with count_queries() as counter:
+        response = client.get(path, headers=headers)
+        # Exports stream; their queries run while the body is read.
+        response.get_data()
+    assert response.status_code == 200, response.get_json()
+    return counter['count']
+
+
+@pytest.mark.parametrize('path', sorted(READ_BUDGETS))
+def test_read_endpoints_stay_within_budget(client, auth_headers, path):
+    add_expenses(client, auth_headers, 3)
+    few = statements(client, auth_headers, path)
+    add_expenses(client, auth_headers, 40, offset=3)
+    many = statements(client, auth_headers, path)
+
+    assert many <= READ_BUDGETS[path]
+    assert many == few, f'{path}: {few} statements for 3 rows but {many} for 43'
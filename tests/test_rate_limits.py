@@ -0,0 +1,67 @@
+"""Token buckets refill at their rate, and a rejected request costs no other bucket anything."""
+import logging
+
+import pytest
+
+from middlewares import rate_limit_middleware
+from middlewares.rate_limit_middleware import MemoryStore, parse_limit, warn_if_per_worker
+from testing import create_test_app
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit_middleware, 'time', clock)
+    return clock
+
+
+def test_a_bucket_refills_at_its_rate(clock):
+    store, limit = MemoryStore(), parse_limit('2/second')
+    assert store.consume('k', limit).allowed
+    assert store.consume('k', limit).allowed
+    rejected = store.consume('k', limit)
+    assert not rejected.allowed
+    assert rejected.retry_after == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert store.consume('k', limit).allowed
+    assert not store.consume('k', limit).allowed
+
+    # Never above capacity, however long the bucket sat idle.
+    clock.now += 60
+    assert store.consume('k', limit).remaining == 1
+
+
+@pytest.fixture
+def limited_app(clock):
+    return create_test_app(RATELIMIT_ENABLED=True, RATE_LIMITS={'auth.login': {'ip': '3/minute', 'login': '1/minute'}})
+
+
+def login(client, username):
+    return client.post('/api/auth/login', json={'username': username, 'password': 'pw'}).status_code
+
+
+def test_a_request_rejected_for_its_login_is_refunded_to_its_ip(limited_app):
+    client = limited_app.test_client()
+    assert login(client, 'alice') == 401
+    # The login bucket rejects; the ip token it took first is given back.
+    assert login(client, 'alice') == 429
+    assert login(client, 'alice') == 429
+    assert login(client, 'bob') == 401
+    assert login(client, 'carol') == 401
+    assert login(client, 'dave') == 429
+
+
+def test_in_memory_buckets_with_several_workers_log_a_warning(limited_app, caplog):
+    with caplog.at_level(logging.WARNING, logger='expense_tracker.ratelimit'):
+        assert not warn_if_per_worker(limited_app, 1)
+        assert warn_if_per_worker(limited_app, 4)
+    assert 'with 4 workers' in caplog.text
@@ -0,0 +1,40 @@
+"""Recurring rules materialize each occurrence exactly once."""
+from datetime import datetime
+
+from models import db, Expense
+
+
+def months_ago(months):
+    now = datetime.utcnow()
+    month = now.month - months
+    year = now.year + (month - 1) // 12
+    return datetime(year, (month - 1) % 12 + 1, 1, 9, 0).isoformat()
+
+
+def create_rule(client, headers, title, start):
+    response = client.post('/api/recurring/', headers=headers, json={
+        'title': title, 'amount': '30', 'category': 'LEISURE', 'start_date': start,
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()
+
+
+def test_a_past_start_date_is_caught_up(client, auth_headers):
+    body = create_rule(client, auth_headers, 'Gym', months_ago(4))
+    assert body['materialized'] == 5
+    expenses = client.get('/api/expenses/', headers=auth_headers).get_json()['expenses']
+    assert [expense['title'] for expense in expenses] == ['Gym'] * 5
+
+
+def test_a_new_rule_is_not_blocked_by_a_deleted_rules_expenses(app, client, auth_headers):
+    gym = create_rule(client, auth_headers, 'Gym', months_ago(4))
+    assert client.delete(f"/api/recurring/{gym['rule']['id']}", headers=auth_headers).status_code == 200
+
+    rent = create_rule(client, auth_headers, 'Rent', months_ago(4))
+    assert rent['materialized'] == 5
+    with app.app_context():
+        titles = [expense.title for expense in db.session.query(Expense).order_by(Expense.id)]
+        detached = db.session.query(Expense).filter(Expense.title == 'Gym', Expense.recurring_rule_id.is_(None)).count()
+    assert titles == ['Gym'] * 5 + ['Rent'] * 5
+    # The deleted rule's expenses are kept, no longer linked to any rule.
+    assert detached == 5
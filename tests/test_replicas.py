@@ -0,0 +1,50 @@
+"""A write is visible to the writer's next read, whichever worker serves it."""
+import sqlite3
+
+import pytest
+
+import replicas
+from testing import create_test_app
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two apps on one SQLite primary and replica, standing in for two worker processes."""
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/primary.db',
+        'SQLALCHEMY_BINDS': {'replica_0': f'sqlite:///{tmp_path}/replica.db'},
+        'READ_REPLICA_BINDS': ['replica_0'],
+        'REPLICA_HEALTH_INTERVAL': 0,
+        'REPLICA_MAX_LAG_SECONDS': 3600,
+    }
+    return create_test_app(**settings), create_test_app(**settings)
+
+
+def titles(response):
+    return [expense['title'] for expense in response.get_json()['expenses']]
+
+
+def test_the_watermark_keeps_a_lagging_replica_out_on_another_worker(workers, tmp_path):
+    writer_app, reader_app = workers
+    writer, reader = writer_app.test_client(), reader_app.test_client()
+    writer.post('/api/auth/register', json={'username': 'alice', 'email': 'alice@example.com', 'password': 'pw'})
+    token = writer.post('/api/auth/login', json={'username': 'alice', 'password': 'pw'}).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    replicas.sync_sqlite_replicas(writer_app)
+
+    created = writer.post('/api/expenses/', headers=headers,
+                          json={'title': 'Lunch', 'amount': '12', 'category': 'GROCERIES'})
+    watermark = created.headers[replicas.WATERMARK_HEADER]
+    assert writer.get_cookie(replicas.WATERMARK_COOKIE).value == watermark
+
+    # Without the watermark the other worker reads the replica, which lacks the write.
+    assert titles(reader.get('/api/expenses/', headers=headers)) == []
+    assert titles(reader.get('/api/expenses/', headers={**headers, replicas.WATERMARK_HEADER: watermark})) == ['Lunch']
+    reader.set_cookie(replicas.WATERMARK_COOKIE, watermark)
+    assert titles(reader.get('/api/expenses/', headers=headers)) == ['Lunch']
+
+    # Once the replica has caught up it serves the watermarked reads again.
+    replicas.sync_sqlite_replicas(writer_app)
+    with sqlite3.connect(tmp_path / 'primary.db') as primary:
+        primary.execute("UPDATE expenses SET title = 'primary only'")
+    assert titles(reader.get('/api/expenses/', headers=headers)) == ['Lunch']
@@ -0,0 +1,97 @@
+"""``expense_rollups`` matches ``expenses`` after every kind of write."""
+import migrations
+import rollups
+from models import db
+
+
+def assert_consistent(app):
+    with app.app_context():
+        assert rollups.verify(db.session) == []
+
+
+def create(client, headers, **fields):
+    body = {'title': 'Lunch', 'amount': '12.50', 'category': 'GROCERIES', 'date': '2026-03-10T12:00:00', **fields}
+    response = client.post('/api/expenses/', headers=headers, json=body)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['expense']['id']
+
+
+def update(client, headers, expense_id, **fields):
+    response = client.put(f'/api/expenses/{expense_id}', headers=headers, json=fields)
+    assert response.status_code == 200, response.get_json()
+
+
+def buckets(app):
+    with app.app_context():
+        return rollups.summarize(db.session, 1, ['category', 'month'])
+
+
+def test_updates_that_move_an_expense_between_buckets(app, client, auth_headers):
+    expense_id = create(client, auth_headers)
+    create(client, auth_headers, amount='3')
+    assert_consistent(app)
+
+    update(client, auth_headers, expense_id, category='LEISURE')
+    assert_consistent(app)
+    update(client, auth_headers, expense_id, date='2026-04-01T00:00:00')
+    assert_consistent(app)
+    update(client, auth_headers, expense_id, currency='EUR')
+    assert_consistent(app)
+    update(client, auth_headers, expense_id, amount='99.99', category='HEALTH', date='2025-12-31T23:59:59')
+    assert_consistent(app)
+    assert len(buckets(app)) == 2
+
+
+def test_deletes_single_and_batch(app, client, auth_headers):
+    ids = [create(client, auth_headers, date=f'2026-0{month}-01T09:00:00') for month in (1, 2, 3)]
+    assert client.delete(f'/api/expenses/{ids[0]}', headers=auth_headers).status_code == 200
+    assert_consistent(app)
+
+    response = client.delete('/api/expenses/batch', headers=auth_headers, json={'ids': ids[1:]})
+    assert response.status_code == 200, response.get_json()
+    assert_consistent(app)
+    assert buckets(app) == []
+
+
+def test_batch_updates_across_currencies_and_categories(app, client, auth_headers):
+    ids = [create(client, auth_headers, amount='12', currency=currency) for currency in ('USD', 'JPY', 'EUR')]
+    response = client.patch('/api/expenses/batch', headers=auth_headers,
+                            json={'ids': ids, 'set': {'category': 'UTILITIES', 'amount': '40'}})
+    assert response.status_code == 200, response.get_json()
+    assert_consistent(app)
+
+    response = client.patch('/api/expenses/batch', headers=auth_headers,
+                            json={'ids': ids[:2], 'set': {'amount': '5', 'currency': 'GBP'}})
+    assert response.status_code == 200, response.get_json()
+    assert_consistent(app)
+
+
+def test_bulk_import(app, client, auth_headers):
+    body = ('title,amount,currency,category,date\n'
+            'a,1.50,,GROCERIES,2026-01-05T00:00:00\n'
+            'b,300,JPY,GROCERIES,2026-01-06T00:00:00\n'
+            'c,7,USD,LEISURE,2026-02-01T00:00:00\n'
+            'd,not a number,USD,LEISURE,2026-02-01T00:00:00\n')
+    response = client.post('/api/expenses/bulk', headers=auth_headers, data=body, content_type='text/csv')
+    assert response.get_json()['inserted'] == 3
+    assert_consistent(app)
+
+
+def test_migration_10_rebuilds_the_rollups(legacy_engine):
+    with legacy_engine.begin() as connection:
+        connection.exec_driver_sql(
+            'INSERT INTO expenses (title, amount, category, date, user_id, created_at, updated_at) '
+            "VALUES ('Lunch', ?, ?, ?, 1, '2024-01-01', '2024-01-01')",
+            [(19.99, 'GROCERIES', '2024-01-05'), (5.0, 'GROCERIES', '2024-01-31'), (12.5, 'LEISURE', '2024-02-01')])
+
+    migrations.upgrade(legacy_engine)
+    with legacy_engine.connect() as connection:
+        assert rollups.verify(connection) == []
+        assert connection.exec_driver_sql(
+            'SELECT category, month, currency, total, count FROM expense_rollups ORDER BY category, month').all() == [
+            ('GROCERIES', '2024-01', 'USD', 2499, 2), ('LEISURE', '2024-02', 'USD', 1250, 1)]
+
+    # A rebuild over the migrated rows changes nothing.
+    with legacy_engine.begin() as connection:
+        rollups.rebuild(connection)
+        assert rollups.verify(connection) == []
@@ -0,0 +1,57 @@
+"""The test app factory and per-test rollback in ``testing.py``."""
+import pytest
+from sqlalchemy.engine import Engine
+
+import migrations
+from models import db, User
+from testing import rolled_back
+
+
+def user_count(app):
+    with app.app_context():
+        return db.session.query(User).count()
+
+
+def test_app_starts_on_a_current_in_memory_schema(app):
+    assert app.testing
+    assert app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite://'
+    with app.app_context(), db.engine.connect() as connection:
+        assert migrations.current_version(connection) == migrations.head()
+
+
+def test_commits_inside_requests_are_rolled_back(app):
+    with rolled_back(app):
+        client = app.test_client()
+        response = client.post('/api/auth/register',
+                               json={'username': 'bob', 'email': 'bob@example.com', 'password': 'pw'})
+        assert response.status_code == 201
+        assert user_count(app) == 1
+
+    assert user_count(app) == 0
+
+
+def test_a_session_rollback_keeps_earlier_commits_until_the_end(app):
+    with rolled_back(app):
+        with app.app_context():
+            db.session.add(User(username='kept', email='kept@example.com', password_hash='-'))
+            db.session.commit()
+            db.session.add(User(username='dropped', email='dropped@example.com', password_hash='-'))
+            db.session.flush()
+            db.session.rollback()
+            assert [user.username for user in db.session.query(User)] == ['kept']
+
+    assert user_count(app) == 0
+
+
+def test_a_failing_test_restores_the_engine(app):
+    options = dict(db.session.session_factory.kw)
+    with pytest.raises(RuntimeError):
+        with rolled_back(app):
+            app.test_client().post('/api/auth/register',
+                                   json={'username': 'eve', 'email': 'eve@example.com', 'password': 'pw'})
+            raise RuntimeError('test failed')
+
+    with app.app_context():
+        assert isinstance(db.engines[None], Engine)
+    assert db.session.session_factory.kw == options
+    assert user_count(app) == 0
@@ -0,0 +1,11 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+``APP_CONFIG`` selects the configuration class (default ``config.ProductionConfig``).
+"""
+import os
+
+from app import create_app
+
+app = create_app(os.environ.get('APP_CONFIG', 'config.ProductionConfig'))